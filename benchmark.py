@@ -0,0 +1,736 @@
+#!/usr/bin/env python
+
+'''
+This script contains benchmarks for the performance sensitive parts of
+Gramps2Gource.
+
+Run all benchmarks using:
+
+    $ python benchmark.py
+
+or a specific benchmark using:
+
+    $ python benchmark.py dates --count 1000000
+
+The stages benchmark generates a synthetic Gramps database (see
+generate_gramps.py) and measures the time and memory used by each stage of
+producing a pedigree log from it. Results can be saved as JSON so that runs
+can be compared:
+
+    $ python benchmark.py stages --persons 100000 --generations 20 --json results.json
+
+Author: Chris Laws
+'''
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import gzip
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import generate_gramps
+import gramps
+import gramps2gource
+import sinks
+import snapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+# The number of records per second the timeline benchmark is expected to
+# generate, sort and write once the database has been loaded.
+TIMELINE_TARGET = 100000
+
+
+def generate_date_strings(count, seed=0):
+    '''
+    Return a list of date strings in the forms commonly found in Gramps
+    exports. Most are canonical (YYYY, YYYY-MM or YYYY-MM-DD) with a small
+    proportion of free form dates that need the general purpose parser.
+    '''
+    rng = random.Random(seed)
+    datestrings = []
+    for _ in range(count):
+        year = rng.randint(1500, 2013)
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 28)
+        choice = rng.random()
+        if choice < 0.7:
+            datestrings.append("{0:04d}-{1:02d}-{2:02d}".format(year, month, day))
+        elif choice < 0.85:
+            datestrings.append("{0:04d}-{1:02d}".format(year, month))
+        elif choice < 0.99:
+            datestrings.append("{0:04d}".format(year))
+        else:
+            datestrings.append("{0} March {1}".format(day, year))
+    return datestrings
+
+
+def bench_dates(args):
+    '''
+    Compare the canonical date fast path against the dateutil based
+    default handler. Caching is disabled so that every string is parsed.
+    '''
+    count = args.count
+    datestrings = generate_date_strings(count)
+
+    slow = gramps.DateParser(cache_size=0, fast_path=False)
+    fast = gramps.DateParser(cache_size=0, fast_path=True)
+
+    # Check the two paths agree before timing them.
+    for datestring in set(datestrings):
+        expected = slow.parse(datestring)
+        actual = fast.parse(datestring)
+        if expected != actual:
+            raise Exception(
+                "Fast path mismatch for {0}: {1} != {2}".format(
+                    datestring, actual, expected))
+
+    def run(date_parser):
+        parse = date_parser.parse
+        for datestring in datestrings:
+            parse(datestring)
+
+    slow_time = min(timeit.repeat(lambda: run(slow), number=1, repeat=3))
+    fast_time = min(timeit.repeat(lambda: run(fast), number=1, repeat=3))
+
+    print("dates: parsed {0} date strings".format(count))
+    print("  dateutil path : {0:.3f}s".format(slow_time))
+    print("  fast path     : {0:.3f}s".format(fast_time))
+    print("  speedup       : {0:.1f}x".format(slow_time / fast_time))
+
+    return {'count': count, 'dateutil': slow_time, 'fast': fast_time}
+
+
+def build_collapsed_store(generations, width, seed=0, store=None):
+    '''
+    Return a Store holding a synthetic pedigree with heavy pedigree
+    collapse, along with the handle of the focus person.
+
+    Each generation contains at most `width` people and every person's
+    parents are picked at random from the generation above, so the same
+    ancestors are reached through many lines once the number of ancestor
+    slots in a generation exceeds the width.
+
+    :param store: an empty store to populate, a Store by default.
+    '''
+    rng = random.Random(seed)
+    if store is None:
+        store = gramps.Store()
+
+    def make_person(generation, index, gender):
+        person = gramps.Person(store)
+        person.handle = "_p{0}_{1}".format(generation, index)
+        person.id = "I{0}_{1}".format(generation, index)
+        person.gender = gender
+        person.firstnames = ["Person{0}".format(index)]
+        person.surname = "Gen{0}".format(generation)
+
+        event = gramps.Event(store)
+        event.handle = "_e{0}_{1}".format(generation, index)
+        event.type = 'Birth'
+        event.date = "{0:04d}-{1:02d}-{2:02d}".format(
+            2000 - 25 * generation, rng.randint(1, 12), rng.randint(1, 28))
+        store.events[event.handle] = event
+        person.event_handles = (event.handle,)
+
+        store.persons[person.handle] = person
+        return person
+
+    focus = make_person(0, 0, 'F')
+    current = [focus]
+    for generation in range(1, generations + 1):
+        fathers = [make_person(generation, i, 'M') for i in range(width)]
+        mothers = [make_person(generation, width + i, 'F')
+                   for i in range(width)]
+        for child in current:
+            family = gramps.Family(store)
+            family.handle = "_f{0}".format(child.handle)
+            father = rng.choice(fathers)
+            mother = rng.choice(mothers)
+            family.father_handle = father.handle
+            family.mother_handle = mother.handle
+            family.children_handles = (child.handle,)
+            father.parent_in_handles += (family.handle,)
+            mother.parent_in_handles += (family.handle,)
+            store.families[family.handle] = family
+            child.child_of_handle = family.handle
+        current = fathers + mothers
+
+    store.build_indexes()
+    return store, focus.handle
+
+
+def bench_collapse(args):
+    '''
+    Time the ancestor traversal for each collapse mode over a synthetic
+    pedigree where a small population is reached through many lines.
+    '''
+    generations = 16
+    width = 25
+    store, focus_handle = build_collapsed_store(generations, width)
+
+    g2g = gramps2gource.Gramps2Gource(None, store=store)
+    focus = store.get_person(focus_handle)
+
+    print("collapse: {0} generations, {1} persons per generation".format(
+        generations, 2 * width))
+    results = {}
+    for collapse in gramps2gource.COLLAPSE_MODES:
+        entries = []
+
+        def run():
+            del entries[:]
+            entries.extend(g2g.get_ancestors(focus, collapse=collapse))
+
+        elapsed = min(timeit.repeat(run, number=1, repeat=3))
+        print("  {0:<10}: {1:>8} entries, {2:>7} unique in {3:.3f}s".format(
+            collapse, len(entries), len(set(h for h, _ in entries)), elapsed))
+        results[collapse] = {'entries': len(entries), 'wall': elapsed}
+    return results
+
+
+def bench_indexed(args):
+    '''
+    Compare ancestor walks over the object model with walks over the
+    integer indexed arrays of an IndexedStore.
+    '''
+    generations = 100
+    width = max(1, args.persons // (2 * generations))
+    store, focus_handle = build_collapsed_store(
+        generations, width, store=gramps.IndexedStore())
+    focus = store.get_person(focus_handle)
+    build_time = min(timeit.repeat(store.build_columns, number=1, repeat=3))
+    focus_id = store.person_ids[focus_handle]
+
+    objects_time = min(timeit.repeat(focus.ancestors, number=1, repeat=3))
+    indexed_time = min(timeit.repeat(
+        lambda: store.ancestor_ids(focus_id), number=1, repeat=3))
+    ancestors = store.ancestor_ids(focus_id)
+
+    # Walk back down from one of the founders of the pedigree.
+    founder_id = ancestors[-1]
+    descendants_time = min(timeit.repeat(
+        lambda: store.descendant_ids(founder_id), number=1, repeat=3))
+    descendants = store.descendant_ids(founder_id)
+
+    print("indexed: {0} persons over {1} generations".format(
+        len(store.persons), generations))
+    print("  build columns       : {0:.3f}s".format(build_time))
+    print("  object ancestors    : {0} in {1:.3f}s".format(
+        len(ancestors), objects_time))
+    print("  indexed ancestors   : {0} in {1:.3f}s".format(
+        len(ancestors), indexed_time))
+    print("  indexed descendants : {0} in {1:.3f}s".format(
+        len(descendants), descendants_time))
+
+    return {'persons': len(store.persons), 'ancestors': len(ancestors),
+            'build_columns': build_time,
+            'object_ancestors': objects_time,
+            'indexed_ancestors': indexed_time,
+            'descendants': len(descendants),
+            'indexed_descendants': descendants_time}
+
+
+def bench_memory(args):
+    '''
+    Measure the memory retained by a parsed Store, reported as the number
+    of bytes per entity (person, family, event and place).
+    '''
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'memory.gramps')
+        generate_gramps.generate(path, persons=args.persons,
+                                 generations=args.generations)
+
+        tracemalloc.start()
+        store = gramps.parser.parse(path)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    entities = (len(store.persons) + len(store.families) +
+                len(store.events) + len(store.places))
+    print("memory: {0} persons, {1} entities".format(
+        len(store.persons), entities))
+    print("  retained      : {0:.1f} MB".format(current / 2 ** 20))
+    print("  peak          : {0:.1f} MB".format(peak / 2 ** 20))
+    print("  per entity    : {0:.0f} bytes".format(current / entities))
+
+    return {'entities': entities, 'retained_bytes': current,
+            'peak_bytes': peak, 'bytes_per_entity': current / entities}
+
+
+def bench_projection(args):
+    '''
+    Compare parsing a whole database with parsing only the parts used by a
+    pedigree (see gramps2gource.PROJECTIONS). Reports the best parse time
+    of three runs and the memory retained by the resulting Store for each,
+    along with the savings made by the projection.
+    '''
+    projections = collections.OrderedDict([
+        ('full', None),
+        ('pedigree', gramps2gource.PROJECTIONS['pedigree']),
+    ])
+
+    results = collections.OrderedDict()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'projection.gramps')
+        generate_gramps.generate(path, persons=args.persons,
+                                 generations=args.generations)
+        print("projection: {0} persons".format(args.persons))
+
+        for name, projection in projections.items():
+            # Parse times vary from run to run, keep the best of three.
+            elapsed = None
+            for _ in range(3):
+                start = time.perf_counter()
+                store = gramps.parser.parse(path, projection=projection)
+                run = time.perf_counter() - start
+                elapsed = run if elapsed is None else min(elapsed, run)
+            if args.memory:
+                del store
+                tracemalloc.start()
+                store = gramps.parser.parse(path, projection=projection)
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            entities = (len(store.persons) + len(store.families) +
+                        len(store.events) + len(store.places))
+            del store
+
+            result = collections.OrderedDict([
+                ('wall', elapsed), ('entities', entities)])
+            if args.memory:
+                result['retained_bytes'] = current
+                result['peak_bytes'] = peak
+            results[name] = result
+
+            memory = ""
+            if args.memory:
+                memory = ", {0:.1f} MB retained, {1:.1f} MB peak".format(
+                    current / 2 ** 20, peak / 2 ** 20)
+            print("  {0:<14}: {1:.3f}s wall, {2} entities{3}".format(
+                name, elapsed, entities, memory))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    full = results['full']
+    pedigree = results['pedigree']
+    savings = collections.OrderedDict()
+    savings['wall'] = 1 - pedigree['wall'] / full['wall']
+    if args.memory:
+        savings['retained_bytes'] = (
+            1 - pedigree['retained_bytes'] / full['retained_bytes'])
+        savings['peak_bytes'] = 1 - pedigree['peak_bytes'] / full['peak_bytes']
+    results['savings'] = savings
+    print("  saved         : {0}".format(", ".join(
+        "{0:.0%} {1}".format(value, key) for key, value in savings.items())))
+
+    return results
+
+
+def bench_paths(args):
+    '''
+    Compare the pedigree logs written with each path mode, see
+    gramps2gource.PATH_MODES, for the focus persons of a synthetic
+    database. Reports the size of each log and the best time of three runs
+    to generate and write it, once the database has been loaded.
+    '''
+    results = collections.OrderedDict()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'paths.gramps')
+        generator = generate_gramps.generate(
+            path, persons=args.persons, generations=args.generations,
+            family_size=args.family_size, collapse_rate=args.collapse_rate)
+        focus_ids = generator.focus_ids(args.focus)
+        g2g = gramps2gource.Gramps2Gource(
+            path, projection=gramps2gource.PROJECTIONS['pedigree'])
+        g2g.db.resolve_dates()
+        print("paths: {0} persons, {1} focus persons".format(
+            len(g2g.db.persons), len(focus_ids)))
+
+        output_file = os.path.join(tmp_dir, 'paths.log')
+        for paths in gramps2gource.PATH_MODES:
+            elapsed = None
+            for _ in range(3):
+                start = time.perf_counter()
+                g2g.pedigree(focus_ids, output_file,
+                             sort_buffer_size=args.sort_buffer_size,
+                             paths=paths)
+                took = time.perf_counter() - start
+                elapsed = took if elapsed is None else min(elapsed, took)
+            size = os.path.getsize(output_file)
+            results[paths] = collections.OrderedDict([
+                ('wall', elapsed), ('bytes', size)])
+            print("  {0:<8}: {1:.3f}s wall, {2} bytes".format(
+                paths, elapsed, size))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    handles = results[gramps2gource.PATHS_HANDLES]
+    compact = results[gramps2gource.PATHS_COMPACT]
+    compact['size_ratio'] = compact['bytes'] / handles['bytes']
+    compact['speedup'] = handles['wall'] / compact['wall']
+    print("  compact : {0:.0%} of the size, {1:.1f}x faster".format(
+        compact['size_ratio'], compact['speedup']))
+
+    return results
+
+
+def bench_sinks(args):
+    '''
+    Compare writing the timeline log of a synthetic database to each kind
+    of file sink, see sinks.py, and reading it back. Reports the best time
+    of three runs and the size of each log.
+    '''
+    results = collections.OrderedDict()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'sinks.gramps')
+        generate_gramps.generate(path, persons=args.persons,
+                                 generations=args.generations,
+                                 family_size=args.family_size,
+                                 collapse_rate=args.collapse_rate)
+        g2g = gramps2gource.Gramps2Gource(
+            path, projection=gramps2gource.PROJECTIONS['timeline'])
+        records = sorted(g2g._timeline_records())
+        print("sinks: {0} records".format(len(records)))
+
+        extensions = ['.log', '.log.gz']
+        if sinks.zstandard is not None:
+            extensions.append('.log.zst')
+        for extension in extensions:
+            output_file = os.path.join(tmp_dir, 'sinks' + extension)
+            write = min(timeit.repeat(
+                lambda: gramps2gource.write_records(records, output_file),
+                number=1, repeat=3))
+            read = min(timeit.repeat(
+                lambda: collections.deque(
+                    sinks.read_records(output_file), maxlen=0),
+                number=1, repeat=3))
+            size = os.path.getsize(output_file)
+            results[extension] = collections.OrderedDict([
+                ('write', write), ('read', read), ('bytes', size)])
+            print("  {0:<8}: {1:.3f}s write, {2:.3f}s read, {3} bytes".format(
+                extension, write, read, size))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return results
+
+
+def bench_sqlite(args):
+    '''
+    Compare loading a database from a .gramps export with loading the same
+    database from a Gramps SQLite family tree, both in full and focused on
+    the youngest generation. Reports the best time of three runs of each.
+    '''
+    results = collections.OrderedDict()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        xml_path = os.path.join(tmp_dir, 'sqlite.gramps')
+        db_path = os.path.join(tmp_dir, 'sqlite.db')
+        generator = generate_gramps.generate(
+            xml_path, persons=args.persons, generations=args.generations)
+        generate_gramps.write_sqlite(gramps.parser.parse(xml_path), db_path)
+        focus_ids = generator.focus_ids(args.focus)
+        projection = gramps2gource.PROJECTIONS['pedigree']
+        print("sqlite: {0} persons".format(args.persons))
+
+        runs = collections.OrderedDict([
+            ('xml', lambda: gramps.parser.parse(
+                xml_path, projection=projection)),
+            ('sqlite', lambda: gramps.sqlite_loader.parse(
+                db_path, projection=projection)),
+            ('xml_focused', lambda: gramps.parser.parse_focused(
+                xml_path, focus_ids, projection=projection)),
+            ('sqlite_focused', lambda: gramps.sqlite_loader.parse_focused(
+                db_path, focus_ids, projection=projection)),
+        ])
+        for name, run in runs.items():
+            # Load times vary from run to run, keep the best of three.
+            elapsed = None
+            for _ in range(3):
+                start = time.perf_counter()
+                store = run()
+                took = time.perf_counter() - start
+                elapsed = took if elapsed is None else min(elapsed, took)
+            results[name] = collections.OrderedDict([
+                ('wall', elapsed), ('persons', len(store.persons))])
+            del store
+            print("  {0:<14}: {1:.3f}s wall, {2} persons".format(
+                name, elapsed, results[name]['persons']))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    for name in ('sqlite', 'sqlite_focused'):
+        xml_name = name.replace('sqlite', 'xml')
+        results[name]['speedup'] = (
+            results[xml_name]['wall'] / results[name]['wall'])
+        print("  {0:<14}: {1:.1f}x faster than {2}".format(
+            name, results[name]['speedup'], xml_name))
+
+    return results
+
+
+def bench_timeline(args):
+    '''
+    Measure the throughput of the timeline mode, which writes every dated
+    event in the database, in records per second. Loading the database is
+    not included. The throughput is compared with TIMELINE_TARGET.
+    '''
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'timeline.gramps')
+        generate_gramps.generate(path, persons=args.persons,
+                                 generations=args.generations,
+                                 family_size=args.family_size,
+                                 collapse_rate=args.collapse_rate)
+        g2g = gramps2gource.Gramps2Gource(
+            path, projection=gramps2gource.PROJECTIONS['timeline'])
+
+        output_file = os.path.join(tmp_dir, 'timeline.log')
+        start = time.perf_counter()
+        g2g.timeline(output_file, sort_buffer_size=args.sort_buffer_size)
+        elapsed = time.perf_counter() - start
+
+        with open(output_file) as fd:
+            # the log ends with an empty line
+            records = sum(1 for _ in fd) - 1
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    rate = records / elapsed
+    print("timeline: {0} persons".format(len(g2g.db.persons)))
+    print("  records       : {0}".format(records))
+    print("  elapsed       : {0:.3f}s".format(elapsed))
+    print("  throughput    : {0:.0f} records/s, target {1} ({2})".format(
+        rate, TIMELINE_TARGET, "met" if rate >= TIMELINE_TARGET else "missed"))
+
+    return {'persons': len(g2g.db.persons), 'records': records,
+            'seconds': elapsed, 'records_per_second': rate,
+            'target': TIMELINE_TARGET}
+
+
+class Stage(object):
+    '''
+    A context manager that measures the wall time, CPU time and, when
+    tracemalloc is tracing, the peak memory allocated during a stage.
+    Counts describing the work done can be added to the counts dict.
+    '''
+
+    def __init__(self, results, name):
+        self.results = results
+        self.name = name
+        self.counts = collections.OrderedDict()
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.base_memory = tracemalloc.get_traced_memory()[0]
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        result = collections.OrderedDict()
+        result['wall'] = time.perf_counter() - self.wall
+        result['cpu'] = time.process_time() - self.cpu
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            result['peak_bytes'] = max(0, peak - self.base_memory)
+        result.update(self.counts)
+        self.results[self.name] = result
+
+        memory = ""
+        if 'peak_bytes' in result:
+            memory = ", {0:.1f} MB peak".format(result['peak_bytes'] / 2 ** 20)
+        counts = "".join(
+            ", {0} {1}".format(value, key)
+            for key, value in self.counts.items())
+        print("  {0:<14}: {1:.3f}s wall, {2:.3f}s cpu{3}{4}".format(
+            self.name, result['wall'], result['cpu'], memory, counts))
+
+
+def bench_stages(args):
+    '''
+    Generate a synthetic Gramps database and measure each stage of
+    producing a pedigree log from it: decompress, parse, index, convert
+    dates, save and load a snapshot, traverse, sort and write. The parse
+    stage includes building the indexes once, the index stage measures
+    rebuilding them.
+    '''
+    stages = collections.OrderedDict()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'synthetic.gramps')
+        generator = generate_gramps.generate(
+            path, persons=args.persons, generations=args.generations,
+            family_size=args.family_size, collapse_rate=args.collapse_rate)
+        focus_ids = generator.focus_ids(args.focus)
+
+        print("stages: {0} persons, {1} generations, {2} focus persons".format(
+            len(generator.gender), generator.generations, len(focus_ids)))
+
+        if args.memory:
+            tracemalloc.start()
+
+        with Stage(stages, 'decompress') as stage:
+            size = 0
+            with gzip.open(path, 'rb') as fd:
+                while True:
+                    data = fd.read(2 ** 20)
+                    if not data:
+                        break
+                    size += len(data)
+            stage.counts['bytes'] = size
+
+        with Stage(stages, 'parse') as stage:
+            store = gramps.parser.parse(path, store=gramps.IndexedStore())
+            stage.counts['persons'] = len(store.persons)
+            stage.counts['events'] = len(store.events)
+
+        with Stage(stages, 'index'):
+            store.build_indexes()
+
+        with Stage(stages, 'dates') as stage:
+            stage.counts['events'] = store.resolve_dates()
+
+        cache = snapshot.SnapshotCache(
+            os.path.join(tmp_dir, 'cache'), store_class=gramps.IndexedStore)
+        with Stage(stages, 'snapshot_save') as stage:
+            cache.save(path, store)
+            stage.counts['bytes'] = os.path.getsize(cache.path(path))
+
+        with Stage(stages, 'snapshot_load'):
+            store = cache.load(path)
+
+        g2g = gramps2gource.Gramps2Gource(None, store=store)
+        with Stage(stages, 'traverse') as stage:
+            events_cache = {}
+            records = []
+            for focus_id in focus_ids:
+                records.extend(gramps2gource.reverse_time(
+                    g2g._pedigree_records(
+                        focus_id, gramps2gource.COLLAPSE_REFERENCE,
+                        events_cache)))
+            stage.counts['persons'] = len(events_cache)
+            stage.counts['records'] = len(records)
+
+        with Stage(stages, 'sort'):
+            sorter = gramps2gource.RecordSorter(args.sort_buffer_size)
+            sorter.extend(records)
+            del records
+
+        with Stage(stages, 'write') as stage:
+            output_file = os.path.join(tmp_dir, 'pedigree.log')
+            gramps2gource.write_records(sorter, output_file)
+            sorter.close()
+            stage.counts['bytes'] = os.path.getsize(output_file)
+
+        if args.memory:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return collections.OrderedDict([
+        ('config', collections.OrderedDict([
+            ('persons', args.persons),
+            ('generations', args.generations),
+            ('family_size', args.family_size),
+            ('collapse_rate', args.collapse_rate),
+            ('focus', len(focus_ids)),
+            ('memory', args.memory),
+        ])),
+        ('stages', stages),
+    ])
+
+
+benchmarks = {
+    'collapse': bench_collapse,
+    'dates': bench_dates,
+    'indexed': bench_indexed,
+    'memory': bench_memory,
+    'paths': bench_paths,
+    'projection': bench_projection,
+    'sinks': bench_sinks,
+    'sqlite': bench_sqlite,
+    'stages': bench_stages,
+    'timeline': bench_timeline,
+}
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Run Gramps2Gource benchmarks")
+    parser.add_argument("benchmarks", nargs='*', metavar="BENCHMARK",
+                        help="The benchmarks to run, all of them by "
+                        "default: {0}".format(
+                            ", ".join(sorted(benchmarks))))
+    parser.add_argument("-c", "--count", dest="count", default=1000000,
+                        type=int,
+                        help="The number of date strings to parse")
+    parser.add_argument("-p", "--persons", dest="persons", default=100000,
+                        type=int,
+                        help="The number of persons in generated databases")
+    parser.add_argument("-g", "--generations", dest="generations",
+                        default=20, type=int,
+                        help="The number of generations in generated "
+                        "databases")
+    parser.add_argument("--family-size", dest="family_size", default=3.0,
+                        type=float,
+                        help="The average number of children per family")
+    parser.add_argument("--collapse-rate", dest="collapse_rate",
+                        default=0.05, type=float,
+                        help="The fraction of couples who are cousins")
+    parser.add_argument("--focus", dest="focus", default=10, type=int,
+                        help="The number of focus persons")
+    parser.add_argument("--sort-buffer", dest="sort_buffer_size",
+                        default=gramps2gource.DEFAULT_SORT_BUFFER_SIZE,
+                        type=int,
+                        help="The maximum number of records sorted in memory")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Do not trace memory use, which slows down "
+                        "the stages being timed")
+    parser.add_argument("--json", dest="json", default=None, type=str,
+                        help="Write the results to a JSON file")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks
+               if name not in benchmarks]
+    if unknown:
+        parser.error("unknown benchmarks: {0}".format(
+            ", ".join(unknown)))
+
+    logging.basicConfig(
+        level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    results = collections.OrderedDict()
+    results['python'] = platform.python_version()
+    results['time'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for name in args.benchmarks or sorted(benchmarks):
+        results[name] = benchmarks[name](args)
+
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+    sys.exit(0)
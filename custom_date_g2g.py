@@ -28,7 +28,8 @@ parser.add_argument("-d", "--db", dest="database", default=None,
                     help="The gramps database file to use")
 parser.add_argument("-n", "--names", action='append', dest="names",
                     default=None, type=str,
-                    help="The focus person to extract pedigree data for")
+                    help="The focus person to extract pedigree data for. "
+                    "May be a name, a Gramps ID or a handle")
 parser.add_argument("-o", "--output", dest="output", default=None,
                     type=str,
                     help="The name of the file to send the output to")
@@ -0,0 +1,613 @@
+#!/usr/bin/env python
+
+'''
+This script generates synthetic Gramps XML files (.gramps) of a configurable
+size. They are used to measure how Gramps2Gource scales with the size of a
+family tree.
+
+The population is built one generation at a time. Couples are formed from
+the previous generation and children are shared out among them. Pedigree
+collapse happens naturally once a pedigree is deeper than the population of
+a generation can support and can be increased by making some couples
+cousins.
+
+Generate a database of 100000 persons over 20 generations using:
+
+    $ python generate_gramps.py --persons 100000 --generations 20 synthetic.gramps
+
+Add --sqlite to also write the same database in the layout of a Gramps 5.1
+SQLite family tree, as read by gramps.sqlite_loader:
+
+    $ python generate_gramps.py --persons 100000 synthetic.gramps --sqlite synthetic.db
+
+Author: Chris Laws
+'''
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import array
+import gzip
+import logging
+import os
+import pickle
+import random
+import re
+import sqlite3
+import sys
+
+import gramps
+
+
+logger = logging.getLogger(__name__)
+
+
+FIRST_NAMES = {
+    'M': ['John', 'William', 'James', 'George', 'Charles', 'Thomas', 'Henry',
+          'Joseph', 'Edward', 'Robert', 'Hans', 'Peter', 'Lars', 'Anders'],
+    'F': ['Mary', 'Elizabeth', 'Sarah', 'Margaret', 'Anna', 'Emma', 'Alice',
+          'Jane', 'Ellen', 'Catherine', 'Kristina', 'Maria', 'Ingrid'],
+}
+
+SURNAMES = ['Smith', 'Jones', 'Brown', 'Taylor', 'Wilson', 'Johnson',
+            'Walker', 'Wright', 'Robinson', 'Thompson', 'Hansen', 'Nielsen',
+            'Andersson', 'Ericsson', 'Garner', 'Adams', 'Michaels', 'Lewis']
+
+# Relative weights of the date forms written to dateval elements.
+#   full  - YYYY-MM-DD
+#   month - YYYY-MM
+#   year  - YYYY
+#   about - YYYY-MM-DD with type="about"
+#   text  - a date that requires the general purpose date parser
+DEFAULT_DATE_FORMATS = {
+    'full': 0.75,
+    'month': 0.1,
+    'year': 0.08,
+    'about': 0.05,
+    'text': 0.02,
+}
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November',
+               'December']
+
+
+def make_handle(kind, index):
+    '''
+    Return a unique Gramps style handle for an entity. Gramps handles are
+    an underscore followed by 19 hexadecimal digits.
+    '''
+    # Multiplying by an odd constant is a bijection modulo 16 ** 19 so the
+    # handles are unique while looking random.
+    value = (index * 4 + kind) * 0x9E3779B97F4A7C15 % (16 ** 19)
+    return "_{0:019x}".format(value)
+
+
+class Generator(object):
+    '''
+    Generate a synthetic Gramps XML database.
+
+    :param persons: the approximate number of persons to generate.
+
+    :param generations: the number of generations to spread the persons
+      across. This is the maximum depth of a pedigree.
+
+    :param family_size: the average number of children per family.
+
+    :param collapse_rate: the fraction of couples that are formed between
+      cousins, in addition to the pedigree collapse that happens naturally.
+
+    :param date_formats: a dict of relative weights for the date forms. See
+      DEFAULT_DATE_FORMATS.
+
+    :param start_year: the year the first generation is born around.
+
+    :param seed: the random seed, the same seed produces the same file.
+    '''
+
+    PERSON, FAMILY, EVENT, PLACE = range(4)
+
+    def __init__(self, persons=10000, generations=10, family_size=3.0,
+                 collapse_rate=0.05, date_formats=None, start_year=1600,
+                 seed=0):
+        self.persons = max(2, persons)
+        self.generations = max(1, min(generations, self.persons // 2))
+        self.family_size = max(1.0, family_size)
+        self.collapse_rate = collapse_rate
+        self.date_formats = date_formats or DEFAULT_DATE_FORMATS
+        self.start_year = start_year
+        self.rng = random.Random(seed)
+
+        self.places = max(1, self.persons // 50)
+
+        # Per person columns.
+        self.gender = bytearray()
+        self.birth_year = array.array('l')
+        self.child_of = array.array('l')
+        self.surname = array.array('l')
+        self.first = array.array('l')
+
+        # Per family columns.
+        self.father = array.array('l')
+        self.mother = array.array('l')
+        self.marriage_year = array.array('l')
+
+        # First person index of each generation.
+        self.generation_starts = []
+
+    def _add_person(self, year, child_of, surname):
+        index = len(self.gender)
+        gender = self.rng.choice('MF')
+        self.gender.append(ord(gender))
+        self.birth_year.append(year + self.rng.randint(-5, 5))
+        self.child_of.append(child_of)
+        self.surname.append(surname)
+        self.first.append(self.rng.randrange(len(FIRST_NAMES[gender])))
+        return index
+
+    def _pair(self, males, females):
+        '''
+        Return a list of (father, mother) couples. Most partners are chosen
+        at random, some are chosen from the father's cousins.
+        '''
+        rng = self.rng
+        rng.shuffle(males)
+        rng.shuffle(females)
+
+        # Group the women by their paternal grandparents' family so that
+        # cousins can be found.
+        cousins = {}
+        for mother in females:
+            key = self._grandparents(mother)
+            if key >= 0:
+                cousins.setdefault(key, []).append(mother)
+
+        couples = int(round(
+            (self.generation_size / self.family_size)))
+        couples = max(1, min(couples, len(males), len(females)))
+
+        taken = set()
+        pairs = []
+        remaining = iter(females)
+        for father in males[:couples]:
+            mother = None
+            if rng.random() < self.collapse_rate:
+                for candidate in cousins.get(self._grandparents(father), []):
+                    if (candidate not in taken and
+                            self.child_of[candidate] != self.child_of[father]):
+                        mother = candidate
+                        break
+            while mother is None:
+                candidate = next(remaining, None)
+                if candidate is None:
+                    break
+                if candidate not in taken:
+                    mother = candidate
+            if mother is None:
+                break
+            taken.add(mother)
+            pairs.append((father, mother))
+        return pairs
+
+    def _grandparents(self, person):
+        '''
+        Return the family id of a person's paternal grandparents or -1.
+        '''
+        family = self.child_of[person]
+        if family < 0:
+            return -1
+        return self.child_of[self.father[family]]
+
+    def build(self):
+        '''
+        Build the population in memory.
+        '''
+        rng = self.rng
+        self.generation_size = self.persons // self.generations
+
+        # The founders have no parents.
+        self.generation_starts.append(0)
+        for _ in range(self.generation_size):
+            self._add_person(
+                self.start_year, -1, rng.randrange(len(SURNAMES)))
+
+        for generation in range(1, self.generations):
+            start = self.generation_starts[-1]
+            previous = range(start, len(self.gender))
+            males = [p for p in previous if self.gender[p] == ord('M')]
+            females = [p for p in previous if self.gender[p] == ord('F')]
+
+            families = []
+            for father, mother in self._pair(males, females):
+                family = len(self.father)
+                self.father.append(father)
+                self.mother.append(mother)
+                self.marriage_year.append(
+                    max(self.birth_year[father], self.birth_year[mother]) +
+                    rng.randint(18, 30))
+                families.append(family)
+
+            self.generation_starts.append(len(self.gender))
+            year = self.start_year + 30 * generation
+            for _ in range(self.generation_size):
+                family = rng.choice(families)
+                self._add_person(
+                    year, family, self.surname[self.father[family]])
+
+        logger.info(
+            "Generated {0} persons in {1} families over {2} "
+            "generations".format(len(self.gender), len(self.father),
+                                 self.generations))
+
+    def _date(self, year):
+        '''
+        Return the attributes of a dateval element for a date in year.
+        '''
+        rng = self.rng
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 28)
+
+        choice = rng.random() * sum(self.date_formats.values())
+        for form in sorted(self.date_formats):
+            choice -= self.date_formats[form]
+            if choice <= 0:
+                break
+
+        if form == 'month':
+            return 'val="{0:04d}-{1:02d}"'.format(year, month)
+        elif form == 'year':
+            return 'val="{0:04d}"'.format(year)
+        elif form == 'about':
+            return 'val="{0:04d}-{1:02d}-{2:02d}" type="about"'.format(
+                year, month, day)
+        elif form == 'text':
+            return 'val="{0} {1} {2:04d}"'.format(
+                day, MONTH_NAMES[month - 1], year)
+        return 'val="{0:04d}-{1:02d}-{2:02d}"'.format(year, month, day)
+
+    def _event(self, write, index, kind, year, description):
+        write('<event handle="{0}" change="1198197326" id="E{1:07d}">'
+              '<type>{2}</type><dateval {3}/><place hlink="{4}"/>'
+              '<description>{5}</description></event>\n'.format(
+                  make_handle(self.EVENT, index), index, kind,
+                  self._date(year),
+                  make_handle(self.PLACE, self.rng.randrange(self.places)),
+                  description))
+
+    def _name(self, person):
+        gender = chr(self.gender[person])
+        return (FIRST_NAMES[gender][self.first[person]],
+                SURNAMES[self.surname[person]])
+
+    def write(self, path):
+        '''
+        Write the population to a gzipped Gramps XML file.
+        '''
+        persons = len(self.gender)
+        families = len(self.father)
+
+        # Each person has a birth event and, when they were born long enough
+        # ago, a death event. Each family has a marriage event.
+        birth_events = array.array('l')
+        death_events = array.array('l', [-1]) * persons
+        marriage_events = array.array('l')
+        events = 0
+        for person in range(persons):
+            birth_events.append(events)
+            events += 1
+            if self.birth_year[person] < 1950:
+                death_events[person] = events
+                events += 1
+        for family in range(families):
+            marriage_events.append(events)
+            events += 1
+
+        parent_in = {}
+        for family in range(families):
+            parent_in.setdefault(self.father[family], []).append(family)
+            parent_in.setdefault(self.mother[family], []).append(family)
+
+        children = {}
+        for person in range(persons):
+            if self.child_of[person] >= 0:
+                children.setdefault(self.child_of[person], []).append(person)
+
+        with gzip.open(path, 'wb') as fd:
+
+            def write(text):
+                fd.write(text.encode('utf-8'))
+
+            write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<!DOCTYPE database PUBLIC "-//Gramps//DTD Gramps XML '
+                  '1.4.0//EN"\n'
+                  '"http://gramps-project.org/xml/1.4.0/grampsxml.dtd">\n'
+                  '<database xmlns="http://gramps-project.org/xml/1.4.0/">\n'
+                  '  <header>\n'
+                  '    <created date="2013-01-01" version="3.4.0"/>\n'
+                  '  </header>\n')
+
+            write('<events>\n')
+            for person in range(persons):
+                name = " ".join(self._name(person))
+                self._event(write, birth_events[person], 'Birth',
+                            self.birth_year[person],
+                            "Birth of {0}".format(name))
+                if death_events[person] >= 0:
+                    self._event(write, death_events[person], 'Death',
+                                self.birth_year[person] +
+                                self.rng.randint(1, 90),
+                                "Death of {0}".format(name))
+            for family in range(families):
+                self._event(write, marriage_events[family], 'Marriage',
+                            self.marriage_year[family], "Marriage")
+            write('</events>\n')
+
+            write('<people>\n')
+            for person in range(persons):
+                first, surname = self._name(person)
+                write('<person handle="{0}" change="1198197326" '
+                      'id="I{1:07d}"><gender>{2}</gender>'
+                      '<name type="Birth Name"><first>{3}</first>'
+                      '<surname>{4}</surname></name>'
+                      '<eventref hlink="{5}" role="Primary"/>'.format(
+                          make_handle(self.PERSON, person), person,
+                          chr(self.gender[person]), first, surname,
+                          make_handle(self.EVENT, birth_events[person])))
+                if death_events[person] >= 0:
+                    write('<eventref hlink="{0}" role="Primary"/>'.format(
+                        make_handle(self.EVENT, death_events[person])))
+                if self.child_of[person] >= 0:
+                    write('<childof hlink="{0}"/>'.format(
+                        make_handle(self.FAMILY, self.child_of[person])))
+                for family in parent_in.get(person, []):
+                    write('<parentin hlink="{0}"/>'.format(
+                        make_handle(self.FAMILY, family)))
+                write('</person>\n')
+            write('</people>\n')
+
+            write('<families>\n')
+            for family in range(families):
+                write('<family handle="{0}" change="1198197326" '
+                      'id="F{1:07d}"><rel type="Married"/>'
+                      '<father hlink="{2}"/><mother hlink="{3}"/>'
+                      '<eventref hlink="{4}" role="Family"/>'.format(
+                          make_handle(self.FAMILY, family), family,
+                          make_handle(self.PERSON, self.father[family]),
+                          make_handle(self.PERSON, self.mother[family]),
+                          make_handle(self.EVENT, marriage_events[family])))
+                for child in children.get(family, []):
+                    write('<childref hlink="{0}"/>'.format(
+                        make_handle(self.PERSON, child)))
+                write('</family>\n')
+            write('</families>\n')
+
+            write('<places>\n')
+            for place in range(self.places):
+                write('<placeobj handle="{0}" change="1198197326" '
+                      'id="P{1:05d}"><ptitle>Place {1}, Somewhere</ptitle>'
+                      '<coord long="{2:.5f}" lat="{3:.5f}"/>'
+                      '</placeobj>\n'.format(
+                          make_handle(self.PLACE, place), place,
+                          self.rng.uniform(-180, 180),
+                          self.rng.uniform(-90, 90)))
+            write('</places>\n')
+
+            write('</database>\n')
+
+        logger.info("Wrote synthetic Gramps database to {0}".format(path))
+
+    def focus_ids(self, count):
+        '''
+        Return the Gramps IDs of up to count persons from the youngest
+        generation, who have the deepest pedigrees.
+        '''
+        start = self.generation_starts[-1]
+        end = min(len(self.gender), start + count)
+        return ["I{0:07d}".format(person) for person in range(start, end)]
+
+
+def generate(path, **kwargs):
+    '''
+    Generate a synthetic Gramps XML file and return the Generator used,
+    which describes the population. See Generator for the arguments.
+    '''
+    generator = Generator(**kwargs)
+    generator.build()
+    generator.write(path)
+    return generator
+
+
+# The tables of a Gramps 5.1 SQLite family tree read by Gramps2Gource.
+SQLITE_SCHEMA = """
+CREATE TABLE person (handle VARCHAR(50) PRIMARY KEY NOT NULL,
+    given_name TEXT, surname TEXT, gender_type INTEGER, order_by TEXT,
+    gramps_id TEXT, blob_data BLOB);
+CREATE TABLE family (handle VARCHAR(50) PRIMARY KEY NOT NULL,
+    father_handle VARCHAR(50), mother_handle VARCHAR(50), gramps_id TEXT,
+    blob_data BLOB);
+CREATE TABLE event (handle VARCHAR(50) PRIMARY KEY NOT NULL,
+    gramps_id TEXT, blob_data BLOB);
+CREATE TABLE place (handle VARCHAR(50) PRIMARY KEY NOT NULL,
+    enclosed_by VARCHAR(50), order_by TEXT, gramps_id TEXT, blob_data BLOB);
+"""
+
+_EMPTY_DATE = (0, 0, 0, (0, 0, 0, False), '', 0, 0)
+
+
+def _reverse(mapping):
+    return dict((name, value) for value, name in mapping.items())
+
+
+def _gramps_date(event):
+    '''
+    Return the serialized Gramps date for an event's dateval.
+    '''
+    if not event.date:
+        return _EMPTY_DATE
+    match = re.match(r'^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?$', event.date)
+    if match:
+        year, month, day = (int(part or 0) for part in match.groups())
+    else:
+        # Dates Gramps would have parsed into their parts on entry.
+        dt = event.datetime
+        year, month, day = dt.year, dt.month, dt.day
+    modifiers = _reverse(gramps.GRAMPS_DATE_MODIFIERS)
+    calendars = _reverse(gramps.GRAMPS_CALENDARS)
+    return (calendars.get(event.date_cformat, 0),
+            modifiers.get(event.date_type, 0), 0,
+            (day, month, year, False), '', 0, 0)
+
+
+def write_sqlite(store, path):
+    '''
+    Write the persons, families, events and places of a store to a SQLite
+    file laid out like a Gramps 5.1 family tree, with each object pickled
+    in the blob_data column of its table. Only the parts of each object
+    that Gramps2Gource reads are filled in.
+    '''
+    if os.path.exists(path):
+        os.remove(path)
+
+    genders = _reverse(gramps.GRAMPS_GENDERS)
+    family_types = _reverse(gramps.GRAMPS_FAMILY_TYPES)
+    event_types = _reverse(gramps.GRAMPS_EVENT_TYPES)
+
+    def event_refs(handles, role):
+        return [(False, [], [], [], handle, (role, '')) for handle in handles]
+
+    def blob(data):
+        return sqlite3.Binary(pickle.dumps(data, 2))
+
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executescript(SQLITE_SCHEMA)
+
+        rows = []
+        for person in store.persons.values():
+            first_name = " ".join(person.firstnames)
+            surname = person.surname or ''
+            name = (False, [], [], _EMPTY_DATE, first_name,
+                    [(surname, person.prefix or '', True, (1, ''), '')],
+                    '', '', (2, ''), '', 0, 0, '', '', '')
+            gender = genders.get(person.gender, 2)
+            parent_families = (
+                [person.child_of_handle] if person.child_of_handle else [])
+            data = (person.handle, person.id, gender, name, [], -1, -1,
+                    event_refs(person.event_handles, 1),
+                    list(person.parent_in_handles), parent_families,
+                    [], [], [], [], [], [], list(person.notes),
+                    person.change or 0, [], False, [])
+            rows.append((person.handle, first_name, surname, gender,
+                         person.id, blob(data)))
+        connection.executemany(
+            "INSERT INTO person (handle, given_name, surname, gender_type, "
+            "gramps_id, blob_data) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        rows = []
+        for family in store.families.values():
+            child_refs = [
+                (False, [], [], handle, (frel, ''), (1, ''))
+                for handles, frel in (
+                    (family.children_handles, 1),
+                    (family.step_children_handles, gramps.GRAMPS_STEPCHILD))
+                for handle in handles]
+            data = (family.handle, family.id, family.father_handle,
+                    family.mother_handle, child_refs,
+                    (family_types.get(family.relationship, 3), ''),
+                    event_refs(family.event_handles, 10), [], [], [],
+                    list(family.source_handles), [], family.change or 0, [],
+                    False)
+            rows.append((family.handle, family.father_handle,
+                         family.mother_handle, family.id, blob(data)))
+        connection.executemany(
+            "INSERT INTO family (handle, father_handle, mother_handle, "
+            "gramps_id, blob_data) VALUES (?, ?, ?, ?, ?)", rows)
+
+        rows = []
+        for event in store.events.values():
+            if event.type in event_types:
+                event_type = (event_types[event.type], '')
+            else:
+                event_type = (0, event.type)
+            data = (event.handle, event.id, event_type, _gramps_date(event),
+                    event.description or '', event.place_handle or '',
+                    list(event.source_handles), list(event.note_handles), [],
+                    [], event.change or 0, [], False)
+            rows.append((event.handle, event.id, blob(data)))
+        connection.executemany(
+            "INSERT INTO event (handle, gramps_id, blob_data) "
+            "VALUES (?, ?, ?)", rows)
+
+        rows = []
+        for place in store.places.values():
+            data = (place.handle, place.id, place.title or '',
+                    place.lon or '', place.lat or '', [],
+                    (place.title or '', _EMPTY_DATE, ''), [], (-1, ''), '',
+                    [], [], [], [], [], place.change or 0, [], False)
+            rows.append((place.handle, place.id, blob(data)))
+        connection.executemany(
+            "INSERT INTO place (handle, gramps_id, blob_data) "
+            "VALUES (?, ?, ?)", rows)
+    connection.close()
+
+    logger.info("Wrote Gramps SQLite database to {0}".format(path))
+
+
+def parse_date_formats(text):
+    '''
+    Parse a date format weights argument such as "full=0.8,year=0.2".
+    '''
+    date_formats = {}
+    for item in text.split(","):
+        form, _, weight = item.partition("=")
+        if form not in DEFAULT_DATE_FORMATS:
+            raise ValueError("Unknown date format {0}".format(form))
+        date_formats[form] = float(weight or 1)
+    return date_formats
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic Gramps XML files")
+    parser.add_argument("output", type=str,
+                        help="The name of the .gramps file to write")
+    parser.add_argument("-p", "--persons", dest="persons", default=10000,
+                        type=int,
+                        help="The approximate number of persons")
+    parser.add_argument("-g", "--generations", dest="generations",
+                        default=10, type=int,
+                        help="The number of generations")
+    parser.add_argument("--family-size", dest="family_size", default=3.0,
+                        type=float,
+                        help="The average number of children per family")
+    parser.add_argument("--collapse-rate", dest="collapse_rate",
+                        default=0.05, type=float,
+                        help="The fraction of couples who are cousins")
+    parser.add_argument("--date-formats", dest="date_formats", default=None,
+                        type=parse_date_formats,
+                        help="Relative weights of the date forms, e.g. "
+                        "full=0.8,month=0.1,year=0.1. Forms are full, month, "
+                        "year, about and text")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="The random seed")
+    parser.add_argument("--sqlite", dest="sqlite", default=None, type=str,
+                        help="Also write the database to this file in the "
+                        "layout of a Gramps SQLite family tree")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    generate(args.output, persons=args.persons,
+             generations=args.generations, family_size=args.family_size,
+             collapse_rate=args.collapse_rate,
+             date_formats=args.date_formats, seed=args.seed)
+
+    if args.sqlite:
+        write_sqlite(gramps.parser.parse(args.output), args.sqlite)
+
+    sys.exit(0)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+'''
+This module streams Gource custom log records straight into a Gource
+process, rather than writing them to a log file first and piping the file
+into Gource afterwards.
+
+Gource is started as an asyncio subprocess reading the log from its stdin.
+Once the records have been sorted they are written in batches and the
+writer waits whenever the pipe is full, so a slow Gource holds back the
+writer instead of the formatted records piling up in memory.
+
+Optionally Gource's video output can be chained into an encoder such as
+ffmpeg. Gource then writes a PPM stream to its stdout, which is connected
+directly to the encoder's stdin by an OS pipe:
+
+    pipe = GourcePipe(
+        encoder="ffmpeg -y -r 60 -f image2pipe -vcodec ppm -i - out.mp4")
+    pipe.write_records(records)
+
+Author: Chris Laws
+'''
+
+from __future__ import unicode_literals
+
+import asyncio
+import logging
+import os
+import shlex
+import shutil
+
+import sinks
+
+
+logger = logging.getLogger(__name__)
+
+
+# The Gource configuration distributed with Gramps2Gource.
+GOURCE_CONF = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'gource.conf')
+
+DEFAULT_GOURCE = "gource"
+
+# The number of records formatted and written to the pipe at a time.
+DEFAULT_BATCH_SIZE = 1000
+
+
+class GourcePipe(object):
+    '''
+    Streams records into a Gource process.
+
+    :param gource: the command used to run Gource, as a string or a list
+      of arguments. The configuration and stdin arguments are appended to
+      it. Any program reading a custom log from stdin can stand in for
+      Gource.
+
+    :param encoder: an optional command, as a string or a list of
+      arguments, that reads the PPM video stream written by Gource from its
+      stdin.
+
+    :param conf: the Gource configuration file.
+
+    :param batch_size: the number of records written to the pipe at a time.
+
+    The executables of Gource and the encoder are looked up on the path
+    when the pipe is created, raising ValueError if either is not found,
+    so that a missing program is reported before any records are made.
+    '''
+
+    def __init__(self, gource=DEFAULT_GOURCE, encoder=None, conf=GOURCE_CONF,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.gource = _resolve(_split(gource))
+        self.encoder = _resolve(_split(encoder)) if encoder else None
+        self.conf = conf
+        self.batch_size = batch_size
+        # the exit status of the last run, see write_records
+        self.status = None
+
+    def __str__(self):
+        command = " ".join(shlex.quote(arg) for arg in self.gource_command())
+        if self.encoder:
+            command = "{0} | {1}".format(
+                command, " ".join(shlex.quote(arg) for arg in self.encoder))
+        return command
+
+    def gource_command(self):
+        '''
+        Return the arguments used to start Gource.
+        '''
+        command = list(self.gource)
+        if self.conf:
+            command.extend(['--load-config', self.conf])
+        if self.encoder:
+            command.extend(['--output-ppm-stream', '-'])
+        command.append('-')
+        return command
+
+    def write_records(self, records):
+        '''
+        Start Gource, and the encoder if there is one, stream the records
+        into it and wait for the processes to finish.
+
+        :return: the exit status of Gource, or of the encoder if Gource
+          succeeded. It is also kept in the status attribute.
+        '''
+        loop = asyncio.new_event_loop()
+        try:
+            self.status = loop.run_until_complete(self.run(records))
+        finally:
+            loop.close()
+        return self.status
+
+    async def run(self, records):
+        '''
+        Coroutine that streams the records into Gource. See write_records.
+        '''
+        encoder = None
+        gource_stdout = None
+        if self.encoder:
+            read_fd, write_fd = os.pipe()
+            try:
+                encoder = await asyncio.create_subprocess_exec(
+                    *self.encoder, stdin=read_fd)
+            finally:
+                os.close(read_fd)
+            gource_stdout = write_fd
+
+        try:
+            gource = await asyncio.create_subprocess_exec(
+                *self.gource_command(), stdin=asyncio.subprocess.PIPE,
+                stdout=gource_stdout)
+        except BaseException:
+            if encoder is not None:
+                encoder.kill()
+            raise
+        finally:
+            # the processes hold their own copies of the pipe
+            if gource_stdout is not None:
+                os.close(gource_stdout)
+
+        written = await self._feed(gource.stdin, records)
+        logger.info("Sent {0} records to gource".format(written))
+
+        status = await gource.wait()
+        if status != 0:
+            logger.error("gource exited with status {0}".format(status))
+        if encoder is not None:
+            encoder_status = await encoder.wait()
+            if encoder_status != 0:
+                logger.error(
+                    "encoder exited with status {0}".format(encoder_status))
+            if status == 0:
+                status = encoder_status
+        return status
+
+    async def _feed(self, stdin, records):
+        '''
+        Write the records to a process's stdin, waiting for the pipe to
+        drain after each batch. Stops early if the process closes its end
+        of the pipe, for example when the Gource window is closed.
+
+        :return: the number of records written.
+        '''
+        written = 0
+        try:
+            for batch in sinks.batches(records, self.batch_size):
+                stdin.write(sinks.format_records(batch))
+                written += len(batch)
+                await stdin.drain()
+            # add an empty line at the end to trigger EOF
+            stdin.write(b"\n")
+            await stdin.drain()
+            stdin.close()
+            await stdin.wait_closed()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning("gource stopped reading after {0} records".format(
+                written))
+        return written
+
+
+def _split(command):
+    '''
+    Return a command given as a string as a list of arguments.
+    '''
+    if isinstance(command, (list, tuple)):
+        return list(command)
+    return shlex.split(command)
+
+
+def _resolve(command):
+    '''
+    Return a command with its executable replaced by its full path.
+    '''
+    if not command:
+        raise ValueError("Empty command")
+    executable = shutil.which(command[0])
+    if executable is None:
+        raise ValueError("Command not found: {0}".format(command[0]))
+    return [executable] + command[1:]
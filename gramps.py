@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 '''
-This module implements a simple and naive Gramps XML file (.gramps) parser.
+This module implements a simple and naive Gramps XML file (.gramps) parser,
+along with a loader that reads the SQLite database of a Gramps family tree
+directly.
 
 Author: Chris Laws
 '''
@@ -9,14 +11,25 @@ Author: Chris Laws
 from __future__ import unicode_literals
 from future.builtins import str
 
+import array
+import bisect
+import calendar
+import collections
 import datetime
 import dateutil.parser
 import gzip
+import itertools
+import json
 import logging
-try:
-    from xml.etree import cElementTree as etree
-except ImportError:
-    from xml.etree import ElementTree as etree
+import os
+import pickle
+import re
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from xml.etree import ElementTree as etree
+
+from profiling import profiler
 
 
 logger = logging.getLogger(__name__)
@@ -32,8 +45,8 @@ def default_date_parser(datestring):
     # a valid datetime object can be created.
     if len(datestring.split("-")) == 2:
         logger.debug(
-            "{0} missing item from date string, using day 01 for"
-            " compatibility".format(datestring))
+            "%s missing item from date string, using day 01 for"
+            " compatibility", datestring)
         datestring = "{0}-01".format(datestring)
 
     # Dates are used in many different formats, use the
@@ -42,11 +55,86 @@ def default_date_parser(datestring):
     return dateutil.parser.parse(datestring)
 
 
+canonical_date_re = re.compile(r'^(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?$')
+
+
+def canonical_date_parser(datestring):
+    '''
+    Convert a canonical Gramps date string (YYYY, YYYY-MM or YYYY-MM-DD)
+    into a datetime object without involving dateutil.
+
+    The result matches what :func:`default_date_parser` returns for the same
+    string. Return None if the string is not in one of the canonical forms
+    or does not describe a valid date so that the caller can fall back to
+    the general purpose parser.
+    '''
+    match = canonical_date_re.match(datestring)
+    if match is None:
+        return None
+
+    year, month, day = match.groups()
+    year = int(year)
+    if month is None and year < 100:
+        # dateutil reads 0001 to 0099 on their own as a day of the month
+        # or a two digit year, so leave those to it.
+        return None
+    try:
+        if month is None:
+            # dateutil fills in a missing month and day from the current
+            # date, clipping the day to the length of the month.
+            today = datetime.date.today()
+            day = min(today.day, calendar.monthrange(year, today.month)[1])
+            return datetime.datetime(year, today.month, day)
+        return datetime.datetime(year, int(month), int(day or 1))
+    except ValueError:
+        return None
+
+
+def resolution_date():
+    '''
+    Return the date that dates are resolved against, as an ISO 8601
+    string. A date giving only a year takes its month and day from the
+    current date, as dateutil does, so the same date resolves differently
+    on another day. Anything keeping resolved dates records this date and
+    treats them as stale on a different day.
+    '''
+    return datetime.date.today().isoformat()
+
+
 class DateParser(object):
+    '''
+    Converts Gramps date strings into datetime objects using handlers
+    registered for each calendar format.
 
-    def __init__(self):
+    The same date strings repeat many times across a database so parsed
+    results are kept in a bounded least recently used cache keyed by the
+    date string and calendar format.
+
+    Canonical date strings handled by the default handler are converted
+    by :func:`canonical_date_parser` and only passed to the handler when
+    they are not in a canonical form.
+
+    :param cache_size: the maximum number of parsed dates to keep. A value
+      of 0 disables the cache.
+
+    :param fast_path: use the canonical date parser ahead of the default
+      handler.
+
+    The cache is guarded by a lock so that dates may be parsed by several
+    threads at once, for example by server.py.
+    '''
+
+    def __init__(self, cache_size=8192, fast_path=True):
 
         self.handlers = {}
+        self.cache_size = cache_size
+        self.fast_path = fast_path
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # cache statistics
+        self.hits = 0
+        self.misses = 0
 
         # register a default handler to use as a fallback.
         self.register('default', default_date_parser)
@@ -71,12 +159,65 @@ class DateParser(object):
                 'Duplicate date handlers detected for: %s', cal_format)
         self.handlers[cal_format] = handler
 
+        # A new handler may change how previously seen dates are parsed.
+        self.clear_cache()
+
+    def describe(self):
+        '''
+        Return a sorted list of (calendar format, handler name) pairs
+        identifying the registered handlers, for example to key results
+        that depend on how dates are parsed.
+        '''
+        return sorted(
+            (cal_format, "{0}.{1}".format(
+                getattr(handler, '__module__', None),
+                getattr(handler, '__qualname__',
+                        getattr(handler, '__name__', repr(handler)))))
+            for cal_format, handler in self.handlers.items())
+
+    def clear_cache(self):
+        '''
+        Discard all cached date parse results.
+        '''
+        with self._lock:
+            self._cache.clear()
+
     def parse(self, datestring, cal_format=None):
         ''' Parse a date string and return a datetime object.
 
         :param format: the format of the date string. For example, Islamic,
           French Republican, etc.
         '''
+        if self.cache_size <= 0:
+            return self._parse(datestring, cal_format)
+
+        key = (datestring, cal_format)
+        with self._lock:
+            try:
+                # Remove and re-insert the entry to mark it as most
+                # recently used.
+                dt = self._cache.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache[key] = dt
+                return dt
+
+        # Parse outside the lock, a handler may be slow.
+        dt = self._parse(datestring, cal_format)
+        with self._lock:
+            if key not in self._cache and \
+                    len(self._cache) >= self.cache_size:
+                self._cache.popitem(last=False)
+            self._cache[key] = dt
+        return dt
+
+    def _parse(self, datestring, cal_format):
+        '''
+        Parse a date string using the handler registered for the
+        calendar format, bypassing the cache.
+        '''
         cformat = cal_format or 'default'
 
         if cformat not in self.handlers:
@@ -86,6 +227,12 @@ class DateParser(object):
             cformat = 'default'
 
         handler = self.handlers.get(cformat)
+
+        if self.fast_path and handler is default_date_parser:
+            dt = canonical_date_parser(datestring)
+            if dt is not None:
+                return dt
+
         return handler(datestring)
 
 
@@ -107,6 +254,32 @@ def generate_timestring(dt):
     return dt.strftime(format)
 
 
+epoch_ordinal = datetime.date(1970, 1, 1).toordinal()
+
+
+def to_timestamp(dt):
+    '''
+    Return the integer Unix timestamp Gource requires for a datetime.
+
+    The timestamp is calculated using proleptic Gregorian calendar
+    arithmetic and naive datetimes are treated as UTC, so the result does
+    not depend on the host's timezone and works for dates before 1970.
+    '''
+    offset = dt.utcoffset()
+    if offset is not None:
+        dt = dt - offset
+    days = dt.toordinal() - epoch_ordinal
+    return days * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def normalize_name(name):
+    '''
+    Return a normalized form of a person's name suitable for use as a
+    lookup key. Case and repeated whitespace are ignored.
+    '''
+    return " ".join(name.split()).lower()
+
+
 class Place(object):
     '''
     A Gramps place object.
@@ -120,10 +293,14 @@ class Place(object):
        </placeobj>
     '''
 
+    __slots__ = ('store', 'handle', 'id', 'change', 'type', 'title', 'lat',
+                 'lon')
+
     def __init__(self, store):
         self.store = store
         self.handle = None
         self.id = None
+        self.change = None
         self.type = None
         self.title = None
         self.lat = None
@@ -171,37 +348,58 @@ class Event(object):
 
     '''
 
+    __slots__ = ('store', 'handle', 'id', 'change', 'type', 'description',
+                 'date', 'date_type', 'date_cformat', '_datetime',
+                 '_timestamp', 'place_handle', 'note_handles',
+                 'source_handles')
+
     def __init__(self, store):
         self.store = store
         self.handle = None
         self.id = None
+        self.change = None
         self.type = None
         self.description = None
         self.date = None
         self.date_type = None
         self.date_cformat = None
+        self._datetime = None
+        self._timestamp = None
 
         # handles
         self.place_handle = None
-        self.note_handles = []
-        self.source_handles = []
+        self.note_handles = ()
+        self.source_handles = ()
 
     @property
     def datetime(self):
         '''
-        Return a datetime object for this event date
+        Return a datetime object for this event date. The date is only
+        parsed the first time it is requested.
         '''
-        if self.date:
+        if self._datetime is None and self.date:
             try:
-                return date_processor.parse(
+                self._datetime = date_processor.parse(
                     self.date, cal_format=self.date_cformat)
+                profiler.count('dates_parsed')
             except Exception:
                 logger.exception(
                     "Problem parsing date: {0}, cal_format={1}".format(
-                        self.date, self.cformat))
+                        self.date, self.date_cformat))
                 raise
-        else:
-            return None
+        return self._datetime
+
+    @property
+    def timestamp(self):
+        '''
+        Return the Unix timestamp for this event date, or None if the event
+        has no date. The timestamp is only calculated the first time it is
+        requested, or in bulk by Store.resolve_dates.
+        '''
+        if self._timestamp is None and self.date:
+            self._timestamp = to_timestamp(self.datetime)
+            profiler.count('dates_resolved')
+        return self._timestamp
 
     def datetime_as_string(self):
         return generate_timestring(self.datetime)
@@ -249,22 +447,27 @@ class Person(object):
     A person object
     '''
 
+    __slots__ = ('store', 'handle', 'id', 'change', 'gender', 'firstnames',
+                 'prefix', 'surname', '_birth', '_death', 'event_handles',
+                 'child_of_handle', 'parent_in_handles', 'notes', '_events')
+
     def __init__(self, store):
         self.store = store
         self.handle = None
         self.id = None
+        self.change = None
         self.gender = None
-        self.firstnames = []
+        self.firstnames = ()
         self.prefix = None
         self.surname = None
         self._birth = None
         self._death = None
 
         # handles
-        self.event_handles = []
+        self.event_handles = ()
         self.child_of_handle = None
-        self.parent_in_handles = []
-        self.notes = []
+        self.parent_in_handles = ()
+        self.notes = ()
         self._events = None
 
     @property
@@ -301,16 +504,18 @@ class Person(object):
         '''
         if self._birth is None:
             # search through events
+            birth = None
             for event in self.events:
                 if event.type == 'Birth':
                     if event.date:
                         if event.date_type:
-                            self._birth = "{0} {1}".format(event.date_type,
-                                                           event.date)
+                            birth = "{0} {1}".format(event.date_type,
+                                                     event.date)
                         else:
-                            self._birth = event.date
+                            birth = event.date
                     else:
-                        self._birth = "unknown"
+                        birth = "unknown"
+            self._birth = birth
 
         return self._birth
 
@@ -334,16 +539,18 @@ class Person(object):
         '''
         if self._death is None:
             # search through events
+            death = None
             for event in self.events:
                 if event.type == 'Death':
                     if event.date:
                         if event.date_type:
-                            self._death = "{0} {1}".format(event.date_type,
-                                                           event.date)
+                            death = "{0} {1}".format(event.date_type,
+                                                     event.date)
                         else:
-                            self._death = event.date
+                            death = event.date
                     else:
-                        self._death = "unknown"
+                        death = "unknown"
+            self._death = death
 
         return self._death
 
@@ -362,11 +569,15 @@ class Person(object):
     @property
     def events(self):
         if self._events is None:
-            self._events = []
-            if self.event_handles:
-                for event_handle in self.event_handles:
-                    event = self.store.get_event(event_handle)
-                    self._events.append(event)
+            # Build the list before publishing it so that another thread
+            # never sees it partly filled.
+            events = []
+            for event_handle in self.event_handles:
+                event = self.store.get_event(event_handle)
+                # events outside the parse projection are not loaded
+                if event is not None:
+                    events.append(event)
+            self._events = events
         return self._events
 
     def associated_events(self, includeEventsWithNoDate=False):
@@ -382,110 +593,88 @@ class Person(object):
         dated_events = []
         undated_events = []
 
-        SiblingCutoffDatetime = None
+        # Avoid building debug messages when they will not be logged.
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        index = self.store.event_index
         directPersonEvent = True
 
+        # Events whose dates can not be parsed are treated as undated.
         for event in self.events:
-            if event.datetime:
-                if event.type in ['Immigration', 'Emmigration']:
-                    # This flag is used later to ensure we don't associate
-                    # siblings with this person's events after an immigration
-                    # event as it is assumed that the person would not be
-                    # involved/around these events.
-                    SiblingCutoffDatetime = event.datetime
+            if index.datetime(event):
                 dated_events.append((self, event, directPersonEvent))
             else:
                 if includeEventsWithNoDate:
                     undated_events.append((self, event, directPersonEvent))
-                else:
+                elif debug:
                     logger.debug(
                         "Discarding direct person event {0} for {1} as it "
                         "has no date".format(event.type, self.name))
-                    pass
 
         # now retrieve associated events that this person was involved with
         directPersonEvent = False
 
         if self.parent_in_handles:
-            logger.debug(
-                "{0} is a parent in {1} families".format(
-                    self.name, len(self.parent_in_handles)))
+            if debug:
+                logger.debug(
+                    "{0} is a parent in {1} families".format(
+                        self.name, len(self.parent_in_handles)))
             for parent_handle in self.parent_in_handles:
                 family = self.store.get_family(parent_handle)
                 # Add any family events such as marriage, divorce
-                logger.debug(
-                    "Family {0} has {1} family events".format(
-                        family.name, len(family.events)))
+                if debug:
+                    logger.debug(
+                        "Family {0} has {1} family events".format(
+                            family.name, len(family.events)))
                 for event in family.events:
-                    if event.datetime:
+                    if index.datetime(event):
                         dated_events.append(
                             (family, event, directPersonEvent))
                     else:
                         if includeEventsWithNoDate:
                             undated_events.append(
                                 (family, event, directPersonEvent))
-                        else:
+                        elif debug:
                             logger.debug(
                                 "Discarding associated family event {0} for "
                                 "{1} as it has no date".format(
                                     event.type, family.name))
-                            pass
 
-                logger.debug(
-                    "Family {0} has {1} children".format(
-                        family.name, len(family.children)))
                 # add birth of children
-                if family.children:
-                    for child in family.children:
-                        for event in child.events:
-                            if event.type == 'Birth':
-                                if event.datetime:
-                                    dated_events.append(
-                                        (child, event, directPersonEvent))
-                                else:
-                                    if includeEventsWithNoDate:
-                                        undated_events.append(
-                                            (child, event, directPersonEvent))
-                                    else:
-                                        logger.debug(
-                                            "Discarding associated family "
-                                            "event {0} for {1} as it has no "
-                                            "date".format(
-                                                event.type, child.name))
-                                        pass
+                _, births = index.child_births(parent_handle)
+                for child, event in births:
+                    dated_events.append((child, event, directPersonEvent))
+                if includeEventsWithNoDate:
+                    for child, event in index.undated_child_births(
+                            parent_handle):
+                        undated_events.append(
+                            (child, event, directPersonEvent))
 
         if self.child_of_handle:
             # potentially associate younger sibling location events too
-            # as this person was likely around those locations too.
-            family = self.store.get_family(self.child_of_handle)
-            logger.debug(
-                "Family {0} had {1} children".format(
-                    family.name, len(family.children)))
-            for sibling in family.children:
-                if sibling.handle != self.handle:
-                    for event in sibling.events:
-                        if event.type == 'Birth':
-                            if event.datetime:
-                                if event.datetime > self.birth_datetime:
-                                    # don't associate sibling birth events if they
-                                    # occur after the person has immigrated/emmigrated.
-                                    if SiblingCutoffDatetime is None:
-                                        dated_events.append(
-                                            (sibling, event, directPersonEvent))
-                                    else:
-                                        if event.datetime < SiblingCutoffDatetime:
-                                            dated_events.append(
-                                                (sibling, event, directPersonEvent))
-                            else:
-                                if includeEventsWithNoDate:
-                                    undated_events.append(
-                                        (sibling, event, directPersonEvent))
-                                else:
-                                    logger.debug(
-                                        "Discarding associated family event "
-                                        "{0} for {1} as it has no date" % (
-                                            event.type, sibling.name))
-                                    pass
+            # as this person was likely around those locations too. Only
+            # possible when this person's birth date is known.
+            birth_datetime = index.birth_datetime(self.handle)
+            if birth_datetime is not None:
+                # don't associate sibling birth events if they occur after
+                # the person has immigrated/emmigrated.
+                cutoff_datetime = index.cutoff_datetime(self.handle)
+                datetimes, births = index.child_births(self.child_of_handle)
+                first = bisect.bisect_right(datetimes, birth_datetime)
+                if cutoff_datetime is None:
+                    last = len(datetimes)
+                else:
+                    last = bisect.bisect_left(datetimes, cutoff_datetime)
+                for sibling, event in births[first:last]:
+                    if sibling is not self:
+                        dated_events.append(
+                            (sibling, event, directPersonEvent))
+            if includeEventsWithNoDate:
+                for sibling, event in index.undated_child_births(
+                        self.child_of_handle):
+                    if sibling is not self:
+                        undated_events.append(
+                            (sibling, event, directPersonEvent))
 
         # sort events in time order. This can only be done after
         # making sure that we only have events with dates.
@@ -506,32 +695,75 @@ class Person(object):
     def ancestors(self, ancestors=None):
         """
         Return an unordered list of this person's handle and those of their
-        ancestors.
+        ancestors. Each ancestor is listed once even when they are reached
+        through more than one line and loops in the data are not followed.
         """
-        logger.debug("Collecting ancestors for {0}".format(self.name))
+        logger.debug("Collecting ancestors for %s", self.name)
         if ancestors is None:
             ancestors = []
-        ancestors.append(self.handle)
-
-        if self.child_of_handle:
-            family = self.store.get_family(self.child_of_handle)
-
-            # walk up the father's tree
-            if family.father:
-                family.father.ancestors(ancestors)
-
-            # walk up the mother's tree
-            if family.mother:
-                family.mother.ancestors(ancestors)
+        seen = set(ancestors)
+
+        # Walk the tree using an explicit stack rather than recursion so
+        # that deep pedigrees do not hit the recursion limit.
+        stack = [self]
+        while stack:
+            person = stack.pop()
+            if person.handle in seen:
+                continue
+            seen.add(person.handle)
+            ancestors.append(person.handle)
+
+            if person.child_of_handle:
+                family = self.store.get_family(person.child_of_handle)
+                if family is None:
+                    continue
+
+                # push the mother first so the father's tree is walked first
+                if family.mother:
+                    stack.append(family.mother)
+
+                if family.father:
+                    stack.append(family.father)
 
         return ancestors
 
-    def descendents(self):
-        '''
-        Return an unordered list of this person's handle and those of their
-        descendents.
-        '''
-        raise NotImplementedError
+    def descendents(self, descendents=None, generations=None):
+        """
+        Return a list of this person's handle and those of their
+        descendents, nearest generations first. Each descendent is listed
+        once even when they are reached through more than one line.
+
+        :param generations: the number of generations to follow, all
+          generations by default. 0 lists only this person.
+        """
+        logger.debug("Collecting descendents for %s", self.name)
+        if descendents is None:
+            descendents = []
+        seen = set(descendents)
+        if self.handle in seen:
+            return descendents
+        seen.add(self.handle)
+
+        # Walk the tree breadth first using a queue rather than recursion
+        # so that long lines do not hit the recursion limit.
+        queue = collections.deque([(self, 0)])
+        while queue:
+            person, generation = queue.popleft()
+            descendents.append(person.handle)
+
+            if generations is not None and generation >= generations:
+                continue
+
+            for family_handle in person.parent_in_handles:
+                family = self.store.get_family(family_handle)
+                if family is None:
+                    continue
+                for child in family.children:
+                    if child.handle not in seen:
+                        seen.add(child.handle)
+                        queue.append((child, generation + 1))
+
+        return descendents
 
     def __str__(self):
         o = []
@@ -581,18 +813,24 @@ class Family(object):
 
     '''
 
+    __slots__ = ('store', 'handle', 'id', 'change', 'father_handle',
+                 'mother_handle', 'relationship', 'event_handles',
+                 'children_handles', 'step_children_handles', 'source_handles',
+                 '_mother', '_father', '_children', '_events')
+
     def __init__(self, store):
         self.store = store
         self.handle = None
         self.id = None
+        self.change = None
         self.father_handle = None
         self.mother_handle = None
         self.relationship = None
 
-        self.event_handles = []
-        self.children_handles = []
-        self.step_children_handles = []
-        self.source_handles = []
+        self.event_handles = ()
+        self.children_handles = ()
+        self.step_children_handles = ()
+        self.source_handles = ()
         self._mother = None
         self._father = None
         self._children = None
@@ -654,23 +892,27 @@ class Family(object):
     @property
     def children(self):
         if self._children is None:
-            self._children = []
-            if self.children_handles:
-                # search for children persons
-                for child_handle in self.children_handles:
-                    child = self.store.get_person(child_handle)
-                    if child:
-                        self._children.append(child)
+            # search for children persons
+            children = []
+            for child_handle in self.children_handles:
+                child = self.store.get_person(child_handle)
+                if child:
+                    children.append(child)
+            self._children = children
         return self._children
 
     @property
     def events(self):
         if self._events is None:
-            self._events = []
-            if self.event_handles:
-                for event_handle in self.event_handles:
-                    event = self.store.get_event(event_handle)
-                    self._events.append(event)
+            # Build the list before publishing it so that another thread
+            # never sees it partly filled.
+            events = []
+            for event_handle in self.event_handles:
+                event = self.store.get_event(event_handle)
+                # events outside the parse projection are not loaded
+                if event is not None:
+                    events.append(event)
+            self._events = events
         return self._events
 
     def __str__(self):
@@ -709,6 +951,82 @@ class Store(object):
         self.notes = {}
         self.sources = {}
 
+        # lookup indexes, built once the store has been loaded
+        self._name_index = None
+        self._id_index = None
+        self._event_index = None
+
+    def build_indexes(self):
+        '''
+        Build the person lookup indexes. This is called by the parser once
+        the store has been loaded and must be called again if persons are
+        added afterwards.
+        '''
+        name_index = {}
+        id_index = {}
+        for handle, person in self.persons.items():
+            key = normalize_name(person.name)
+            name_index.setdefault(key, []).append(handle)
+            if person.id:
+                id_index[person.id] = handle
+        self._name_index = name_index
+        self._id_index = id_index
+        logger.debug(
+            "Indexed {0} persons under {1} names".format(
+                len(self.persons), len(name_index)))
+
+    @property
+    def event_index(self):
+        '''
+        Return the EventIndex used to find the events associated with each
+        person. Persons and families are indexed as they are looked up.
+        The index must be rebuilt, by calling build_event_index, if the
+        store is changed afterwards.
+        '''
+        if self._event_index is None:
+            self._event_index = EventIndex(self)
+        return self._event_index
+
+    def build_event_index(self):
+        '''
+        Build the EventIndex for every person and family up front, in a
+        single pass over the persons and families.
+        '''
+        with profiler.stage('event_index'):
+            event_index = EventIndex(self)
+            event_index.fill()
+            self._event_index = event_index
+
+    def resolve_dates(self, events=None):
+        '''
+        Parse the date and calculate the timestamp of each event in a
+        single pass so that later reads are attribute lookups. Events whose
+        dates can not be parsed are logged and left unresolved.
+
+        :param events: the events to resolve, all events by default.
+
+        :return: the number of events with a resolved date.
+        '''
+        if events is None:
+            events = self.events.values()
+        resolved = 0
+        failed = 0
+        with profiler.stage('dates'):
+            for event in events:
+                if not event.date:
+                    continue
+                try:
+                    event.timestamp
+                except Exception:
+                    failed += 1
+                else:
+                    resolved += 1
+        if failed:
+            logger.warning(
+                "Could not resolve the dates of {0} events".format(failed))
+        logger.debug("Resolved the dates of {0} events".format(resolved))
+        return resolved
+
     def get_person(self, handle):
         '''
         Return the person with the specified handle
@@ -745,22 +1063,590 @@ class Store(object):
         '''
         return self.notes.get(handle, None)
 
-    def find_person(self, search_name):
+    def get_person_by_id(self, gramps_id):
+        '''
+        Return the person with the specified Gramps ID (e.g. I0001)
+        '''
+        if self._id_index is None:
+            self.build_indexes()
+        handle = self._id_index.get(gramps_id)
+        if handle:
+            return self.get_person(handle)
+        return None
+
+    def find_persons(self, search_name):
         '''
-        Return the handle for the first person found with a
-        matching name.
+        Return a list of handles for all persons with a matching name.
+        Names are compared ignoring case and repeated whitespace.
+        '''
+        if self._name_index is None:
+            self.build_indexes()
+        return list(self._name_index.get(normalize_name(search_name), []))
+
+    def find_person(self, search_term):
+        '''
+        Return the handle for the person identified by the search term.
+        The search term may be a person handle, a Gramps ID or a name.
+        When several persons share a name the first one found is returned.
         Return None if no match is found.
         '''
-        logger.debug("Searching for {0}".format(search_name))
-        search_person_handle = None
-        for person_handle in self.persons:
-            person = self.get_person(person_handle)
-            if person.name == search_name:
-                search_person_handle = person.handle
-                logger.debug("Found {0} with handle {1}".format(search_name,
-                                                                 person.handle))
-                break
-        return search_person_handle
+        logger.debug("Searching for {0}".format(search_term))
+
+        if search_term in self.persons:
+            return search_term
+
+        person = self.get_person_by_id(search_term)
+        if person:
+            logger.debug("Found {0} with handle {1}".format(search_term,
+                                                             person.handle))
+            return person.handle
+
+        person_handles = self.find_persons(search_term)
+        if not person_handles:
+            return None
+
+        if len(person_handles) > 1:
+            logger.warning(
+                "Found {0} persons named {1}, using {2}. Use a Gramps ID or "
+                "handle to select a different person".format(
+                    len(person_handles), search_term, person_handles[0]))
+        logger.debug("Found {0} with handle {1}".format(search_term,
+                                                         person_handles[0]))
+        return person_handles[0]
+
+
+# The event types after which a person no longer shares the lives of their
+# younger siblings. Gramps spells emigration correctly, older versions of
+# this module expected it misspelt so both are matched.
+MIGRATION_EVENTS = ('Immigration', 'Emigration', 'Emmigration')
+
+
+class EventIndex(object):
+    '''
+    The birth and migration dates of persons and the dated births of the
+    children of families. It lets Person.associated_events find the births
+    of children and younger siblings without rescanning the events of each
+    of them.
+
+    Each person and family is indexed the first time it is looked up, so
+    only the part of the store that is walked is ever indexed. Call fill
+    to index the whole store up front, for example before the index is
+    shared between threads.
+
+    Events whose dates can not be parsed are treated as undated.
+    '''
+
+    __slots__ = ('_store', '_persons', '_families', '_failed')
+
+    _no_births = ((), ())
+
+    def __init__(self, store):
+        self._store = store
+        # person handle -> (datetime of their (first) birth,
+        #                   datetime of their last migration)
+        self._persons = {}
+        # family handle -> ((sorted datetimes, [(child, event), ...]),
+        #                   [(child, event), ...] of undated births)
+        self._families = {}
+        # the number of events whose dates could not be parsed
+        self._failed = 0
+
+    def fill(self):
+        '''
+        Index every person and family in the store.
+        '''
+        failed = self._failed
+        for handle in self._store.persons:
+            self._person(handle)
+        for handle in self._store.families:
+            self._family(handle)
+        if self._failed > failed:
+            logger.warning(
+                "Could not parse the dates of {0} birth or migration "
+                "events".format(self._failed - failed))
+
+    def datetime(self, event):
+        '''
+        Return the datetime of an event, or None if it has none or its
+        date can not be parsed.
+        '''
+        try:
+            return event.datetime
+        except Exception:
+            self._failed += 1
+            logger.debug(
+                "Could not parse the date of event {0}".format(event.handle))
+            return None
+
+    def _person(self, handle):
+        '''
+        Return the (birth, cutoff) datetimes of a person, indexing the
+        person if this is the first lookup.
+        '''
+        entry = self._persons.get(handle)
+        if entry is not None:
+            return entry
+
+        birth_datetime = cutoff_datetime = None
+        person = self._store.persons.get(handle)
+        if person is not None:
+            birth_found = False
+            for event in person.events:
+                if event.type == 'Birth':
+                    if birth_found:
+                        continue
+                    birth_found = True
+                    birth_datetime = self.datetime(event)
+                elif event.type in MIGRATION_EVENTS:
+                    cutoff_datetime = self.datetime(event) or cutoff_datetime
+
+        entry = self._persons[handle] = (birth_datetime, cutoff_datetime)
+        return entry
+
+    def _family(self, handle):
+        '''
+        Return the dated and undated births of the children of a family,
+        indexing the family if this is the first lookup.
+        '''
+        entry = self._families.get(handle)
+        if entry is not None:
+            return entry
+
+        dated = []
+        undated = []
+        family = self._store.families.get(handle)
+        if family is not None:
+            for child in family.children:
+                for event in child.events:
+                    if event.type != 'Birth':
+                        continue
+                    event_datetime = self.datetime(event)
+                    if event_datetime:
+                        dated.append((event_datetime, child, event))
+                    else:
+                        undated.append((child, event))
+
+        births = self._no_births
+        if dated:
+            # the sort is stable so births on the same date stay in the
+            # order the children are listed in.
+            dated.sort(key=lambda birth: birth[0])
+            births = ([birth[0] for birth in dated],
+                      [(child, event) for _, child, event in dated])
+
+        entry = self._families[handle] = (births, undated)
+        return entry
+
+    def birth_datetime(self, person_handle):
+        '''
+        Return the datetime of a person's birth, or None if it is unknown.
+        '''
+        return self._person(person_handle)[0]
+
+    def cutoff_datetime(self, person_handle):
+        '''
+        Return the datetime of the last immigration or emigration of a
+        person, or None.
+        '''
+        return self._person(person_handle)[1]
+
+    def child_births(self, family_handle):
+        '''
+        Return a (datetimes, births) pair for the dated births of the
+        children of a family, sorted by date. births is a list of
+        (child, event) tuples and datetimes holds the date of each.
+        '''
+        return self._family(family_handle)[0]
+
+    def undated_child_births(self, family_handle):
+        '''
+        Return a list of (child, event) tuples for the undated births of
+        the children of a family.
+        '''
+        return self._family(family_handle)[1]
+
+
+def _csr(rows, index):
+    '''
+    Return a compressed sparse row representation of a list of handle
+    sequences as a pair of arrays. The integer ids of the handles in row i
+    are stored in values[offsets[i]:offsets[i + 1]]. Handles missing from
+    the index are dropped.
+    '''
+    offsets = array.array('l', [0])
+    values = array.array('l')
+    for row in rows:
+        for handle in row:
+            value = index.get(handle)
+            if value is not None:
+                values.append(value)
+        offsets.append(len(values))
+    return offsets, values
+
+
+class IndexedStore(Store):
+    '''
+    A Store that also holds an integer indexed, array backed copy of the
+    relationships between persons and families.
+
+    Each person and family is given a dense integer id (its position in
+    the *_handles lists). Relationships are kept in arrays indexed by those
+    ids, with one-to-many relationships stored in compressed sparse row
+    (CSR) form, so walking the tree is integer indexing rather than hashing
+    handle strings. The handle lists map the ids back to handles for
+    output.
+
+    The arrays are built from the model objects the first time a walk
+    needs them, see build_columns, so loading a store that is never walked
+    costs no more than loading a Store. The usual Store API (get_person,
+    get_family, etc) continues to work on top of the model objects.
+
+    Use it by passing an instance to the parser:
+
+        store = gramps.parser.parse(gramps_file, store=gramps.IndexedStore())
+    '''
+
+    def __init__(self):
+        super(IndexedStore, self).__init__()
+        self._clear_columns()
+
+    def _clear_columns(self):
+        self.columns_built = False
+
+        # id -> handle
+        self.person_handles = []
+        self.family_handles = []
+
+        # handle -> id
+        self.person_ids = {}
+        self.family_ids = {}
+
+        # person id -> family id they are a child of, or -1
+        self.person_child_of = array.array('l')
+
+        # family id -> father/mother person id, or -1
+        self.family_father = array.array('l')
+        self.family_mother = array.array('l')
+
+        # CSR adjacency: family -> children and person -> families they are
+        # a parent in.
+        self.family_children_offsets = array.array('l', [0])
+        self.family_children = array.array('l')
+        self.person_parent_in_offsets = array.array('l', [0])
+        self.person_parent_in = array.array('l')
+
+    def build_indexes(self):
+        '''
+        Build the person lookup indexes and discard any integer indexed
+        relationship arrays, which are rebuilt when next needed. This is
+        called by the parser once the store has been loaded and must be
+        called again if entities are added afterwards.
+        '''
+        super(IndexedStore, self).build_indexes()
+        self._clear_columns()
+
+    def build_columns(self):
+        '''
+        Build the integer indexed relationship arrays from the model
+        objects. They are built automatically by the first walk, call this
+        to build them up front, for example before a store is shared
+        between threads.
+        '''
+        self._clear_columns()
+
+        self.person_handles = list(self.persons)
+        self.family_handles = list(self.families)
+        self.person_ids = dict(
+            (handle, i) for i, handle in enumerate(self.person_handles))
+        self.family_ids = dict(
+            (handle, i) for i, handle in enumerate(self.family_handles))
+
+        persons = [self.persons[h] for h in self.person_handles]
+        families = [self.families[h] for h in self.family_handles]
+
+        self.person_child_of = array.array(
+            'l', (self.family_ids.get(p.child_of_handle, -1)
+                  for p in persons))
+        self.family_father = array.array(
+            'l', (self.person_ids.get(f.father_handle, -1) for f in families))
+        self.family_mother = array.array(
+            'l', (self.person_ids.get(f.mother_handle, -1) for f in families))
+
+        self.family_children_offsets, self.family_children = _csr(
+            (f.children_handles for f in families), self.person_ids)
+        self.person_parent_in_offsets, self.person_parent_in = _csr(
+            (p.parent_in_handles for p in persons), self.family_ids)
+        self.columns_built = True
+
+        logger.debug(
+            "Built integer indexes for {0} persons and {1} families".format(
+                len(persons), len(families)))
+
+    def children_of(self, family_id):
+        '''
+        Return the person ids of the children of a family.
+        '''
+        if not self.columns_built:
+            self.build_columns()
+        return self.family_children[
+            self.family_children_offsets[family_id]:
+            self.family_children_offsets[family_id + 1]]
+
+    def parent_in(self, person_id):
+        '''
+        Return the ids of the families a person is a parent in.
+        '''
+        if not self.columns_built:
+            self.build_columns()
+        return self.person_parent_in[
+            self.person_parent_in_offsets[person_id]:
+            self.person_parent_in_offsets[person_id + 1]]
+
+    def ancestor_ids(self, person_id):
+        '''
+        Return a list of the person id and those of their ancestors. Each
+        ancestor is listed once, fathers' lines are walked before mothers'.
+        '''
+        if not self.columns_built:
+            self.build_columns()
+        child_of = self.person_child_of
+        fathers = self.family_father
+        mothers = self.family_mother
+        seen = bytearray(len(self.person_handles))
+        ancestors = []
+        stack = [person_id]
+        while stack:
+            pid = stack.pop()
+            if seen[pid]:
+                continue
+            seen[pid] = 1
+            ancestors.append(pid)
+            fid = child_of[pid]
+            if fid >= 0:
+                if mothers[fid] >= 0:
+                    stack.append(mothers[fid])
+                if fathers[fid] >= 0:
+                    stack.append(fathers[fid])
+        return ancestors
+
+    def descendant_ids(self, person_id, generations=None):
+        '''
+        Return a list of the person id and those of their descendants in
+        breadth first order. Each descendant is listed once.
+
+        :param generations: the maximum number of generations to descend.
+          None means no limit.
+        '''
+        if not self.columns_built:
+            self.build_columns()
+        seen = bytearray(len(self.person_handles))
+        seen[person_id] = 1
+        descendants = [person_id]
+        generation = [person_id]
+        depth = 0
+        while generation and (generations is None or depth < generations):
+            depth += 1
+            next_generation = []
+            for pid in generation:
+                for fid in self.parent_in(pid):
+                    for child in self.children_of(fid):
+                        if not seen[child]:
+                            seen[child] = 1
+                            next_generation.append(child)
+            descendants.extend(next_generation)
+            generation = next_generation
+        return descendants
+
+    def ancestor_handles(self, handle):
+        '''
+        Return a list of the handles of a person and their ancestors.
+        '''
+        if not self.columns_built:
+            self.build_columns()
+        return [self.person_handles[pid]
+                for pid in self.ancestor_ids(self.person_ids[handle])]
+
+    def descendant_handles(self, handle, generations=None):
+        '''
+        Return a list of the handles of a person and their descendants.
+        '''
+        if not self.columns_built:
+            self.build_columns()
+        return [self.person_handles[pid]
+                for pid in self.descendant_ids(self.person_ids[handle],
+                                               generations=generations)]
+
+
+# The relatives followed by a focused parse.
+ANCESTORS = 'ancestors'
+DESCENDANTS = 'descendants'
+
+
+class Links(object):
+    '''
+    The links between persons and families read by the first pass of a
+    focused parse, see Parser.parse_links. Everything is keyed by handle.
+    '''
+
+    def __init__(self):
+        # persons
+        self.ids = {}
+        self.names = {}
+        self.child_of = {}
+        self.parent_in = {}
+        self.person_events = {}
+
+        # families
+        self.family_parents = {}
+        self.family_children = {}
+        self.family_events = {}
+
+    def find_person(self, search_term):
+        '''
+        Return the handle for the person identified by the search term,
+        which may be a person handle, a Gramps ID or a name, or None. This
+        matches persons in the same way as Store.find_person.
+        '''
+        if search_term in self.person_events:
+            return search_term
+
+        handle = self.ids.get(search_term)
+        if handle:
+            return handle
+
+        person_handles = self.names.get(normalize_name(search_term))
+        if not person_handles:
+            return None
+
+        if len(person_handles) > 1:
+            logger.warning(
+                "Found {0} persons named {1}, using {2}. Use a Gramps ID or "
+                "handle to select a different person".format(
+                    len(person_handles), search_term, person_handles[0]))
+        return person_handles[0]
+
+    def closure(self, handles, relatives=ANCESTORS, generations=None):
+        '''
+        Return the set of handles of the persons in handles and all of
+        their ancestors or descendants, up to a number of generations.
+        '''
+        if relatives not in (ANCESTORS, DESCENDANTS):
+            raise ValueError(
+                "Invalid relatives {0}, expected {1} or {2}".format(
+                    relatives, ANCESTORS, DESCENDANTS))
+
+        seen = set(handle for handle in handles
+                   if handle in self.person_events)
+        current = list(seen)
+        generation = 0
+        while current and (generations is None or generation < generations):
+            generation += 1
+            following = []
+            for handle in current:
+                if relatives == ANCESTORS:
+                    family = self.child_of.get(handle)
+                    families = (family,) if family else ()
+                    members = self.family_parents
+                else:
+                    families = self.parent_in.get(handle, ())
+                    members = self.family_children
+                for family in families:
+                    for relative in members.get(family, ()):
+                        if (relative not in seen and
+                                relative in self.person_events):
+                            seen.add(relative)
+                            following.append(relative)
+            current = following
+        return seen
+
+    def focus(self, focus, relatives=ANCESTORS, generations=None):
+        '''
+        Return the sets of person and family handles a focused load needs:
+        the focus persons and their ancestors or descendants, the families
+        those persons were born into or are parents in, and all members of
+        those families.
+
+        :param focus: a list of focus persons, each a handle, Gramps ID or
+          name.
+        '''
+        focus_handles = []
+        for search_term in focus:
+            handle = self.find_person(search_term)
+            if handle is None:
+                logger.warning("No person found for {0}".format(search_term))
+            else:
+                focus_handles.append(handle)
+
+        persons = self.closure(focus_handles, relatives, generations)
+
+        # Associated events are drawn from the families a person was born
+        # into or is a parent in, so load the whole of those families.
+        families = set()
+        for handle in persons:
+            if handle in self.child_of:
+                families.add(self.child_of[handle])
+            families.update(self.parent_in.get(handle, ()))
+        families.intersection_update(self.family_events)
+
+        members = set(persons)
+        for handle in families:
+            members.update(self.family_parents[handle])
+            members.update(self.family_children[handle])
+        members.intersection_update(self.person_events)
+
+        return members, families
+
+
+class Projection(object):
+    '''
+    Describes the parts of a Gramps database loaded by a parse. Elements
+    outside the projection are skipped without creating objects for them.
+
+    :param sections: the sections to load, any of 'people', 'families',
+      'events' and 'places'. All sections by default.
+
+    :param event_types: the types of events to load, such as 'Birth'. All
+      event types by default.
+
+    :param fields: the optional fields to load, any of FIELDS. All fields by
+      default.
+    '''
+
+    # The optional fields of the model objects.
+    FIELDS = ('gender', 'relationship', 'description', 'place', 'notes',
+              'sources', 'step_children', 'coordinates')
+
+    def __init__(self, sections=None, event_types=None, fields=None):
+        if sections is not None:
+            sections = frozenset(sections)
+            unknown = sections.difference(Parser.sections)
+            if unknown:
+                raise ValueError(
+                    "Unknown sections: {0}".format(", ".join(sorted(unknown))))
+        if event_types is not None:
+            event_types = frozenset(event_types)
+        if fields is not None:
+            fields = frozenset(fields)
+            unknown = fields.difference(self.FIELDS)
+            if unknown:
+                raise ValueError(
+                    "Unknown fields: {0}".format(", ".join(sorted(unknown))))
+        self.sections = sections
+        self.event_types = event_types
+        self.fields = fields
+
+    def wants_section(self, section):
+        return self.sections is None or section in self.sections
+
+    def wants_event(self, event_type):
+        return self.event_types is None or event_type in self.event_types
+
+    def wants(self, field):
+        return self.fields is None or field in self.fields
+
+
+# Load everything.
+FULL_PROJECTION = Projection()
 
 
 class NS:
@@ -770,11 +1656,18 @@ class NS:
     '''
     def __init__(self, uri):
         self.uri = uri
+        self._paths = {}
 
     def __getattr__(self, tag):
         return self.uri + tag
 
     def __call__(self, path):
+        # The parser asks for the same few paths for every element.
+        try:
+            return self._paths[path]
+        except KeyError:
+            pass
+
         prefix = None
         if path.startswith(".//"):
             items = path[3:].split("/")
@@ -791,6 +1684,7 @@ class NS:
         if prefix:
             ns_path = './/' + ns_path
 
+        self._paths[path] = ns_path
         return ns_path
 
 
@@ -804,180 +1698,1071 @@ def to_pretty_xml(elem):
     return reparsed.toprettyxml(indent="  ")
 
 
+class LoadContext(object):
+    '''
+    The state of a single parse or load, passed to each method that
+    processes an entity.
+
+    It is kept apart from the loader so that the module level parser and
+    sqlite_loader instances hold no state between calls, and can be used
+    by several threads at once, for example by server.py.
+    '''
+
+    __slots__ = ('strings', 'projection', 'decoders')
+
+    def __init__(self, projection=None):
+        # Table of strings already seen during this load, see intern.
+        self.strings = {}
+        # The Projection describing what to load.
+        if projection is None:
+            projection = FULL_PROJECTION
+        self.projection = projection
+        # table -> (column, decode function) of a SQLite load, see
+        # SQLiteLoader._connect.
+        self.decoders = {}
+
+    def intern(self, value):
+        '''
+        Return the shared copy of a string seen during this load.
+        '''
+        if value is None:
+            return None
+        return self.strings.setdefault(value, value)
+
+
 class Parser(object):
+    '''
+    A streaming Gramps XML parser.
+
+    The gzipped database is decompressed incrementally and fed through
+    ``iterparse``. Each person, family, event and place element is turned
+    into a model object as soon as it closes and is then cleared, so peak
+    memory grows with the size of the Store rather than the size of the XML.
 
-    def parse(self, gramps_file):
+    Handles and other frequently repeated strings are interned for the
+    duration of a parse so that every reference to the same handle shares
+    one string object. Handle lists are stored as tuples.
+    '''
+
+    # Maps the top level section tags onto the entity tag they contain
+    # and the name of the method used to process each entity element.
+    sections = {
+        'people': ('person', '_parse_person'),
+        'families': ('family', '_parse_family'),
+        'events': ('event', '_parse_event'),
+        'places': ('placeobj', '_parse_place'),
+    }
+
+    # The sections read by parse_links.
+    link_sections = {
+        'people': ('person', '_link_person'),
+        'families': ('family', '_link_family'),
+    }
+
+    def parse(self, gramps_file, store=None, handles=None, projection=None):
         """
+        @param store: an empty store object to populate, for example an
+        IndexedStore. A new Store is used by default.
+        @param handles: a dict mapping section names, such as 'people' or
+        'events', onto the set of handles to load from that section. Other
+        entities in those sections are skipped. Sections that are not
+        listed are loaded in full.
+        @param projection: a Projection describing the sections, event
+        types and fields to load. Everything is loaded by default.
         @return: a store object populated with content extracted from the database.
         """
 
         logger.info("Loading Gramps database from {0}".format(gramps_file))
 
-        store = Store()
+        if store is None:
+            store = Store()
 
-        with gzip.GzipFile(filename=gramps_file, mode="rb", compresslevel=9) as fd:
-            data = fd.read()
+        if projection is None:
+            projection = FULL_PROJECTION
+        sections = dict(
+            (section, entity) for section, entity in self.sections.items()
+            if projection.wants_section(section))
 
-            root = etree.fromstring(data)
+        context = LoadContext(projection)
 
-            # Detect the namespace so we know what to place in front
-            # of the known tag names.
-            detected_namespace = ""
-            items = root.tag.split("}")
-            if len(items) == 2:
-                namespace_candidate, tag = items
-                if "{" in namespace_candidate:
-                    # There is a namespace prefix
-                    detected_namespace = '{%s}' % namespace_candidate[1:]
+        with profiler.stage('parse'):
+            for section_tag, method_name, node, GrampsNS in \
+                    self._iter_entities(gramps_file, sections):
+                if handles and section_tag in handles:
+                    if node.attrib.get('handle') not in handles[section_tag]:
+                        continue
+                getattr(self, method_name)(node, GrampsNS, store, context)
 
-            GrampsNS = NS(detected_namespace)
+            # TODO:
+            # extract sources
+            # extract notes
+            # etc
 
-            # Extract person entries into Person objects and store them
-            # in the persons dict keyed by the person's handle.
-            #
-            personNodes = root.findall(GrampsNS('.//people/person'))
+        profiler.count('persons_loaded', len(store.persons))
+        profiler.count('families_loaded', len(store.families))
+        profiler.count('events_loaded', len(store.events))
+        profiler.count('places_loaded', len(store.places))
 
-            for personNode in personNodes:
-                p = Person(store)
-                p.id = personNode.attrib.get('id')
+        with profiler.stage('index'):
+            store.build_indexes()
 
-                genderNode = personNode.find(GrampsNS('gender'))
-                p.gender = genderNode.text
+        return store
 
-                handle = personNode.attrib.get('handle')
-                p.handle = handle
-                store.persons[handle] = p
+    def parse_links(self, gramps_file):
+        """
+        Read only the links between persons and families, along with the
+        IDs and names needed to find persons and the handles of their
+        events. This is much quicker than a full parse as no events, places
+        or dates are processed.
 
-                nameNode = personNode.find(GrampsNS('name'))
-                if nameNode:
+        @return: a Links object.
+        """
+        logger.info("Loading Gramps links from {0}".format(gramps_file))
 
-                    firstnameNode = nameNode.find(GrampsNS('first'))
-                    if firstnameNode is not None:
-                        p.firstnames = firstnameNode.text.split(" ")
-                    else:
-                        pass  # No first name node found
+        links = Links()
+        context = LoadContext()
 
-                    surnameNode = nameNode.find(GrampsNS('surname'))
-                    if surnameNode is not None:
-                        p.surname = surnameNode.text
-                        p.prefix = surnameNode.attrib.get('prefix')
-                    else:
-                        pass  # No surname node found
-                else:
-                    pass  # No name node found
+        with profiler.stage('links'):
+            for section_tag, method_name, node, GrampsNS in \
+                    self._iter_entities(gramps_file, self.link_sections):
+                getattr(self, method_name)(node, GrampsNS, links, context)
 
-                for eventNode in personNode.findall(GrampsNS('eventref')):
-                    event_handle = eventNode.attrib.get('hlink')
-                    p.event_handles.append(event_handle)
+        return links
 
-                for parentinNode in personNode.findall(GrampsNS('parentin')):
-                    parentin_handle = parentinNode.attrib.get('hlink')
-                    p.parent_in_handles.append(parentin_handle)
+    def parse_focused(self, gramps_file, focus, store=None,
+                      relatives=ANCESTORS, generations=None, projection=None):
+        """
+        Load only the part of a database needed for the relatives of some
+        focus persons. A first pass reads the links between persons and
+        families, from which the ancestors or descendants of the focus
+        persons are found. A second pass then loads those persons, the
+        families they belong to along with the other members of those
+        families, and their events. Places are always loaded in full.
+
+        @param focus: a list of focus persons, each a handle, Gramps ID or
+        name.
+        @param relatives: ANCESTORS or DESCENDANTS.
+        @param generations: the maximum number of generations to follow,
+        all generations by default.
+        @param projection: a Projection limiting what is loaded for the
+        focused persons, see parse.
+        @return: a store object populated with the focused content.
+        """
+        links = self.parse_links(gramps_file)
+        members, families = links.focus(focus, relatives, generations)
+
+        events = set()
+        for handle in members:
+            events.update(links.person_events[handle])
+        for handle in families:
+            events.update(links.family_events[handle])
+
+        logger.info(
+            "Focused load of {0} of {1} persons, {2} of {3} families".format(
+                len(members), len(links.person_events), len(families),
+                len(links.family_events)))
+
+        return self.parse(
+            gramps_file, store,
+            handles={'people': members, 'families': families,
+                     'events': events},
+            projection=projection)
+
+    def _iter_entities(self, gramps_file, sections):
+        '''
+        Generate a (section tag, method name, node, namespace) tuple for
+        each entity element found in the listed sections of a gzipped
+        Gramps file. Each element is cleared once the caller has processed
+        it. Reading stops as soon as all of the listed sections have been
+        read, so trailing sections such as notes are not decompressed.
+
+        :param sections: a dict mapping section tags onto the entity tag
+          they contain and the name of the method used to process them.
+        '''
+        with gzip.open(gramps_file, "rb") as fd:
+
+            GrampsNS = None
+            entity_tag = None
+            method_name = None
+            section = None
+            section_tag = None
+            remaining = set(sections)
+            depth = 0
+
+            for event, node in etree.iterparse(fd, events=('start', 'end')):
+
+                if event == 'start':
+                    depth += 1
+
+                    if depth == 1:
+                        # Detect the namespace so we know what to place in
+                        # front of the known tag names.
+                        detected_namespace = ""
+                        items = node.tag.split("}")
+                        if len(items) == 2:
+                            namespace_candidate, tag = items
+                            if "{" in namespace_candidate:
+                                # There is a namespace prefix
+                                detected_namespace = '{%s}' % namespace_candidate[1:]
+                        GrampsNS = NS(detected_namespace)
+
+                    elif depth == 2:
+                        # Entering a top level section such as people or
+                        # events. Work out which entities it contains.
+                        section = node
+                        entity_tag = None
+                        method_name = None
+                        section_tag = node.tag[len(GrampsNS.uri):]
+                        if section_tag in sections:
+                            tag, method_name = sections[section_tag]
+                            entity_tag = getattr(GrampsNS, tag)
+                    continue
+
+                depth -= 1
+
+                if depth == 2:
+                    # An entity element has closed and is complete.
+                    if node.tag == entity_tag:
+                        yield section_tag, method_name, node, GrampsNS
+
+                    # Release the finished element, and any siblings that
+                    # have already been processed, so the section does not
+                    # accumulate the whole tree.
+                    node.clear()
+                    section.clear()
+
+                elif depth == 1:
+                    node.clear()
+                    remaining.discard(section_tag)
+                    if not remaining:
+                        break
+
+    def _change(self, node, context):
+        '''
+        Return the time an entity was last changed in Gramps, from the
+        change attribute of its element, as an interned int of seconds
+        since the epoch, or None.
+        '''
+        change = node.attrib.get('change')
+        if change is None:
+            return None
+        return context.intern(int(change))
+
+    def _hlinks(self, node, path, context):
+        '''
+        Return a tuple of the interned hlink handles of the child elements
+        of node matching path.
+        '''
+        return tuple(context.intern(child.attrib.get('hlink'))
+                     for child in node.findall(path))
+
+    def _link_person(self, personNode, GrampsNS, links, context):
+        '''
+        Record the ID, name, families and events of a person.
+        '''
+        handle = context.intern(personNode.attrib.get('handle'))
+
+        gramps_id = personNode.attrib.get('id')
+        if gramps_id:
+            links.ids[gramps_id] = handle
+
+        firstnames = ""
+        surname = None
+        nameNode = personNode.find(GrampsNS('name'))
+        if nameNode is not None:
+            firstnameNode = nameNode.find(GrampsNS('first'))
+            if firstnameNode is not None:
+                firstnames = firstnameNode.text
+            surnameNode = nameNode.find(GrampsNS('surname'))
+            if surnameNode is not None:
+                surname = surnameNode.text
+        key = normalize_name("{0} {1}".format(firstnames, surname))
+        links.names.setdefault(key, []).append(handle)
+
+        links.person_events[handle] = self._hlinks(
+            personNode, GrampsNS('eventref'), context)
+        links.parent_in[handle] = self._hlinks(
+            personNode, GrampsNS('parentin'), context)
+
+        childofNode = personNode.find(GrampsNS('childof'))
+        if childofNode is not None:
+            links.child_of[handle] = context.intern(
+                childofNode.attrib.get('hlink'))
+
+    def _link_family(self, familyNode, GrampsNS, links, context):
+        '''
+        Record the parents, children and events of a family.
+        '''
+        handle = context.intern(familyNode.attrib.get('handle'))
+        links.family_parents[handle] = tuple(
+            parent for parent in (
+                self._hlinks(familyNode, GrampsNS('father'), context) +
+                self._hlinks(familyNode, GrampsNS('mother'), context))
+            if parent)
+        links.family_children[handle] = self._hlinks(
+            familyNode, GrampsNS('childref'), context)
+        links.family_events[handle] = self._hlinks(
+            familyNode, GrampsNS('eventref'), context)
+
+    def _parse_person(self, personNode, GrampsNS, store, context):
+        '''
+        Extract a person entry into a Person object and store it in the
+        persons dict keyed by the person's handle.
+        '''
+        projection = context.projection
+
+        p = Person(store)
+        p.id = personNode.attrib.get('id')
+        p.change = self._change(personNode, context)
 
-                childofNode = personNode.find(GrampsNS('childof'))
-                if childofNode is not None:
-                    p.child_of_handle = childofNode.attrib.get('hlink')
+        if projection.wants('gender'):
+            genderNode = personNode.find(GrampsNS('gender'))
+            p.gender = context.intern(genderNode.text)
 
-                for noteNode in personNode.findall(GrampsNS('noteref')):
-                    note_handle = noteNode.attrib.get('hlink')
-                    p.notes.append(note_handle)
+        handle = context.intern(personNode.attrib.get('handle'))
+        p.handle = handle
+        store.persons[handle] = p
 
-            familyNodes = root.findall(GrampsNS('.//families/family'))
+        nameNode = personNode.find(GrampsNS('name'))
+        if nameNode is not None:
 
-            for familyNode in familyNodes:
-                f = Family(store)
-                f.id = familyNode.attrib.get('id')
+            firstnameNode = nameNode.find(GrampsNS('first'))
+            if firstnameNode is not None:
+                p.firstnames = tuple(
+                    context.intern(firstname)
+                    for firstname in firstnameNode.text.split(" "))
+            else:
+                pass  # No first name node found
 
-                motherNode = familyNode.find(GrampsNS('mother'))
-                if motherNode is not None:
-                    f.mother_handle = motherNode.attrib.get('hlink')
+            surnameNode = nameNode.find(GrampsNS('surname'))
+            if surnameNode is not None:
+                p.surname = context.intern(surnameNode.text)
+                p.prefix = context.intern(surnameNode.attrib.get('prefix'))
+            else:
+                pass  # No surname node found
+        else:
+            pass  # No name node found
 
-                fatherNode = familyNode.find(GrampsNS('father'))
-                if fatherNode is not None:
-                    f.father_handle = fatherNode.attrib.get('hlink')
+        p.event_handles = self._hlinks(
+            personNode, GrampsNS('eventref'), context)
+        p.parent_in_handles = self._hlinks(
+            personNode, GrampsNS('parentin'), context)
 
-                relationshipNode = familyNode.find(GrampsNS('rel'))
-                if relationshipNode is not None:
-                    f.relationship = relationshipNode.attrib.get('type')
+        childofNode = personNode.find(GrampsNS('childof'))
+        if childofNode is not None:
+            p.child_of_handle = context.intern(childofNode.attrib.get('hlink'))
 
-                for eventNode in familyNode.findall(GrampsNS('eventref')):
-                    f.event_handles.append(eventNode.attrib.get('hlink'))
+        if projection.wants('notes'):
+            p.notes = self._hlinks(personNode, GrampsNS('noteref'), context)
 
-                handle = familyNode.attrib.get('handle')
-                f.handle = handle
-                store.families[handle] = f
+    def _parse_family(self, familyNode, GrampsNS, store, context):
+        '''
+        Extract a family entry into a Family object and store it in the
+        families dict keyed by the family's handle.
+        '''
+        projection = context.projection
+
+        f = Family(store)
+        f.id = familyNode.attrib.get('id')
+        f.change = self._change(familyNode, context)
+
+        motherNode = familyNode.find(GrampsNS('mother'))
+        if motherNode is not None:
+            f.mother_handle = context.intern(motherNode.attrib.get('hlink'))
+
+        fatherNode = familyNode.find(GrampsNS('father'))
+        if fatherNode is not None:
+            f.father_handle = context.intern(fatherNode.attrib.get('hlink'))
+
+        if projection.wants('relationship'):
+            relationshipNode = familyNode.find(GrampsNS('rel'))
+            if relationshipNode is not None:
+                f.relationship = context.intern(
+                    relationshipNode.attrib.get('type'))
+
+        f.event_handles = self._hlinks(
+            familyNode, GrampsNS('eventref'), context)
+
+        handle = context.intern(familyNode.attrib.get('handle'))
+        f.handle = handle
+        store.families[handle] = f
+
+        children_handles = []
+        step_children_handles = []
+        for childNode in familyNode.findall(GrampsNS('childref')):
+            child_handle = context.intern(childNode.attrib.get('hlink'))
+            if childNode.attrib.get('frel') == 'Stepchild':
+                step_children_handles.append(child_handle)
+            else:
+                children_handles.append(child_handle)
+        f.children_handles = tuple(children_handles)
+        if projection.wants('step_children'):
+            f.step_children_handles = tuple(step_children_handles)
 
-                for childNode in familyNode.findall(GrampsNS('childref')):
-                    child_handle = childNode.attrib.get('hlink')
-                    if childNode.attrib.get('frel') == 'Stepchild':
-                        f.step_children_handles.append(child_handle)
-                    else:
-                        f.children_handles.append(child_handle)
+        if projection.wants('sources'):
+            f.source_handles = self._hlinks(
+                familyNode, GrampsNS('sourceref'), context)
 
-                for sourceNode in familyNode.findall(GrampsNS('sourceref')):
-                    source_handle = sourceNode.attrib.get('hlink')
-                    f.source_handles.append(source_handle)
+    def _parse_event(self, eventNode, GrampsNS, store, context):
+        '''
+        Extract an event entry into an Event object and store it in the
+        events dict keyed by the event's handle.
+        '''
+        projection = context.projection
+
+        event_type = None
+        typeNode = eventNode.find(GrampsNS('type'))
+        if typeNode is not None:
+            event_type = typeNode.text
+        if not projection.wants_event(event_type):
+            return
+
+        e = Event(store)
+        e.id = eventNode.attrib.get('id')
+        e.change = self._change(eventNode, context)
+        e.type = context.intern(event_type)
+
+        handle = context.intern(eventNode.attrib.get('handle'))
+        e.handle = handle
+        store.events[handle] = e
+
+        datevalNode = eventNode.find(GrampsNS('dateval'))
+        if datevalNode is not None:
+            e.date = context.intern(datevalNode.attrib.get('val'))
+            e.date_type = context.intern(datevalNode.attrib.get('type'))
+            e.date_cformat = context.intern(datevalNode.attrib.get('cformat'))
+
+        if projection.wants('description'):
+            descriptionNode = eventNode.find(GrampsNS('description'))
+            if descriptionNode is not None:
+                e.description = descriptionNode.text
+
+        if projection.wants('place'):
+            placeNode = eventNode.find(GrampsNS('place'))
+            if placeNode is not None:
+                e.place_handle = context.intern(placeNode.attrib.get('hlink'))
+
+        if projection.wants('notes'):
+            e.note_handles = self._hlinks(
+                eventNode, GrampsNS('noteref'), context)
+        if projection.wants('sources'):
+            e.source_handles = self._hlinks(
+                eventNode, GrampsNS('sourceref'), context)
+
+    def _parse_place(self, placeNode, GrampsNS, store, context):
+        '''
+        Extract a place entry into a Place object and store it in the
+        places dict keyed by the place's handle.
+        '''
+        p = Place(store)
+        p.id = placeNode.attrib.get('id')
+        p.change = self._change(placeNode, context)
 
-            eventNodes = root.findall(GrampsNS('.//events/event'))
+        handle = context.intern(placeNode.attrib.get('handle'))
+        p.handle = handle
+        store.places[handle] = p
 
-            for eventNode in eventNodes:
-                e = Event(store)
-                e.id = personNode.attrib.get('id')
+        titleNode = placeNode.find(GrampsNS('ptitle'))
+        if titleNode is not None:
+            p.title = titleNode.text
 
-                handle = eventNode.attrib.get('handle')
-                e.handle = handle
-                store.events[handle] = e
+        if context.projection.wants('coordinates'):
+            coordNode = placeNode.find(GrampsNS('coord'))
+            if coordNode is not None:
+                p.lat = coordNode.attrib.get('lat')
+                p.lon = coordNode.attrib.get('long')
 
-                typeNode = eventNode.find(GrampsNS('type'))
-                if typeNode is not None:
-                    e.type = typeNode.text
 
-                datevalNode = eventNode.find(GrampsNS('dateval'))
-                if datevalNode is not None:
-                    e.date = datevalNode.attrib.get('val')
-                    e.date_type = datevalNode.attrib.get('type')
-                    e.cformat = datevalNode.attrib.get('cformat')
+parser = Parser()
 
-                descriptionNode = eventNode.find(GrampsNS('description'))
-                if descriptionNode is not None:
-                    e.description = descriptionNode.text
 
-                placeNode = eventNode.find(GrampsNS('place'))
-                if placeNode is not None:
-                    e.place_handle = placeNode.attrib.get('hlink')
+# The first bytes of every SQLite database file.
+SQLITE_MAGIC = b'SQLite format 3\x00'
 
-                for noteNode in eventNode.findall(GrampsNS('noteref')):
-                    note_handle = noteNode.attrib.get('hlink')
-                    e.note_handles.append(note_handle)
+# The database file inside a Gramps family tree directory that uses the
+# SQLite backend, such as ~/.gramps/grampsdb/5a1b2c3d/sqlite.db.
+SQLITE_TREE_FILE = 'sqlite.db'
 
-                for sourceNode in eventNode.findall(GrampsNS('sourceref')):
-                    source_handle = sourceNode.attrib.get('hlink')
-                    e.source_handles.append(source_handle)
+# The maximum number of handles bound into a single query. Older SQLite
+# builds allow at most 999 parameters.
+SQLITE_BATCH_SIZE = 500
 
-            placeNodes = root.findall(GrampsNS('.//places/placeobj'))
+# The names Gramps gives its built in event types, as written to the type
+# element of an XML export, keyed by the EventType value it stores.
+GRAMPS_EVENT_TYPES = {
+    -1: 'Unknown', 1: 'Marriage', 2: 'Marriage Settlement',
+    3: 'Marriage License', 4: 'Marriage Contract', 5: 'Marriage Banns',
+    6: 'Engagement', 7: 'Divorce', 8: 'Divorce Filing', 9: 'Annulment',
+    10: 'Alternate Marriage', 11: 'Adopted', 12: 'Birth', 13: 'Death',
+    14: 'Adult Christening', 15: 'Baptism', 16: 'Bar Mitzvah',
+    17: 'Bat Mitzvah', 18: 'Blessing', 19: 'Burial', 20: 'Cause Of Death',
+    21: 'Census', 22: 'Christening', 23: 'Confirmation', 24: 'Cremation',
+    25: 'Degree', 26: 'Education', 27: 'Elected', 28: 'Emigration',
+    29: 'First Communion', 30: 'Immigration', 31: 'Graduation',
+    32: 'Medical Information', 33: 'Military Service', 34: 'Naturalization',
+    35: 'Nobility Title', 36: 'Number of Marriages', 37: 'Occupation',
+    38: 'Ordination', 39: 'Probate', 40: 'Property', 41: 'Religion',
+    42: 'Residence', 43: 'Retirement', 44: 'Will',
+}
 
-            for placeNode in placeNodes:
-                p = Place(store)
-                p.id = placeNode.attrib.get('id')
+GRAMPS_GENDERS = {0: 'F', 1: 'M', 2: 'U'}
 
-                handle = placeNode.attrib.get('handle')
-                p.handle = handle
-                store.places[handle] = p
+GRAMPS_FAMILY_TYPES = {
+    0: 'Married', 1: 'Unmarried', 2: 'Civil Union', 3: 'Unknown'}
 
-                titleNode = placeNode.find(GrampsNS('ptitle'))
-                if titleNode is not None:
-                    p.title = titleNode.text
+# The date modifiers Gramps exports as a dateval element, mapped onto the
+# element's type attribute. Ranges, spans and text only dates are exported
+# as other elements, which the XML parser does not read either.
+GRAMPS_DATE_MODIFIERS = {
+    0: None, 1: 'before', 2: 'after', 3: 'about', 7: 'from', 8: 'to'}
 
-                coordNode = placeNode.find(GrampsNS('coord'))
-                if coordNode is not None:
-                    p.lat = coordNode.attrib.get('lat')
-                    p.lon = coordNode.attrib.get('long')
+GRAMPS_CALENDARS = {
+    0: None, 1: 'Julian', 2: 'Hebrew', 3: 'French Republican',
+    4: 'Persian', 5: 'Islamic', 6: 'Swedish'}
 
-            # TODO:
-            # extract sources
-            # extract notes
-            # etc
+# The ChildRefType value of a step child.
+GRAMPS_STEPCHILD = 3
 
-            return store
 
-parser = Parser()
+def sqlite_database_file(path):
+    '''
+    Return the SQLite database file for a path naming either the file
+    itself or a Gramps family tree directory, or None if the path is not a
+    SQLite database.
+    '''
+    if os.path.isdir(path):
+        path = os.path.join(path, SQLITE_TREE_FILE)
+    try:
+        with open(path, 'rb') as fd:
+            magic = fd.read(len(SQLITE_MAGIC))
+    except (IOError, OSError):
+        return None
+    return path if magic == SQLITE_MAGIC else None
+
+
+def loader_for(gramps_file):
+    '''
+    Return the loader for a Gramps file: sqlite_loader for a Gramps SQLite
+    database or family tree directory, otherwise the XML parser.
+    '''
+    if sqlite_database_file(gramps_file):
+        return sqlite_loader
+    return parser
+
+
+def _gramps_type(value):
+    '''
+    Return the name of a serialized Gramps type, which is stored as a
+    (value, string) tuple by Gramps 5.1 and as a dict by later versions.
+    Custom types carry their own name.
+    '''
+    if isinstance(value, dict):
+        return value.get('value'), value.get('string')
+    return value[0], value[1]
+
+
+def _dateval(date):
+    '''
+    Return the val, type and cformat attributes Gramps writes to the
+    dateval element of an XML export for a serialized date, or None if the
+    date is empty or is not exported as a dateval.
+    '''
+    if not date:
+        return None
+    if isinstance(date, dict):
+        cal, modifier, dateval = (
+            date.get('calendar'), date.get('modifier'), date.get('dateval'))
+    else:
+        cal, modifier, dateval = date[0], date[1], date[3]
+    if modifier not in GRAMPS_DATE_MODIFIERS or not dateval:
+        return None
+
+    day, month, year = dateval[:3]
+    if not (day or month or year):
+        return None
+    # Unknown parts are written as question marks, as Gramps does.
+    val = "{0:04d}".format(year) if year else "????"
+    if month:
+        val += "-{0:02d}".format(month)
+    elif day:
+        val += "-??"
+    if day:
+        val += "-{0:02d}".format(day)
+    return val, GRAMPS_DATE_MODIFIERS[modifier], GRAMPS_CALENDARS.get(cal)
+
+
+# Gramps 5.1 stores each object as a pickled tuple, later versions store it
+# as JSON. These convert the tuples, which are positional, into the same
+# dicts the JSON holds, keeping only the fields that are loaded.
+
+def _person_from_blob(data):
+    name = data[3]
+    return {
+        'handle': data[0],
+        'gramps_id': data[1],
+        'gender': data[2],
+        'primary_name': {
+            'first_name': name[4],
+            'surname_list': [{'surname': surname[0], 'prefix': surname[1]}
+                             for surname in name[5]],
+        },
+        'event_ref_list': [{'ref': ref[4]} for ref in data[7]],
+        'family_list': data[8],
+        'parent_family_list': data[9],
+        'note_list': data[16],
+        'change': data[17],
+    }
+
+
+def _family_from_blob(data):
+    return {
+        'handle': data[0],
+        'gramps_id': data[1],
+        'father_handle': data[2],
+        'mother_handle': data[3],
+        'child_ref_list': [{'ref': ref[3], 'frel': ref[4]}
+                           for ref in data[4]],
+        'type': data[5],
+        'event_ref_list': [{'ref': ref[4]} for ref in data[6]],
+        'citation_list': data[10],
+        'change': data[12],
+    }
+
+
+def _event_from_blob(data):
+    return {
+        'handle': data[0],
+        'gramps_id': data[1],
+        'type': data[2],
+        'date': data[3],
+        'description': data[4],
+        'place': data[5],
+        'citation_list': data[6],
+        'note_list': data[7],
+        'change': data[10],
+    }
+
+
+def _place_from_blob(data):
+    return {
+        'handle': data[0],
+        'gramps_id': data[1],
+        'title': data[2],
+        'long': data[3],
+        'lat': data[4],
+        'change': data[15],
+    }
+
+
+class SQLiteLoader(object):
+    '''
+    Loads a Store straight from the SQLite database of a Gramps family
+    tree, avoiding the need to export it to a .gramps file first.
+
+    Both the Gramps 5.1 layout, where each object is a pickled tuple in a
+    blob_data column, and the later layout, where each object is JSON in a
+    json_data column, are read. Objects are converted into the same model
+    objects, with the same values, as the XML parser produces from an
+    export of the database.
+
+    The loader has the same interface as Parser. A focused load reads the
+    families table to find the relatives of the focus persons and then
+    selects only the persons, families, events and places they need.
+    '''
+
+    # Maps the sections of a Gramps export onto the table holding them and
+    # the name of the method used to process each row.
+    sections = {
+        'people': ('person', '_load_person'),
+        'families': ('family', '_load_family'),
+        'events': ('event', '_load_event'),
+        'places': ('place', '_load_place'),
+    }
+
+    # The order sections are loaded in, so that the handles of the events
+    # and places needed are known before those tables are read.
+    section_order = ('people', 'families', 'events', 'places')
+
+    blob_converters = {
+        'person': _person_from_blob,
+        'family': _family_from_blob,
+        'event': _event_from_blob,
+        'place': _place_from_blob,
+    }
+
+    def parse(self, gramps_file, store=None, handles=None, projection=None):
+        """
+        @param gramps_file: a Gramps SQLite database file or a Gramps
+        family tree directory holding one.
+        @param store: an empty store object to populate, for example an
+        IndexedStore. A new Store is used by default.
+        @param handles: a dict mapping section names, such as 'people' or
+        'events', onto the set of handles to load from that section. Only
+        those rows are selected. Sections that are not listed are loaded
+        in full.
+        @param projection: a Projection describing the sections, event
+        types and fields to load. Everything is loaded by default.
+        @return: a store object populated with content read from the
+        database.
+        """
+        def select(section, store):
+            return handles.get(section) if handles else None
+        return self._load(gramps_file, store, projection, select)
+
+    def parse_links(self, gramps_file):
+        """
+        Read the links between persons and families. The persons give
+        their IDs, names and families, the families their parents,
+        children and events. The event handles of persons are not filled
+        in as they are read along with the persons themselves.
+
+        @return: a Links object.
+        """
+        db_file = self._database_file(gramps_file)
+        logger.info("Loading Gramps links from {0}".format(db_file))
+
+        links = Links()
+        context = LoadContext()
+
+        connection = self._connect(db_file, context)
+        try:
+            with profiler.stage('links'):
+                self._link_persons(connection, links, context)
+                for data in self._rows(connection, 'family', context):
+                    self._link_family(data, links, context)
+        finally:
+            connection.close()
+
+        return links
+
+    def parse_focused(self, gramps_file, focus, store=None,
+                      relatives=ANCESTORS, generations=None, projection=None):
+        """
+        Load only the part of a database needed for the relatives of some
+        focus persons, see Parser.parse_focused. The persons and families
+        are selected by handle, followed by the events they refer to and
+        the places of those events.
+        """
+        links = self.parse_links(gramps_file)
+        members, families = links.focus(focus, relatives, generations)
+
+        logger.info(
+            "Focused load of {0} of {1} persons, {2} of {3} families".format(
+                len(members), len(links.person_events), len(families),
+                len(links.family_events)))
+
+        def select(section, store):
+            if section == 'people':
+                return members
+            if section == 'families':
+                return families
+            if section == 'events':
+                # Loaded after the persons and families, whose events they
+                # are.
+                events = set()
+                for obj in itertools.chain(store.persons.values(),
+                                           store.families.values()):
+                    events.update(obj.event_handles)
+                return events
+            if store.events and projection.wants('place'):
+                return set(event.place_handle
+                           for event in store.events.values()
+                           if event.place_handle)
+            return None
+
+        if projection is None:
+            projection = FULL_PROJECTION
+        return self._load(gramps_file, store, projection, select)
+
+    def _load(self, gramps_file, store, projection, select):
+        '''
+        Load the sections of a database wanted by a projection into a
+        store, in section_order.
+
+        :param select: a function called with each section name and the
+          store loaded so far, which returns the handles to load from that
+          section, or None to load the whole section.
+        '''
+        db_file = self._database_file(gramps_file)
+        logger.info("Loading Gramps SQLite database from {0}".format(db_file))
+
+        if store is None:
+            store = Store()
+
+        if projection is None:
+            projection = FULL_PROJECTION
+
+        context = LoadContext(projection)
+
+        connection = self._connect(db_file, context)
+        try:
+            with profiler.stage('parse'):
+                for section in self.section_order:
+                    if not projection.wants_section(section):
+                        continue
+                    table, method_name = self.sections[section]
+                    method = getattr(self, method_name)
+                    for data in self._rows(connection, table, context,
+                                           select(section, store)):
+                        method(data, store, context)
+        finally:
+            connection.close()
+
+        profiler.count('persons_loaded', len(store.persons))
+        profiler.count('families_loaded', len(store.families))
+        profiler.count('events_loaded', len(store.events))
+        profiler.count('places_loaded', len(store.places))
+
+        with profiler.stage('index'):
+            store.build_indexes()
+
+        return store
+
+    def _database_file(self, gramps_file):
+        db_file = sqlite_database_file(gramps_file)
+        if db_file is None:
+            raise ValueError(
+                "{0} is not a Gramps SQLite database".format(gramps_file))
+        return db_file
+
+    def _connect(self, db_file, context):
+        '''
+        Open a database read only and work out which column each table
+        keeps its objects in, recording it in the decoders of the load
+        context.
+        '''
+        connection = sqlite3.connect(
+            "file:{0}?mode=ro".format(pathname2url(os.path.abspath(db_file))),
+            uri=True)
+        decoders = context.decoders
+        for table, _ in self.sections.values():
+            columns = self._columns(connection, table)
+            if 'json_data' in columns:
+                decoders[table] = ('json_data', json.loads)
+            elif 'blob_data' in columns:
+                decoders[table] = (
+                    'blob_data', self._blob_decoder(table))
+            else:
+                connection.close()
+                raise ValueError(
+                    "Unsupported Gramps database, the {0} table has no "
+                    "blob_data or json_data column".format(table))
+        return connection
+
+    def _columns(self, connection, table):
+        return set(row[1] for row in connection.execute(
+            "PRAGMA table_info({0})".format(table)))
+
+    def _blob_decoder(self, table):
+        convert = self.blob_converters[table]
+
+        def decode(blob):
+            return convert(pickle.loads(blob))
+        return decode
+
+    def _rows(self, connection, table, context, handles=None):
+        '''
+        Generate the decoded objects held in a table, either all of them
+        or only those with the given handles.
+        '''
+        column, decode = context.decoders[table]
+        query = "SELECT {0} FROM {1}".format(column, table)
+        if handles is None:
+            for row in connection.execute(query):
+                yield decode(row[0])
+            return
+
+        handles = list(handles)
+        for start in range(0, len(handles), SQLITE_BATCH_SIZE):
+            batch = handles[start:start + SQLITE_BATCH_SIZE]
+            batch_query = "{0} WHERE handle IN ({1})".format(
+                query, ", ".join("?" * len(batch)))
+            for row in connection.execute(batch_query, batch):
+                yield decode(row[0])
+
+    def _handles(self, values, context):
+        return tuple(context.intern(value) for value in values)
+
+    def _refs(self, refs, context):
+        return tuple(context.intern(ref['ref']) for ref in refs)
+
+    def _link_persons(self, connection, links, context):
+        '''
+        Record the ID, name and families of every person. As in
+        _load_person, a person is a child of the first family in their
+        parent family list, whatever order the families list them in.
+        The families are only held in the blob or JSON data, so the
+        person rows are decoded even where Gramps 5.1 keeps the ID and
+        names in their own columns.
+        '''
+        for data in self._rows(connection, 'person', context):
+            handle = context.intern(data['handle'])
+            if data['gramps_id']:
+                links.ids[data['gramps_id']] = handle
+            key = normalize_name("{0} {1}".format(
+                data['primary_name']['first_name'], self._surname(data)[0]))
+            links.names.setdefault(key, []).append(handle)
+            links.person_events[handle] = ()
+            links.parent_in[handle] = self._handles(
+                data['family_list'], context)
+            if data['parent_family_list']:
+                links.child_of[handle] = context.intern(
+                    data['parent_family_list'][0])
+
+    def _link_family(self, data, links, context):
+        '''
+        Record the parents, children and events of a family.
+        '''
+        handle = context.intern(data['handle'])
+        parents = tuple(
+            context.intern(parent)
+            for parent in (data['father_handle'], data['mother_handle'])
+            if parent)
+        links.family_parents[handle] = parents
+        links.family_children[handle] = self._refs(
+            data['child_ref_list'], context)
+        links.family_events[handle] = self._refs(
+            data['event_ref_list'], context)
+
+    def _surname(self, data):
+        '''
+        Return the surname and prefix of a person's primary name. As in an
+        XML export, this is the first surname listed.
+        '''
+        surnames = data['primary_name']['surname_list']
+        if not surnames:
+            return None, None
+        return surnames[0]['surname'], surnames[0]['prefix'] or None
+
+    def _load_person(self, data, store, context):
+        '''
+        Convert a person into a Person object and store it in the persons
+        dict keyed by the person's handle.
+        '''
+        projection = context.projection
+
+        p = Person(store)
+        p.id = data['gramps_id']
+        p.change = context.intern(data.get('change'))
+
+        if projection.wants('gender'):
+            p.gender = GRAMPS_GENDERS.get(data['gender'], 'U')
+
+        handle = context.intern(data['handle'])
+        p.handle = handle
+        store.persons[handle] = p
+
+        first_name = data['primary_name']['first_name']
+        if first_name:
+            p.firstnames = tuple(
+                context.intern(firstname)
+                for firstname in first_name.split(" "))
+        surname, prefix = self._surname(data)
+        p.surname = context.intern(surname)
+        p.prefix = context.intern(prefix)
+
+        p.event_handles = self._refs(data['event_ref_list'], context)
+        p.parent_in_handles = self._handles(data['family_list'], context)
+        if data['parent_family_list']:
+            p.child_of_handle = context.intern(data['parent_family_list'][0])
+
+        if projection.wants('notes'):
+            p.notes = self._handles(data['note_list'], context)
+
+    def _load_family(self, data, store, context):
+        '''
+        Convert a family into a Family object and store it in the families
+        dict keyed by the family's handle.
+        '''
+        projection = context.projection
+
+        f = Family(store)
+        f.id = data['gramps_id']
+        f.change = context.intern(data.get('change'))
+        f.mother_handle = context.intern(data['mother_handle'] or None)
+        f.father_handle = context.intern(data['father_handle'] or None)
+
+        if projection.wants('relationship'):
+            value, name = _gramps_type(data['type'])
+            f.relationship = context.intern(
+                GRAMPS_FAMILY_TYPES.get(value, name))
+
+        f.event_handles = self._refs(data['event_ref_list'], context)
+
+        handle = context.intern(data['handle'])
+        f.handle = handle
+        store.families[handle] = f
+
+        children_handles = []
+        step_children_handles = []
+        for ref in data['child_ref_list']:
+            child_handle = context.intern(ref['ref'])
+            if _gramps_type(ref['frel'])[0] == GRAMPS_STEPCHILD:
+                step_children_handles.append(child_handle)
+            else:
+                children_handles.append(child_handle)
+        f.children_handles = tuple(children_handles)
+        if projection.wants('step_children'):
+            f.step_children_handles = tuple(step_children_handles)
+
+        if projection.wants('sources'):
+            f.source_handles = self._handles(data['citation_list'], context)
+
+    def _load_event(self, data, store, context):
+        '''
+        Convert an event into an Event object and store it in the events
+        dict keyed by the event's handle.
+        '''
+        projection = context.projection
+
+        value, name = _gramps_type(data['type'])
+        event_type = GRAMPS_EVENT_TYPES.get(value, name)
+        if not projection.wants_event(event_type):
+            return
+
+        e = Event(store)
+        e.id = data['gramps_id']
+        e.change = context.intern(data.get('change'))
+        e.type = context.intern(event_type)
+
+        handle = context.intern(data['handle'])
+        e.handle = handle
+        store.events[handle] = e
+
+        dateval = _dateval(data['date'])
+        if dateval is not None:
+            e.date, e.date_type, e.date_cformat = (
+                context.intern(value) for value in dateval)
+
+        if projection.wants('description'):
+            e.description = data['description'] or None
+
+        if projection.wants('place'):
+            e.place_handle = context.intern(data['place'] or None)
+
+        if projection.wants('notes'):
+            e.note_handles = self._handles(data['note_list'], context)
+        if projection.wants('sources'):
+            e.source_handles = self._handles(data['citation_list'], context)
+
+    def _load_place(self, data, store, context):
+        '''
+        Convert a place into a Place object and store it in the places dict
+        keyed by the place's handle.
+        '''
+        p = Place(store)
+        p.id = data['gramps_id']
+        p.change = context.intern(data.get('change'))
+
+        handle = context.intern(data['handle'])
+        p.handle = handle
+        store.places[handle] = p
+
+        p.title = data['title'] or None
+
+        if context.projection.wants('coordinates'):
+            p.lat = data['lat'] or None
+            p.lon = data['long'] or None
+
+
+sqlite_loader = SQLiteLoader()
@@ -31,293 +31,1044 @@ Author: Chris Laws
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
-from future.builtins import open
 from future.builtins import int
 
-import datetime
+import collections
+import heapq
 import logging
+import multiprocessing
+import pickle
 import sys
-import time
+import tempfile
 
 import gramps
+import sinks
+import snapshot
+from profiling import profiler
 
 
 logger = logging.getLogger(__name__)
 
 
-ref_dt = datetime.datetime(1970, 1, 1, 0, 0, 0)
-ref_timestamp = time.mktime(ref_dt.timetuple())
-try:
-    secondsInOneDay = datetime.timedelta(days=1).total_seconds()
-except AttributeError as ex:
-    # python2.6 does not have total_seconds
-    one_day_dt = datetime.timedelta(days=1)
-    secondsInOneDay = (one_day_dt.microseconds + (one_day_dt.seconds + one_day_dt.days * 24 * 3600) * 10**6) / 10**6
-
-
 GOURCE_ADDED = 'A'     # maps to birth
 GOURCE_DELETED = 'D'   # maps to death
 GOURCE_MODIFIED = 'M'  # maps to change
 GOURCE_UNKNOWN = '?'   # maps to nothing
 
 
+# The Gource action used for each event type other than Birth, which is an
+# addition for the person born and a change for their relatives.
+GOURCE_EVENT_ACTIONS = {
+    'Baptism': GOURCE_MODIFIED,
+    'Christening': GOURCE_MODIFIED,
+    'Death': GOURCE_DELETED,
+    'Burial': GOURCE_MODIFIED,
+    'Cremation': GOURCE_MODIFIED,
+    'Marriage': GOURCE_MODIFIED,
+    'Marriage Banns': GOURCE_MODIFIED,
+    'Census': GOURCE_MODIFIED,
+    'Divorce': GOURCE_MODIFIED,
+    'Divorce Filing': GOURCE_MODIFIED,
+    'Electoral Roll': GOURCE_MODIFIED,
+    'Emigration': GOURCE_MODIFIED,
+    'Residence': GOURCE_MODIFIED,
+    'Property': GOURCE_MODIFIED,
+    'Immigration': GOURCE_MODIFIED,
+    'Emmigration': GOURCE_MODIFIED,
+    'Occupation': GOURCE_MODIFIED,
+    'Probate': GOURCE_MODIFIED,
+}
+
+
+# How ancestors reached through more than one line (pedigree collapse) are
+# represented in the Gource paths.
+COLLAPSE_FIRST = 'first'          # only at the first path found
+COLLAPSE_ALL = 'all'              # at every path, with all their ancestors
+COLLAPSE_REFERENCE = 'reference'  # at every path, ancestors only once
+COLLAPSE_MODES = (COLLAPSE_FIRST, COLLAPSE_ALL, COLLAPSE_REFERENCE)
+
+
+# How the directories of the Gource paths are named. Each path starts with
+# the handle of the focus person, or of the person in timeline mode. With
+# compact paths the directories below the first are named by a person's
+# place among their relatives.
+PATHS_HANDLES = 'handles'  # every directory is named by a person's handle
+PATHS_COMPACT = 'compact'  # see FATHER_STEP and get_descendants
+PATH_MODES = (PATHS_HANDLES, PATHS_COMPACT)
+
+# The directories of the father and mother of a person in compact pedigree
+# paths, so that the path of an ancestor spells out their Ahnentafel number
+# in binary after its leading 1.
+FATHER_STEP = '0'
+MOTHER_STEP = '1'
+
+
+# The default maximum number of records held in memory while sorting.
+DEFAULT_SORT_BUFFER_SIZE = 1000000
+
+# The default number of persons whose event dates are resolved together
+# when producing a timeline.
+DEFAULT_TIMELINE_BATCH_SIZE = 10000
+
+
+# The parts of a Gramps database used by each output mode. A pedigree only
+# plots births and labels each person with their birth and death dates.
+PROJECTIONS = {
+    'pedigree': gramps.Projection(
+        sections=('people', 'families', 'events'),
+        event_types=('Birth', 'Death'),
+        fields=()),
+    'timeline': gramps.Projection(
+        sections=('people', 'families', 'events'),
+        event_types=['Birth'] + list(GOURCE_EVENT_ACTIONS),
+        fields=()),
+}
+PROJECTIONS['descendants'] = PROJECTIONS['timeline']
+
+# The output modes.
+MODES = ('pedigree', 'descendants', 'timeline')
+
+
+class RecordSorter(object):
+    '''
+    Sort a stream of log records using a bounded amount of memory.
+
+    Records are collected in memory until the buffer is full, at which point
+    they are sorted and spilled to a temporary file as a sorted run.
+    Iterating over the sorter heap merges the spilled runs with the records
+    still held in memory.
+
+    :param buffer_size: the maximum number of records held in memory.
+
+    :param batch_size: the number of records pickled together when a run is
+      spilled to disk.
+    '''
+
+    def __init__(self, buffer_size=DEFAULT_SORT_BUFFER_SIZE, batch_size=1024):
+        self.buffer_size = max(1, buffer_size)
+        self.batch_size = batch_size
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+        self._sorted = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, record):
+        '''
+        Add a record to the sorter.
+        '''
+        self._buffer.append(record)
+        self._sorted = False
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self._spill()
+
+    def extend(self, records):
+        '''
+        Add all records from an iterable to the sorter.
+        '''
+        for record in records:
+            self.add(record)
+
+    def _spill(self):
+        '''
+        Sort the records held in memory and write them to a temporary file.
+        '''
+        self._buffer.sort()
+        logger.debug("Spilling %s sorted records to disk", len(self._buffer))
+        fd = tempfile.TemporaryFile()
+        for i in range(0, len(self._buffer), self.batch_size):
+            pickle.dump(self._buffer[i:i + self.batch_size], fd,
+                        pickle.HIGHEST_PROTOCOL)
+        fd.seek(0)
+        self._runs.append(fd)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(fd):
+        '''
+        Generate the records stored in a spilled run.
+        '''
+        while True:
+            try:
+                batch = pickle.load(fd)
+            except EOFError:
+                return
+            for record in batch:
+                yield record
+
+    def sort(self):
+        '''
+        Sort the records held in memory. Spilled runs are already sorted and
+        are merged while iterating.
+        '''
+        if not self._sorted:
+            self._buffer.sort()
+            self._sorted = True
+
+    def __iter__(self):
+        self.sort()
+        if not self._runs:
+            return iter(self._buffer)
+        runs = [self._read_run(fd) for fd in self._runs]
+        runs.append(self._buffer)
+        return heapq.merge(*runs)
+
+    def close(self):
+        '''
+        Discard all records and remove any temporary files.
+        '''
+        for fd in self._runs:
+            fd.close()
+        self._runs = []
+        self._buffer = []
+        self._sorted = False
+        self.count = 0
+
+
+def reverse_time(records):
+    '''
+    Negate the timestamp of each record so that sorting the records causes
+    Gource to display them in reverse order.
+    '''
+    for ts, name, event, path in records:
+        yield (ts * -1, name, event, path)
+
+
+# The Gramps2Gource instance and events cache used by pedigree worker
+# processes.
+_worker = None
+_worker_events_cache = {}
+
+
+def _init_worker(store=None):
+    '''
+    Initialise a pedigree worker process. Forked workers inherit the
+    parent's Gramps2Gource instance, other workers are passed its store.
+    '''
+    global _worker
+    if store is not None:
+        _worker = Gramps2Gource(None, store=store)
+    _worker_events_cache.clear()
+
+
+def _pedigree_job(task):
+    '''
+    Return the time reversed pedigree records for one focus person. They
+    are left unsorted, the parent sorts the records of every focus person
+    together.
+    '''
+    name, collapse, paths = task
+    return list(reverse_time(_worker._pedigree_records(
+        name, collapse, _worker_events_cache, paths)))
+
+
+def write_records(records, output_file):
+    '''
+    Write log records to a file in the Gource custom log format.
+
+    :param output_file: the file to write the records to, which is
+      compressed according to its extension or scheme, '-' to write them
+      to stdout or an open file object, which is left open. See
+      sinks.open_sink for the outputs supported. It may also be an object
+      with a write_records method, such as a gource_pipe.GourcePipe, which
+      is passed the records instead.
+    '''
+    sinks.open_sink(output_file).write_records(records)
+
+
 class Gramps2Gource(object):
     '''
     Create Gource custom logs from Gramps data files.
     '''
 
-    def __init__(self, gramps_file):
-        self.db = gramps.parser.parse(gramps_file)
+    def __init__(self, gramps_file, store=None, cache_dir=None,
+                 focus=None, projection=None, relatives=gramps.ANCESTORS,
+                 log_cache=None):
+        '''
+        :param gramps_file: the Gramps .gramps file to load, or a Gramps
+          SQLite database or family tree directory, which is read directly
+          by gramps.sqlite_loader.
+
+        :param store: an already loaded Store to use instead of parsing
+          the gramps_file.
+
+        :param cache_dir: a directory to keep a snapshot of the parsed
+          gramps_file in. The snapshot is used instead of parsing the file
+          while the file is unchanged. See snapshot.SnapshotCache.
+
+        :param focus: a list of focus persons. When supplied only the focus
+          persons, their relatives and their close family are loaded from
+          the gramps_file, which is much quicker for large files. Ignored
+          when a cache_dir is used as a snapshot holds the whole file.
+
+        :param relatives: the relatives of the focus persons that are
+          loaded, gramps.ANCESTORS or gramps.DESCENDANTS.
+
+        :param projection: a gramps.Projection limiting the parts of the
+          gramps_file that are loaded, see PROJECTIONS. Ignored when a
+          cache_dir is used.
+
+        :param log_cache: a log_cache.LogCache holding logs already
+          generated from the gramps_file. Logs found in it are streamed from
+          the cache, new logs are added to it.
+
+        The gramps_file is only loaded when the store is first needed, so
+        logs served from the log_cache do not load it at all.
+        '''
+        self.gramps_file = gramps_file
+        self.cache_dir = cache_dir
+        self.focus = focus
+        self.projection = projection
+        self.relatives = relatives
+        self.log_cache = log_cache
+        self._db = store
+
+    @property
+    def db(self):
+        '''
+        The Store holding the Gramps data, loaded the first time it is
+        requested.
+        '''
+        if self._db is None:
+            self._db = self._load()
+        return self._db
+
+    def _load(self):
+        # The integer indexes of an IndexedStore are used to find the sets
+        # of relatives of the focus persons, see ancestor_handles.
+        gramps_file = self.gramps_file
+        if self.cache_dir:
+            return snapshot.SnapshotCache(
+                self.cache_dir, store_class=gramps.IndexedStore).load(
+                    gramps_file)
+        loader = gramps.loader_for(gramps_file)
+        if self.focus:
+            return loader.parse_focused(
+                gramps_file, self.focus, store=gramps.IndexedStore(),
+                relatives=self.relatives, projection=self.projection)
+        return loader.parse(gramps_file, store=gramps.IndexedStore(),
+                            projection=self.projection)
+
+    def ancestor_handles(self, person):
+        """
+        Return a list of the handles of a person and their ancestors, each
+        listed once however many lines they are reached through. Unlike
+        get_ancestors no paths are built, so this is the quicker way to
+        find who is in a pedigree. The walk uses the integer indexes when
+        the store is an IndexedStore.
+        """
+        if isinstance(self.db, gramps.IndexedStore):
+            return self.db.ancestor_handles(person.handle)
+        return person.ancestors()
+
+    def descendant_handles(self, person, generations=None):
+        """
+        Return a list of the handles of a person and their descendants,
+        nearest generations first and each listed once, see
+        ancestor_handles.
+
+        :param generations: the number of generations to follow, all
+          generations by default.
+        """
+        if isinstance(self.db, gramps.IndexedStore):
+            return self.db.descendant_handles(
+                person.handle, generations=generations)
+        return person.descendents(generations=generations)
 
-    def get_ancestors(self, person, ancestors=None, gource_prefix=None):
+    def get_ancestors(self, person, ancestors=None, gource_prefix=None,
+                      collapse=COLLAPSE_REFERENCE, paths=PATHS_HANDLES):
         """
         Return an unordered list of tuples for this person and their
         ancestors. Each tuple contains a person handle and a pseudo-path
         to be used by Gource.
+
+        Ancestors reached through more than one line are represented
+        according to the collapse mode:
+
+          - first: listed only at the first path they are found on.
+          - all: listed at every path they are found on along with all of
+            their ancestors. The output can grow exponentially with depth.
+          - reference: listed at every path they are found on but their
+            ancestors are only listed under the first path.
+
+        Below the focus person each directory of a path is named by the
+        ancestor's handle or, with compact paths, by FATHER_STEP or
+        MOTHER_STEP. Both give Gource the same tree.
+
+        Loops in the data are detected and not followed.
         """
-        logger.debug("Collecting ancestors for {0}".format(person.name))
+        logger.debug("Collecting ancestors for %s", person.name)
+
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(
+                "Invalid collapse mode {0}, expected one of {1}".format(
+                    collapse, ", ".join(COLLAPSE_MODES)))
+
+        if paths not in PATH_MODES:
+            raise ValueError(
+                "Invalid path mode {0}, expected one of {1}".format(
+                    paths, ", ".join(PATH_MODES)))
+        compact = paths == PATHS_COMPACT
 
         if ancestors is None:
             ancestors = []
 
-        # Construct a pseudo path from the person's unique handle.
-        if gource_prefix:
-            gource_prefix = "{0}/{1}".format(gource_prefix, person.handle)
-        else:
-            gource_prefix = person.handle
+        if isinstance(self.db, gramps.IndexedStore):
+            return self._indexed_ancestors(
+                person, ancestors, gource_prefix, collapse, compact)
+
+        expanded = set()
+
+        # Walk the tree using an explicit stack rather than recursion so
+        # that deep pedigrees do not hit the recursion limit. Each entry
+        # holds a person, the path prefix leading to them and, when every
+        # path is being followed, the handles of their descendants on that
+        # path which are used to detect loops, and the name of their
+        # directory.
+        stack = [(person, gource_prefix, (), person.handle)]
+        while stack:
+            person, gource_prefix, lineage, step = stack.pop()
+            handle = person.handle
+
+            if handle in lineage:
+                logger.warning(
+                    "Loop detected in the ancestors of {0}, not "
+                    "following it".format(person.name))
+                continue
+
+            if handle in expanded and collapse == COLLAPSE_FIRST:
+                continue
+
+            # Construct a pseudo path from the directories leading to the
+            # person.
+            if gource_prefix:
+                gource_prefix = gource_prefix + "/" + step
+            else:
+                gource_prefix = step
+
+            gource_path = gource_prefix + "/" + person.name_with_dates
+            ancestors.append((handle, gource_path))
+
+            if handle in expanded and collapse == COLLAPSE_REFERENCE:
+                continue
+            expanded.add(handle)
+
+            if person.child_of_handle:
+                family = self.db.get_family(person.child_of_handle)
+                if family is None:
+                    continue
+
+                if collapse == COLLAPSE_ALL:
+                    lineage = lineage + (handle,)
+
+                # push the mother first so the father's tree is walked first
+                mother = family.mother
+                if mother:
+                    stack.append((mother, gource_prefix, lineage,
+                                  MOTHER_STEP if compact else mother.handle))
+
+                father = family.father
+                if father:
+                    stack.append((father, gource_prefix, lineage,
+                                  FATHER_STEP if compact else father.handle))
 
-        person_name = person.name_with_dates
-        gource_path = "{0}/{1}".format(gource_prefix, person_name)
-        ancestors.append((person.handle, gource_path))
+        return ancestors
 
-        if person.child_of_handle:
-            family = self.db.get_family(person.child_of_handle)
+    def get_descendants(self, person, descendants=None, gource_prefix=None,
+                        generations=None, paths=PATHS_HANDLES):
+        """
+        Return a list of tuples for this person and their descendants,
+        nearest generations first. Each tuple contains a person handle and
+        a pseudo-path to be used by Gource.
 
-            # walk up the father's tree
-            if family.father:
-                self.get_ancestors(family.father,
-                                   ancestors=ancestors,
-                                   gource_prefix=gource_prefix)
+        Descendants reached through more than one line are listed once, at
+        the first (shortest) path they are found on.
 
-            # walk up the mother's tree
-            if family.mother:
-                self.get_ancestors(family.mother,
-                                   ancestors=ancestors,
-                                   gource_prefix=gource_prefix)
+        :param generations: the number of generations to follow, all
+          generations by default.
+
+        :param paths: how the directories of the paths are named. Below the
+          focus person they are named by the descendant's handle or, with
+          compact paths, by the number of the child among their parent's
+          children.
+        """
+        logger.debug("Collecting descendants for %s", person.name)
+
+        if paths not in PATH_MODES:
+            raise ValueError(
+                "Invalid path mode {0}, expected one of {1}".format(
+                    paths, ", ".join(PATH_MODES)))
+        compact = paths == PATHS_COMPACT
+
+        if descendants is None:
+            descendants = []
+
+        if isinstance(self.db, gramps.IndexedStore):
+            return self._indexed_descendants(
+                person, descendants, gource_prefix, generations, compact)
+
+        seen = set([person.handle])
+
+        # Walk the tree breadth first using a queue rather than recursion
+        # so that long lines do not hit the recursion limit.
+        queue = collections.deque(
+            [(person, gource_prefix, 0, person.handle)])
+        while queue:
+            person, gource_prefix, generation, step = queue.popleft()
+            handle = person.handle
+
+            # Construct a pseudo path from the directories leading to the
+            # person.
+            if gource_prefix:
+                gource_prefix = gource_prefix + "/" + step
+            else:
+                gource_prefix = step
+
+            gource_path = gource_prefix + "/" + person.name_with_dates
+            descendants.append((handle, gource_path))
+
+            if generations is not None and generation >= generations:
+                continue
+
+            number = 0
+            for family_handle in person.parent_in_handles:
+                family = self.db.get_family(family_handle)
+                if family is None:
+                    continue
+                for child in family.children:
+                    if child.handle not in seen:
+                        seen.add(child.handle)
+                        queue.append((
+                            child, gource_prefix, generation + 1,
+                            str(number) if compact else child.handle))
+                        number += 1
+
+        return descendants
+
+    def _indexed_ancestors(self, person, ancestors, gource_prefix, collapse,
+                           compact):
+        """
+        Walk the ancestors of a person as get_ancestors does, using the
+        integer indexes of an IndexedStore. Persons are only looked up to
+        name them in the paths.
+        """
+        db = self.db
+        if not db.columns_built:
+            db.build_columns()
+        handles = db.person_handles
+        persons = db.persons
+        child_of = db.person_child_of
+        fathers = db.family_father
+        mothers = db.family_mother
+
+        expanded = bytearray(len(handles))
+
+        stack = [(db.person_ids[person.handle], gource_prefix, (),
+                  person.handle)]
+        while stack:
+            pid, gource_prefix, lineage, step = stack.pop()
+            handle = handles[pid]
+
+            if pid in lineage:
+                logger.warning(
+                    "Loop detected in the ancestors of {0}, not "
+                    "following it".format(persons[handle].name))
+                continue
+
+            if expanded[pid] and collapse == COLLAPSE_FIRST:
+                continue
+
+            if gource_prefix:
+                gource_prefix = gource_prefix + "/" + step
+            else:
+                gource_prefix = step
+
+            gource_path = gource_prefix + "/" + persons[handle].name_with_dates
+            ancestors.append((handle, gource_path))
+
+            if expanded[pid] and collapse == COLLAPSE_REFERENCE:
+                continue
+            expanded[pid] = 1
+
+            fid = child_of[pid]
+            if fid < 0:
+                continue
+
+            if collapse == COLLAPSE_ALL:
+                lineage = lineage + (pid,)
+
+            # push the mother first so the father's tree is walked first
+            mother = mothers[fid]
+            if mother >= 0:
+                stack.append((mother, gource_prefix, lineage,
+                              MOTHER_STEP if compact else handles[mother]))
+
+            father = fathers[fid]
+            if father >= 0:
+                stack.append((father, gource_prefix, lineage,
+                              FATHER_STEP if compact else handles[father]))
 
         return ancestors
 
-    def pedigree(self, names, output_file):
+    def _indexed_descendants(self, person, descendants, gource_prefix,
+                             generations, compact):
+        """
+        Walk the descendants of a person as get_descendants does, using the
+        integer indexes of an IndexedStore.
+        """
+        db = self.db
+        if not db.columns_built:
+            db.build_columns()
+        handles = db.person_handles
+        persons = db.persons
+
+        pid = db.person_ids[person.handle]
+        seen = bytearray(len(handles))
+        seen[pid] = 1
+
+        queue = collections.deque([(pid, gource_prefix, 0, person.handle)])
+        while queue:
+            pid, gource_prefix, generation, step = queue.popleft()
+            handle = handles[pid]
+
+            if gource_prefix:
+                gource_prefix = gource_prefix + "/" + step
+            else:
+                gource_prefix = step
+
+            gource_path = gource_prefix + "/" + persons[handle].name_with_dates
+            descendants.append((handle, gource_path))
+
+            if generations is not None and generation >= generations:
+                continue
+
+            number = 0
+            for fid in db.parent_in(pid):
+                for child in db.children_of(fid):
+                    if not seen[child]:
+                        seen[child] = 1
+                        queue.append((
+                            child, gource_prefix, generation + 1,
+                            str(number) if compact else handles[child]))
+                        number += 1
+
+        return descendants
+
+    def pedigree(self, names, output_file, collapse=COLLAPSE_REFERENCE,
+                 sort_buffer_size=DEFAULT_SORT_BUFFER_SIZE, jobs=1,
+                 paths=PATHS_HANDLES):
         """
         Creates a custom Gource log containing the pedigree information for
         the specified names.
+
+        :param output_file: the file to write the log to, or '-' to write
+          the log to stdout.
+
+        :param collapse: how ancestors reached through more than one line
+          are represented. See get_ancestors for the available modes.
+
+        :param sort_buffer_size: the maximum number of records held in
+          memory while sorting. Larger logs are sorted on disk.
+
+        :param jobs: the number of worker processes used to generate the
+          records for the focus persons.
+
+        :param paths: how the directories of the Gource paths are named,
+          see PATH_MODES. Compact paths give a smaller log showing the same
+          tree.
         """
 
         if not names:
             logger.error("No focus persons supplied")
             sys.exit(1)
 
-        all_records = []
+        cache_key = self._cache_key(
+            'pedigree', names=list(names), collapse=collapse, paths=paths)
+        if cache_key and self.log_cache.serve(cache_key, output_file):
+            return
 
-        for name in names:
-            person_handles = []
-            logger.info("Generating pedigree output for: {0}".format(name))
-            person_handle = self.db.find_person(name)
-            if person_handle:
-                person = self.db.get_person(person_handle)
-                ancestor_handles = self.get_ancestors(person)
-
-                logger.debug("{0} has {1} ancestors in the database".format(
-                    name, len(ancestor_handles)))
-                person_handles = ancestor_handles
-
-                if person_handles:
-                    people_to_plot = []
-                    for person_handle, person_gource_path in person_handles:
-                        person = self.db.get_person(person_handle)
-                        try:
-                            associated_events = person.associated_events()
-                        except TypeError:
-                            associated_events = []
-
-                        # Filter associated events to only include those with
-                        # dates. Only dated events are useful when outputing
-                        # a Gource formatted log.
-                        associated_events_with_dates = []
-                        for associated_event in associated_events:
-                            obj, event, directEvent = associated_event
-                            if event.date:
-                                associated_events_with_dates.append(
-                                    associated_event)
-
-                        if associated_events_with_dates:
-                            people_to_plot.append(
-                                (person, person_gource_path,
-                                 associated_events_with_dates))
-
-                    if people_to_plot:
-                        logger.info(
-                            "Starting generation of custom gource log data")
-
-                        records = self._to_pedigree_gource_log_format(
-                            people_to_plot)
-                        all_records.extend(records)
-
-                        logger.info(
-                            "Finished generation of custom gource log data")
-
-        if all_records:
-            # Sort events by time such that Gource displays the pedigree in reverse order
-            logger.info(
-                "Adjusting timestamps so gource displays them in reverse order")
-            records = [(ts * -1, name, event, path) for ts, name, event, path in all_records]
-            records.sort()
+        with RecordSorter(sort_buffer_size) as sorter:
 
-            logger.info("Writing custom gource log data to {0}".format(output_file))
+            with profiler.stage('records'):
+                if jobs > 1 and len(names) > 1:
+                    for records in self._parallel_pedigree_records(
+                            names, collapse, jobs, paths):
+                        sorter.extend(records)
+                else:
+                    # Collapsed ancestors may appear at several paths, only
+                    # look up their events once.
+                    events_cache = {}
 
-            with open(output_file, 'w') as fd:
-                for ts, name, event, path in records:
-                    fd.write("{0}|{1}|{2}|{3}\n".format(ts, name, event, path))
-                fd.write("\n") # add an empty line at the end to trigger EOF
+                    for name in names:
+                        sorter.extend(reverse_time(self._pedigree_records(
+                            name, collapse, events_cache, paths)))
 
-            logger.info(
-                "Completed. Custom gource log file: {0}".format(
-                    output_file))
-        else:
-            logger.error(
-                "No gource log file created - no records to write")
+            self._write_log(sorter, output_file, cache_key)
 
-    def _to_gource_log_format(self, person_events):
+    def descendants(self, names, output_file, generations=None,
+                    sort_buffer_size=DEFAULT_SORT_BUFFER_SIZE,
+                    paths=PATHS_HANDLES):
         """
-        Return a list of custom gource formatted log entries based on the list
-        of person events passed in.
+        Creates a custom Gource log containing the descendants of the
+        specified names, in time order. Each descendant is added at their
+        birth, changed by their other events and removed at their death.
+
+        :param output_file: the file to write the log to, or '-' to write
+          the log to stdout.
+
+        :param generations: the number of generations of descendants to
+          include, all generations by default.
+
+        :param sort_buffer_size: the maximum number of records held in
+          memory while sorting. Larger logs are sorted on disk.
+
+        :param paths: how the directories of the Gource paths are named,
+          see PATH_MODES.
         """
 
-        records = []
+        if not names:
+            logger.error("No focus persons supplied")
+            sys.exit(1)
 
-        for person, person_gource_path, related_events in person_events:
+        cache_key = self._cache_key(
+            'descendants', names=list(names), generations=generations,
+            paths=paths)
+        if cache_key and self.log_cache.serve(cache_key, output_file):
+            return
 
-            logger.debug("Creating log entries for {0}".format(person.name))
+        with RecordSorter(sort_buffer_size) as sorter:
 
-            # Reduce events to only those that contain dates
-            related_events_with_dates = []
-            for related_event in related_events:
-                person_family_object, event, directEvent = related_event
-                if event.date:
-                    related_events_with_dates.append(related_event)
-                else:
-                    logger.debug("No date for event {0}".format(event.type))
+            with profiler.stage('records'):
+                for name in names:
+                    sorter.extend(
+                        self._descendant_records(name, generations, paths))
 
-            if related_events_with_dates:
+            self._write_log(sorter, output_file, cache_key)
 
-                for obj, event, directEvent in related_events_with_dates:
+    def timeline(self, output_file, sort_buffer_size=DEFAULT_SORT_BUFFER_SIZE,
+                 batch_size=DEFAULT_TIMELINE_BATCH_SIZE):
+        """
+        Creates a custom Gource log containing every dated event of every
+        person in the database, along with the events of their families.
+        The records are generated as a stream and sorted on disk when there
+        are more than fit in the sort buffer.
 
-                    if event.datetime.year < ref_dt.year:
-                        # Year is less than the epoch meaning we can't use
-                        # time.mktime to create a useful timestamp for us.
-                        # Instead, subtract the necessary seconds from the
-                        # epoch time to arrive at the event time.
-                        ref_delta = ref_dt - event.datetime
-                        delta_seconds = ref_delta.total_seconds()
-                        timestamp = ref_timestamp - delta_seconds
-                    else:
-                        timestamp = time.mktime(event.datetime.timetuple())
+        :param output_file: the file to write the log to, or '-' to write
+          the log to stdout.
 
-                    # Gource requires timestamp as an int
-                    timestamp = int(timestamp)
+        :param sort_buffer_size: the maximum number of records held in
+          memory while sorting. Larger logs are sorted on disk.
 
-                    if event.type == 'Birth':
-                        if directEvent:
-                            gource_event = GOURCE_ADDED
-                        else:
-                            gource_event = GOURCE_MODIFIED
-                    elif event.type in ['Baptism', 'Christening']:
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type == 'Death':
-                        gource_event = GOURCE_DELETED
-                    elif event.type in ['Burial', 'Cremation']:
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type in ['Marriage', 'Marriage Banns']:
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type == 'Census':
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type in ["Divorce", 'Divorce Filing']:
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type == "Electoral Roll":
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type == "Emigration":
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type in ["Residence", "Property"]:
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type in ["Immigration", "Emmigration"]:
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type == "Occupation":
-                        gource_event = GOURCE_MODIFIED
-                    elif event.type == "Probate":
-                        gource_event = GOURCE_MODIFIED
-                    else:
-                        gource_event = GOURCE_UNKNOWN
-                        logger.debug("Don't know how to handle event type {0}".format(event.type))
+        :param batch_size: the number of persons whose event dates are
+          resolved together.
+        """
+        cache_key = self._cache_key('timeline')
+        if cache_key and self.log_cache.serve(cache_key, output_file):
+            return
 
-                    if gource_event != GOURCE_UNKNOWN:
-                        record = (timestamp, person.surname.lower(),
-                                  gource_event, person_gource_path)
-                        records.append(record)
+        with RecordSorter(sort_buffer_size) as sorter:
 
-        records.sort()
-        return records
+            with profiler.stage('records'):
+                sorter.extend(self._timeline_records(batch_size))
 
-    def _to_pedigree_gource_log_format(self, person_events):
+            self._write_log(sorter, output_file, cache_key)
+
+    def _cache_key(self, mode, **options):
         """
-        Return a list of pedigree specific custom gource formatted log entries
-        based on the list of person events passed in.
+        Return the key of a log in the log cache, or None when there is no
+        log cache or no Gramps file to key it on.
         """
+        if self.log_cache is None or self.gramps_file is None:
+            return None
+        return self.log_cache.key(self.gramps_file, mode, options)
 
-        records = []
+    def _write_log(self, sorter, output_file, cache_key=None):
+        """
+        Sort the records held by a RecordSorter and write them to the
+        output file, adding them to the log cache under cache_key if one
+        is given.
+        """
+        with profiler.stage('sort'):
+            sorter.sort()
 
-        for person, gource_path, related_events in person_events:
+        if sorter:
+            logger.info(
+                "Writing custom gource log data to {0}".format(output_file))
 
-            logger.debug("Creating log entries for {0}".format(person.name))
+            records = sorter
+            if cache_key:
+                records = self.log_cache.tee(cache_key, sorter)
+            with profiler.stage('write'):
+                write_records(records, output_file)
+            profiler.count('records_written', len(sorter))
 
-            # Reduce events to only those that contain dates
-            related_events_with_dates = []
-            for related_event in related_events:
-                person_family_object, event, directEvent = related_event
-                if event.date:
-                    related_events_with_dates.append(related_event)
-                else:
-                    logger.debug("No date for event {0}".format(event.type))
+            logger.info(
+                "Completed. Custom gource log file: {0}".format(output_file))
+        else:
+            logger.error("No gource log file created - no records to write")
+
+    def _parallel_pedigree_records(self, names, collapse, jobs,
+                                   paths=PATHS_HANDLES):
+        """
+        Generate the pedigree records for each focus person using a pool of
+        worker processes. Each item generated is an unsorted list of time
+        reversed records for one focus person.
+
+        Where the platform supports it the workers are forked so that they
+        share the loaded store copy-on-write. Otherwise each worker receives
+        a serialized snapshot of the store once, when it starts.
+        """
+        global _worker
+
+        # Load the store before starting the workers, otherwise each of
+        # them would load it again.
+        store = self.db
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            initargs = ()
+            _worker = self
+        else:
+            context = multiprocessing.get_context()
+            initargs = (store,)
+
+        logger.info(
+            "Generating pedigree output for {0} focus persons using {1} "
+            "processes".format(len(names), jobs))
+
+        pool = context.Pool(min(jobs, len(names)), _init_worker, initargs)
+        try:
+            tasks = [(name, collapse, paths) for name in names]
+            for records in pool.imap(_pedigree_job, tasks):
+                yield records
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _worker = None
+
+    def _pedigree_records(self, name, collapse, events_cache,
+                          paths=PATHS_HANDLES):
+        """
+        Generate the unsorted pedigree log records for a focus person.
+
+        :param events_cache: a dict of the dated associated events of each
+          person already visited, shared between focus persons.
+        """
+        logger.info("Generating pedigree output for: {0}".format(name))
+        person_handle = self.db.find_person(name)
+        if not person_handle:
+            logger.error("No person found for {0}".format(name))
+            return
+
+        person = self.db.get_person(person_handle)
+        with profiler.stage('ancestors'):
+            person_handles = self.get_ancestors(
+                person, collapse=collapse, paths=paths)
+
+        logger.debug("%s has %s ancestors in the database",
+                     name, len(person_handles))
+        profiler.count('focus_persons')
+        profiler.count('ancestor_paths', len(person_handles))
+        profiler.count('persons_visited', len(person_handles))
+
+        people_to_plot = []
+        with profiler.stage('events'):
+            for person_handle, person_gource_path in person_handles:
+                person = self.db.get_person(person_handle)
+                if person_handle not in events_cache:
+                    profiler.count('events_cache_misses')
+                    try:
+                        associated_events = person.associated_events()
+                    except TypeError:
+                        associated_events = []
+
+                    # Filter associated events to only include those with
+                    # dates. Only dated events are useful when outputing a
+                    # Gource formatted log.
+                    events_cache[person_handle] = [
+                        associated_event
+                        for associated_event in associated_events
+                        if associated_event[1].date]
+                associated_events_with_dates = events_cache[person_handle]
+
+                if associated_events_with_dates:
+                    people_to_plot.append(
+                        (person, person_gource_path,
+                         associated_events_with_dates))
+
+        if people_to_plot:
+            logger.info("Starting generation of custom gource log data")
+
+            for record in self._pedigree_gource_log_records(people_to_plot):
+                yield record
+
+            logger.info("Finished generation of custom gource log data")
+
+    def _descendant_records(self, name, generations=None,
+                            paths=PATHS_HANDLES):
+        """
+        Generate the unsorted descendant log records for a focus person.
+        Only the descendants' own events are used.
+        """
+        logger.info("Generating descendant output for: {0}".format(name))
+        person_handle = self.db.find_person(name)
+        if not person_handle:
+            logger.error("No person found for {0}".format(name))
+            return
+
+        person = self.db.get_person(person_handle)
+        with profiler.stage('descendants'):
+            person_handles = self.get_descendants(
+                person, generations=generations, paths=paths)
+
+        logger.debug("%s has %s descendants in the database",
+                     name, len(person_handles) - 1)
+        profiler.count('focus_persons')
+        profiler.count('descendant_paths', len(person_handles))
+        profiler.count('persons_visited', len(person_handles))
+
+        # Events whose dates can not be parsed are treated as undated.
+        index = self.db.event_index
+        for person_handle, person_gource_path in person_handles:
+            person = self.db.get_person(person_handle)
+            person_events = [(person, event, True)
+                             for event in person.events
+                             if index.datetime(event)]
+            for record in self._gource_log_records(
+                    [(person, person_gource_path, person_events)]):
+                yield record
+
+    def _timeline_records(self, batch_size=DEFAULT_TIMELINE_BATCH_SIZE,
+                          persons=None):
+        """
+        Generate the unsorted timeline log records for every person in the
+        database. Persons are processed in batches, the dates of the events
+        a batch refers to are resolved together before its records are
+        generated.
+
+        :param persons: the persons to generate records for, every person
+          in the database by default.
+        """
+        if persons is None:
+            persons = list(self.db.persons.values())
+        logger.info("Generating timeline output for {0} persons".format(
+            len(persons)))
+
+        for start in range(0, len(persons), batch_size):
+            batch = persons[start:start + batch_size]
+
+            events = []
+            for person in batch:
+                events.extend(person.events)
+                for family_handle in person.parent_in_handles:
+                    family = self.db.get_family(family_handle)
+                    if family is not None:
+                        events.extend(family.events)
+            self.db.resolve_dates(events)
+
+            person_events = [
+                (person,
+                 "{0}/{1}".format(person.handle, person.name_with_dates),
+                 person.associated_events())
+                for person in batch]
+            profiler.count('persons_visited', len(batch))
+
+            for record in self._gource_log_records(person_events):
+                yield record
+
+    def _to_gource_log_format(self, person_events):
+        """
+        Return a sorted list of custom gource formatted log entries based on
+        the list of person events passed in.
+        """
+        return sorted(self._gource_log_records(person_events))
+
+    def _gource_log_records(self, person_events):
+        """
+        Generate unsorted custom gource formatted log entries based on the
+        list of person events passed in.
+        """
+
+        # Avoid building person names when they will not be logged.
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        for person, person_gource_path, related_events in person_events:
 
-            if related_events_with_dates:
+            if debug:
+                logger.debug("Creating log entries for %s", person.name)
 
-                for obj, event, directEvent in related_events_with_dates:
+            name = (person.surname or "").lower()
 
-                    if event.datetime.year < ref_dt.year:
-                        # Year is less than the epoch meaning we can't use
-                        # time.mktime to create a useful timestamp for us.
-                        # Instead, subtract the necessary seconds from the
-                        # epoch time to arrive at the event time.
-                        ref_delta = ref_dt - event.datetime
-                        delta_seconds = ref_delta.total_seconds()
-                        timestamp = ref_timestamp - delta_seconds
+            for obj, event, directEvent in related_events:
+
+                # Only events that contain dates can be placed in the log
+                if not event.date:
+                    logger.debug("No date for event %s", event.type)
+                    continue
+
+                if event.type == 'Birth':
+                    if directEvent:
+                        gource_event = GOURCE_ADDED
                     else:
-                        timestamp = time.mktime(event.datetime.timetuple())
+                        gource_event = GOURCE_MODIFIED
+                else:
+                    gource_event = GOURCE_EVENT_ACTIONS.get(
+                        event.type, GOURCE_UNKNOWN)
+                    if gource_event == GOURCE_UNKNOWN:
+                        logger.debug(
+                            "Don't know how to handle event type %s",
+                            event.type)
+                        continue
+
+                yield (event.timestamp, name, gource_event, person_gource_path)
+
+    def _to_pedigree_gource_log_format(self, person_events):
+        """
+        Return a sorted list of pedigree specific custom gource formatted log
+        entries based on the list of person events passed in.
+        """
+        return sorted(self._pedigree_gource_log_records(person_events))
 
-                    # Gource requires timestamp as an int
-                    timestamp = int(timestamp)
+    def _pedigree_gource_log_records(self, person_events):
+        """
+        Generate unsorted pedigree specific custom gource formatted log
+        entries based on the list of person events passed in.
+        """
+
+        # Avoid building person names when they will not be logged.
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        for person, gource_path, related_events in person_events:
 
-                    # For this particular application we only want to capture
-                    # the birth (ADDED) event.
+            if debug:
+                logger.debug("Creating log entries for %s", person.name)
 
-                    if event.type == 'Birth':
-                        if directEvent:
-                            gource_event = GOURCE_ADDED
-                            record = (timestamp, person.surname.lower(),
-                                      gource_event, gource_path)
-                            records.append(record)
+            for obj, event, directEvent in related_events:
 
-        records.sort()
-        return records
+                # For this particular application we only want to capture
+                # the birth (ADDED) event.
+                if event.type == 'Birth' and directEvent:
+
+                    # Only events that contain dates can be placed in the log
+                    if not event.date:
+                        logger.debug("No date for event %s", event.type)
+                        continue
+
+                    timestamp = event.timestamp
+                    yield (timestamp, (person.surname or "").lower(),
+                           GOURCE_ADDED, gource_path)
 
 
 if __name__ == "__main__":
@@ -328,13 +1079,93 @@ if __name__ == "__main__":
         description="Create Gource custom logs from Gramps data")
     parser.add_argument("-d", "--db", dest="database", default=None,
                         type=str,
-                        help="The gramps database file to use")
+                        help="The gramps database file to use, either a "
+                        ".gramps export or a Gramps SQLite database")
+    parser.add_argument("-m", "--mode", dest="mode", default="pedigree",
+                        choices=MODES,
+                        help="The log to create. 'pedigree' shows the "
+                        "ancestors of the focus persons, 'descendants' "
+                        "shows their descendants and 'timeline' shows "
+                        "every dated event in the database")
     parser.add_argument("-n", "--names", action='append', dest="names",
                         default=None, type=str,
-                        help="The focus person to extract pedigree data for")
+                        help="The focus person to extract pedigree data for. "
+                        "May be a name, a Gramps ID or a handle")
     parser.add_argument("-o", "--output", dest="output", default=None,
                         type=str,
-                        help="The name of the file to send the output to")
+                        help="The name of the file to send the output to, "
+                        "or '-' to write to stdout. Files ending in .gz or "
+                        ".zst are compressed. The output may also start "
+                        "with a scheme: file:, gzip:, zstd: or unix: to "
+                        "write to a Unix socket")
+    parser.add_argument("--collapse", dest="collapse",
+                        default=COLLAPSE_REFERENCE, choices=COLLAPSE_MODES,
+                        help="How ancestors reached through more than one "
+                        "line are shown. 'first' shows them once, 'all' "
+                        "repeats them and their ancestors on every line and "
+                        "'reference' repeats them without their ancestors")
+    parser.add_argument("--paths", dest="paths", default=PATHS_HANDLES,
+                        choices=PATH_MODES,
+                        help="How the directories of the pedigree and "
+                        "descendants paths are named. 'handles' uses each "
+                        "person's handle, 'compact' uses their place among "
+                        "their relatives, which shows the same tree with a "
+                        "much smaller log")
+    parser.add_argument("--generations", dest="generations", default=None,
+                        type=int,
+                        help="The number of generations of descendants to "
+                        "show, all by default")
+    parser.add_argument("--sort-buffer", dest="sort_buffer_size",
+                        default=DEFAULT_SORT_BUFFER_SIZE, type=int,
+                        help="The maximum number of records held in memory "
+                        "while sorting. Larger logs are sorted on disk")
+    parser.add_argument("-j", "--jobs", dest="jobs", default=1, type=int,
+                        help="The number of processes used to generate the "
+                        "output when there are several focus persons")
+    parser.add_argument("--exec-gource", dest="exec_gource",
+                        action="store_true",
+                        help="Stream the log straight into gource, using "
+                        "gource.conf, instead of writing it to a file")
+    parser.add_argument("--gource", dest="gource", default="gource",
+                        type=str,
+                        help="The command used to run gource with "
+                        "--exec-gource")
+    parser.add_argument("--encoder", dest="encoder", default=None, type=str,
+                        help="A command, such as ffmpeg, that encodes the "
+                        "video stream written by gource with --exec-gource. "
+                        "It reads a PPM stream from stdin, e.g. 'ffmpeg -y "
+                        "-r 60 -f image2pipe -vcodec ppm -i - out.mp4'")
+    parser.add_argument("--cache-dir", dest="cache_dir", default=None,
+                        type=str,
+                        help="A directory to keep a snapshot of the parsed "
+                        "gramps database in. Later runs load the snapshot "
+                        "instead of parsing the database while it is "
+                        "unchanged")
+    parser.add_argument("--log-cache", dest="log_cache", default=None,
+                        type=str,
+                        help="A directory to keep generated logs in. A log "
+                        "asked for again, with the same options and an "
+                        "unchanged gramps database, is copied from the cache")
+    parser.add_argument("--log-cache-size", dest="log_cache_size",
+                        default=512, type=int,
+                        help="The maximum size of the log cache in MB. The "
+                        "least recently used logs are removed to stay below "
+                        "it")
+    parser.add_argument("--focused", dest="focused", action="store_true",
+                        help="Only load the focus persons and their "
+                        "ancestors, or descendants, from the gramps "
+                        "database. Quicker for large databases")
+    parser.add_argument("--incremental", dest="incremental",
+                        action="store_true",
+                        help="Only regenerate the parts of an existing output "
+                        "log affected by changes to the gramps database since "
+                        "it was written, using the manifest saved alongside "
+                        "it by the previous incremental run")
+    parser.add_argument("--profile", dest="profile", nargs="?", default=None,
+                        const="summary", choices=["summary", "json"],
+                        help="Report the time spent in each stage along with "
+                        "counters to stderr, as a table or as JSON. Stages "
+                        "run in worker processes are not included")
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -342,22 +1173,98 @@ if __name__ == "__main__":
 
     if args.database is None:
         print("Error: No gramps file provided")
-        args.print_usage()
+        parser.print_usage()
         sys.exit(1)
 
-    if args.names is None:
+    if args.names is None and args.mode != "timeline":
         print("Error: No focus name(s) provided")
-        args.print_usage()
+        parser.print_usage()
+        sys.exit(1)
+
+    if args.incremental and (
+            args.exec_gource or args.output == "-" or
+            (args.output and sinks.split_output(args.output)[0])):
+        print("Error: --incremental needs an output file")
+        parser.print_usage()
         sys.exit(1)
 
-    if args.output is None:
-        if len(args.names) > 1:
-            args.output = "pedigree.log"
+    if args.exec_gource:
+        import gource_pipe
+        try:
+            args.output = gource_pipe.GourcePipe(args.gource,
+                                                 encoder=args.encoder)
+        except ValueError as ex:
+            print("Error: {0}".format(ex))
+            sys.exit(1)
+    elif args.output is None:
+        if args.mode == "timeline":
+            args.output = "timeline.log"
+        elif len(args.names) > 1:
+            args.output = "{0}.log".format(args.mode)
         else:
             lower_name = args.names[0].lower().replace(" ", "_")
-            args.output = "pedigree_{0}.log".format(lower_name)
+            args.output = "{0}_{1}.log".format(args.mode, lower_name)
+
+    try:
+        sinks.open_sink(args.output)
+    except ValueError as ex:
+        print("Error: {0}".format(ex))
+        sys.exit(1)
+
+    if args.profile:
+        profiler.enable()
+
+    focus = None
+    if args.focused and args.mode != "timeline":
+        focus = args.names
+
+    relatives = gramps.ANCESTORS
+    if args.mode == "descendants":
+        relatives = gramps.DESCENDANTS
+
+    log_cache = None
+    if args.log_cache:
+        from log_cache import LogCache
+        log_cache = LogCache(
+            args.log_cache, max_size=args.log_cache_size * 2 ** 20)
+
+    g2g = Gramps2Gource(args.database, cache_dir=args.cache_dir, focus=focus,
+                        projection=PROJECTIONS[args.mode],
+                        relatives=relatives, log_cache=log_cache)
+    if args.incremental:
+        import incremental
+        log = incremental.IncrementalLog(
+            g2g, args.output, sort_buffer_size=args.sort_buffer_size)
+        if args.mode == "timeline":
+            log.timeline()
+        elif args.mode == "descendants":
+            log.descendants(args.names, generations=args.generations,
+                            paths=args.paths)
+        else:
+            log.pedigree(args.names, collapse=args.collapse,
+                         paths=args.paths)
+    elif args.mode == "timeline":
+        g2g.timeline(args.output, sort_buffer_size=args.sort_buffer_size)
+    elif args.mode == "descendants":
+        g2g.descendants(args.names, args.output,
+                        generations=args.generations,
+                        sort_buffer_size=args.sort_buffer_size,
+                        paths=args.paths)
+    else:
+        g2g.pedigree(args.names, args.output, collapse=args.collapse,
+                     sort_buffer_size=args.sort_buffer_size, jobs=args.jobs,
+                     paths=args.paths)
+
+    if args.profile:
+        profiler.count('date_cache_hits', gramps.date_processor.hits)
+        profiler.count('date_cache_misses', gramps.date_processor.misses)
+        if args.profile == "json":
+            print(profiler.to_json(), file=sys.stderr)
+        else:
+            print(profiler.summary(), file=sys.stderr)
 
-    g2g = Gramps2Gource(args.database)
-    g2g.pedigree(args.names, args.output)
+    # Exit with gource's status when it, or the encoder, failed.
+    if args.exec_gource and args.output.status:
+        sys.exit(args.output.status)
 
     logger.info("Done.")
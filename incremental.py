@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+
+'''
+This module regenerates Gource custom logs incrementally. After a new
+export of a Gramps database only the parts of a log affected by the
+changes since the previous run are regenerated, the rest of the log is
+kept as it is.
+
+A log is made of segments. In the pedigree and descendants modes there is
+a segment for each focus person, holding the records of their ancestors or
+descendants. In the timeline mode there is a segment for each person. The
+path of every record starts with the handle of the person whose segment it
+belongs to.
+
+Gramps records the time each person, family and event was last changed.
+Alongside each log a manifest is saved holding the mode and options the log
+was made with and, for each segment, a digest of the handles and change
+times of every object the segment's records were drawn from. On the next
+run the digests are worked out again from the new export. Segments whose
+digest is unchanged are kept, the others are regenerated and merged with
+the kept records of the existing log, which is then replaced.
+
+    from incremental import IncrementalLog
+
+    log = IncrementalLog(Gramps2Gource('example.gramps'), 'timeline.log')
+    log.timeline()
+
+When there is no usable manifest, for example on the first run or when the
+options have changed, the whole log is regenerated.
+
+Author: Chris Laws
+'''
+
+from __future__ import unicode_literals
+
+import collections
+import hashlib
+import heapq
+import io
+import json
+import logging
+import os
+import tempfile
+
+import gramps2gource
+import sinks
+from profiling import profiler
+
+
+logger = logging.getLogger(__name__)
+
+
+# Increment when the layout of the manifest or the way segments are
+# produced changes so that logs made by older versions are rebuilt.
+MANIFEST_VERSION = 1
+
+# The manifest of a log is saved next to it, under the log's name with this
+# suffix added.
+MANIFEST_SUFFIX = '.manifest'
+
+
+def manifest_path(output_file):
+    '''
+    Return the path of the manifest saved alongside a log file.
+    '''
+    return output_file + MANIFEST_SUFFIX
+
+
+class Digester(object):
+    '''
+    Works out the digests of segments from the handles and change times of
+    the objects their records are drawn from. A digest is None when the
+    change time of any of those objects is not known, so the segment is
+    always regenerated.
+
+    Segments depend on persons and events directly and on whole families:
+    the family, its events, its children and their events. The digest of
+    each family is worked out once and shared by every segment that uses
+    it.
+
+    :param store: the store loaded from the new export.
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.changes = {}
+        for objects in (store.persons, store.families, store.events):
+            for handle, obj in objects.items():
+                self.changes[handle] = (
+                    None if obj.change is None else str(obj.change))
+        self._families = {}
+
+    def add_person(self, person, handles, families):
+        '''
+        Add the dependencies of the associated events of a person: the
+        person and their events, and the families they were born into or
+        are a parent in.
+        '''
+        handles.add(person.handle)
+        handles.update(person.event_handles)
+        families.update(person.parent_in_handles)
+        if person.child_of_handle:
+            families.add(person.child_of_handle)
+
+    def family_digest(self, handle):
+        '''
+        Return the digest of a family, its events, its children and their
+        events.
+        '''
+        try:
+            return self._families[handle]
+        except KeyError:
+            pass
+
+        handles = [handle]
+        family = self.store.get_family(handle)
+        if family is not None:
+            handles.extend(family.event_handles)
+            for child_handle in family.children_handles:
+                handles.append(child_handle)
+                child = self.store.get_person(child_handle)
+                if child is not None:
+                    handles.extend(child.event_handles)
+        digest = self._digest(handles)
+        self._families[handle] = digest
+        return digest
+
+    def digest(self, handles, families=()):
+        '''
+        Return the digest of a segment depending on the persons and events
+        in handles and on the families in families.
+        '''
+        lines = []
+        for family_handle in sorted(families):
+            digest = self.family_digest(family_handle)
+            if digest is None:
+                return None
+            lines.append(family_handle + "=" + digest)
+        return self._digest(sorted(handles), lines)
+
+    def _digest(self, handles, lines=None):
+        '''
+        Return the SHA-1 hex digest of the handles and change times of the
+        objects in handles, followed by any other lines. Objects that are
+        not in the store, for example events left out by a projection, are
+        included without a change time.
+        '''
+        if lines is None:
+            lines = []
+        changes = self.changes
+        for handle in handles:
+            change = changes.get(handle, "-")
+            if change is None:
+                return None
+            lines.append(handle + ":" + change)
+        return hashlib.sha1("\n".join(lines).encode('utf-8')).hexdigest()
+
+
+class Manifest(object):
+    '''
+    Describes a log written by a previous run.
+
+    :param mode: the mode the log was made with, see gramps2gource.MODES.
+
+    :param options: a dict of the options the log was made with. A log is
+      only patched when these are unchanged.
+
+    :param segments: a dict mapping the key of each segment onto a
+      (root handle, digest) pair. The key is the focus name in the pedigree
+      and descendants modes and the person's handle in the timeline mode.
+
+    :param log_size: the size of the log file when it was written, used to
+      detect logs changed since.
+    '''
+
+    def __init__(self, mode, options, segments=None, log_size=None):
+        self.mode = mode
+        self.options = options
+        self.segments = segments if segments is not None else \
+            collections.OrderedDict()
+        self.log_size = log_size
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Return the manifest saved at path, or None if there is no usable
+        manifest.
+        '''
+        try:
+            with io.open(path, 'r', encoding='utf-8') as fd:
+                data = json.load(fd)
+        except (IOError, OSError):
+            return None
+        except ValueError as ex:
+            logger.warning(
+                "Ignoring unreadable manifest {0}: {1}".format(path, ex))
+            return None
+
+        if data.get('version') != MANIFEST_VERSION:
+            logger.info(
+                "Ignoring manifest {0} made by a different version".format(
+                    path))
+            return None
+        segments = collections.OrderedDict(
+            (key, tuple(segment)) for key, segment in data['segments'])
+        return cls(data['mode'], data['options'], segments, data['log_size'])
+
+    def save(self, path):
+        '''
+        Save the manifest, replacing any previous manifest at path.
+        '''
+        data = collections.OrderedDict([
+            ('version', MANIFEST_VERSION),
+            ('mode', self.mode),
+            ('options', self.options),
+            ('log_size', self.log_size),
+            ('segments', [[key, list(segment)]
+                          for key, segment in self.segments.items()]),
+        ])
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, path)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+
+class IncrementalLog(object):
+    '''
+    Regenerates the parts of a log file affected by changes to the Gramps
+    database since the log was last written.
+
+    :param g2g: the Gramps2Gource instance holding the new export.
+
+    :param output_file: the path of the log file. Its manifest is kept
+      alongside it, see manifest_path.
+
+    :param sort_buffer_size: the maximum number of regenerated records held
+      in memory while sorting.
+    '''
+
+    def __init__(self, g2g, output_file,
+                 sort_buffer_size=gramps2gource.DEFAULT_SORT_BUFFER_SIZE):
+        self.g2g = g2g
+        self.db = g2g.db
+        self.output_file = output_file
+        self.sort_buffer_size = sort_buffer_size
+
+    def pedigree(self, names, collapse=gramps2gource.COLLAPSE_REFERENCE,
+                 paths=gramps2gource.PATHS_HANDLES):
+        '''
+        Bring a pedigree log, see Gramps2Gource.pedigree, up to date.
+
+        :return: the number of segments regenerated.
+        '''
+        g2g = self.g2g
+        segments = collections.OrderedDict()
+        with profiler.stage('dependencies'):
+            digester = Digester(self.db)
+            for name in names:
+                handle = self.db.find_person(name)
+                if handle is None:
+                    continue
+                handles = set()
+                families = set()
+                for ancestor_handle in g2g.ancestor_handles(
+                        self.db.get_person(handle)):
+                    digester.add_person(
+                        self.db.get_person(ancestor_handle), handles,
+                        families)
+                segments[name] = (
+                    handle, digester.digest(handles, families))
+
+        events_cache = {}
+
+        def records(names):
+            for name in names:
+                for record in gramps2gource.reverse_time(
+                        g2g._pedigree_records(
+                            name, collapse, events_cache, paths)):
+                    yield record
+
+        options = {'names': list(names), 'collapse': collapse,
+                   'paths': paths}
+        return self._update('pedigree', options, segments, records)
+
+    def descendants(self, names, generations=None,
+                    paths=gramps2gource.PATHS_HANDLES):
+        '''
+        Bring a descendants log, see Gramps2Gource.descendants, up to date.
+
+        :return: the number of segments regenerated.
+        '''
+        g2g = self.g2g
+        segments = collections.OrderedDict()
+        with profiler.stage('dependencies'):
+            digester = Digester(self.db)
+            for name in names:
+                handle = self.db.find_person(name)
+                if handle is None:
+                    continue
+                handles = set()
+                families = set()
+                for descendant_handle in g2g.descendant_handles(
+                        self.db.get_person(handle), generations=generations):
+                    descendant = self.db.get_person(descendant_handle)
+                    handles.add(descendant_handle)
+                    handles.update(descendant.event_handles)
+                    families.update(descendant.parent_in_handles)
+                segments[name] = (
+                    handle, digester.digest(handles, families))
+
+        def records(names):
+            for name in names:
+                for record in g2g._descendant_records(
+                        name, generations, paths):
+                    yield record
+
+        options = {'names': list(names), 'generations': generations,
+                   'paths': paths}
+        return self._update('descendants', options, segments, records)
+
+    def timeline(self, batch_size=gramps2gource.DEFAULT_TIMELINE_BATCH_SIZE):
+        '''
+        Bring a timeline log, see Gramps2Gource.timeline, up to date.
+
+        :return: the number of segments regenerated.
+        '''
+        segments = collections.OrderedDict()
+        with profiler.stage('dependencies'):
+            digester = Digester(self.db)
+            for handle, person in self.db.persons.items():
+                handles = set()
+                families = set()
+                digester.add_person(person, handles, families)
+                segments[handle] = (
+                    handle, digester.digest(handles, families))
+
+        def records(handles):
+            return self.g2g._timeline_records(
+                batch_size, persons=[self.db.get_person(handle)
+                                     for handle in handles])
+
+        return self._update('timeline', {}, segments, records)
+
+    def _update(self, mode, options, segments, records):
+        '''
+        Compare the segments worked out from the new export with those in
+        the manifest of the existing log, then regenerate the changed
+        segments and patch them into the log.
+
+        :param segments: a dict mapping segment keys onto (root handle,
+          digest) pairs, see Manifest.
+
+        :param records: a function returning the unsorted records of a list
+          of segment keys.
+
+        :return: the number of segments regenerated.
+        '''
+        manifest_file = manifest_path(self.output_file)
+        manifest = Manifest(mode, options, segments)
+        previous = Manifest.load(manifest_file)
+
+        reason = self._unusable(previous, manifest)
+        if reason:
+            logger.info("Regenerating all of {0}: {1}".format(
+                self.output_file, reason))
+            changed = list(segments)
+            kept = None
+        else:
+            changed = [key for key, segment in segments.items()
+                       if segment[1] is None or
+                       previous.segments.get(key) != segment]
+            removed = [key for key in previous.segments
+                       if key not in segments]
+            if not changed and not removed:
+                logger.info("{0} is up to date".format(self.output_file))
+                return 0
+            dropped = set(previous.segments[key][0]
+                          for key in changed + removed
+                          if key in previous.segments)
+            kept = (record for record in sinks.read_records(self.output_file)
+                    if record[3].split('/', 1)[0] not in dropped)
+            logger.info(
+                "Regenerating {0} of {1} segments of {2}, removing "
+                "{3}".format(len(changed), len(segments), self.output_file,
+                             len(removed)))
+        profiler.count('segments_regenerated', len(changed))
+
+        with gramps2gource.RecordSorter(self.sort_buffer_size) as sorter:
+            with profiler.stage('records'):
+                sorter.extend(records(changed))
+            with profiler.stage('sort'):
+                sorter.sort()
+
+            merged = sorter if kept is None else heapq.merge(kept, sorter)
+            self._replace_log(merged)
+
+        manifest.log_size = os.path.getsize(self.output_file)
+        manifest.save(manifest_file)
+        return len(changed)
+
+    def _unusable(self, previous, manifest):
+        '''
+        Return the reason the existing log can not be patched, or None if
+        it can.
+        '''
+        if previous is None:
+            return "no manifest"
+        if previous.mode != manifest.mode:
+            return "the mode has changed"
+        if previous.options != manifest.options:
+            return "the options have changed"
+        try:
+            size = os.path.getsize(self.output_file)
+        except OSError:
+            return "no existing log"
+        if size != previous.log_size:
+            return "the log has changed since it was written"
+
+        # Records are matched to segments by the handle their path starts
+        # with, which must belong to a single segment.
+        for segments in (previous.segments, manifest.segments):
+            roots = [segment[0] for segment in segments.values()]
+            if len(set(roots)) != len(roots):
+                return "several segments share a focus person"
+        return None
+
+    def _replace_log(self, records):
+        '''
+        Write records to a temporary file and then rename it over the log,
+        so that the existing log can be read while its replacement is
+        written. The temporary file keeps the log's extension so that it
+        is compressed in the same way, see sinks.open_sink.
+        '''
+        directory, name = os.path.split(self.output_file)
+        tmp_file = os.path.join(
+            directory, ".{0}.{1}".format(os.getpid(), name))
+        try:
+            with profiler.stage('write'):
+                gramps2gource.write_records(records, tmp_file)
+            os.replace(tmp_file, self.output_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
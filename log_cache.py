@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+'''
+This module implements a content addressed cache of generated Gource logs.
+
+The same log is often asked for repeatedly, for the same focus persons,
+mode and options against the same Gramps export. Each finished log is kept,
+gzip compressed, under a key made from everything the log depends on:
+
+  - the SHA-1 digest of the Gramps file's contents,
+  - the mode and its options, including the focus names as given, which
+    always find the same persons in the same export,
+  - the date handlers registered with gramps.date_processor,
+  - the current day, as dates giving only a year are resolved against it
+    (see gramps.resolution_date), so logs cached on an earlier day are no
+    longer served and are evicted in time.
+
+A later request with the same key is answered by streaming the cached log,
+without loading the Gramps file at all.
+
+    from log_cache import LogCache
+
+    cache = LogCache('/var/cache/gramps2gource/logs', max_size=2 ** 30)
+    g2g = Gramps2Gource('example.gramps', log_cache=cache)
+    g2g.pedigree(['I0002'], 'pedigree.log')
+
+The cache is kept below a maximum size by removing the least recently used
+logs whenever one is added. Serving a log marks it as recently used.
+
+Author: Chris Laws
+'''
+
+from __future__ import unicode_literals
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import gramps
+import sinks
+import snapshot
+from profiling import profiler
+
+
+logger = logging.getLogger(__name__)
+
+
+# Increment when the format of the logs changes so that logs cached by
+# older versions are no longer used.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_SIZE = 512 * 2 ** 20
+
+LOG_SUFFIX = '.log.gz'
+
+
+class LogCache(object):
+    '''
+    A directory of compressed Gource logs keyed by their content.
+
+    :param cache_dir: the directory logs are kept in. It is created if it
+      does not exist.
+
+    :param max_size: the maximum total size of the cached logs in bytes.
+
+    :param compresslevel: the gzip compression level of cached logs.
+    '''
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE, compresslevel=6):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.compresslevel = compresslevel
+        # Digests of Gramps files already hashed, keyed by their path, size
+        # and modification time.
+        self._digests = {}
+
+    def key(self, gramps_file, mode, options):
+        '''
+        Return the key of a log generated from a Gramps file.
+
+        :param mode: the output mode, such as 'pedigree'.
+
+        :param options: a dict of the options that change the log, such as
+          the focus names.
+        '''
+        description = json.dumps({
+            'version': CACHE_VERSION,
+            'export': self._digest(gramps_file),
+            'mode': mode,
+            'options': options,
+            'date_handlers': gramps.date_processor.describe(),
+            'resolution_date': gramps.resolution_date(),
+        }, sort_keys=True)
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _digest(self, gramps_file):
+        # A Gramps family tree directory is keyed on its database file.
+        gramps_file = gramps.sqlite_database_file(gramps_file) or gramps_file
+        stat = os.stat(gramps_file)
+        file_key = (os.path.abspath(gramps_file), stat.st_size,
+                    stat.st_mtime)
+        digest = self._digests.get(file_key)
+        if digest is None:
+            digest = snapshot.file_digest(gramps_file)
+            self._digests[file_key] = digest
+        return digest
+
+    def path(self, key):
+        '''
+        Return the path of the cached log for a key.
+        '''
+        return os.path.join(self.cache_dir, key + LOG_SUFFIX)
+
+    def serve(self, key, output_file):
+        '''
+        Stream the cached log for a key to an output file, see
+        sinks.open_sink for the outputs supported.
+
+        :return: True if the log was cached, otherwise False.
+        '''
+        path = self.path(key)
+        try:
+            fd = sinks.open_log(path)
+        except (IOError, OSError):
+            profiler.count('log_cache_misses')
+            return False
+
+        profiler.count('log_cache_hits')
+        logger.info("Serving cached log {0} to {1}".format(key, output_file))
+
+        with profiler.stage('log_cache_serve'), fd:
+            # mark the log as recently used
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+            sink = sinks.open_sink(output_file)
+            if hasattr(sink, 'write_log'):
+                sink.write_log(fd)
+            else:
+                sink.write_records(sinks.read_records(fd))
+        return True
+
+    def tee(self, key, records):
+        '''
+        Generate the records of a log while adding them to the cache under
+        a key. The log is only added once all of the records have been
+        generated, so a consumer that stops early leaves nothing behind.
+        '''
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(
+                    fileobj=raw, mode='wb',
+                    compresslevel=self.compresslevel) as out:
+                batch = []
+                for record in records:
+                    batch.append(record)
+                    if len(batch) >= sinks.DEFAULT_BATCH_SIZE:
+                        out.write(sinks.format_records(batch))
+                        batch = []
+                    yield record
+                # the empty line write_records ends each log with
+                out.write(sinks.format_records(batch) + b"\n")
+            os.replace(tmp_file, self.path(key))
+            complete = True
+        finally:
+            if not complete:
+                os.remove(tmp_file)
+
+        logger.debug("Cached log %s", key)
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove the least recently used logs until the cached logs fit
+        within the maximum size.
+        '''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(LOG_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            profiler.count('log_cache_evictions')
+            logger.debug("Evicted cached log %s", path)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+'''
+This module implements a lightweight instrumentation layer used to find out
+where the time goes when producing a Gource log.
+
+Code is instrumented by wrapping each stage of work in a profiler stage and
+by incrementing named counters. When profiling is disabled, which is the
+default, stages and counters cost a single attribute check.
+
+    from profiling import profiler
+
+    with profiler.stage('parse'):
+        store = gramps.parser.parse(gramps_file)
+    profiler.count('persons', len(store.persons))
+
+Stages may be entered many times, their times are accumulated. Nested
+stages are included in the time of the stage enclosing them. The CPU time
+of a stage is that of the thread running it, so stages run at the same
+time by several threads, as server.py does, are measured separately. CPU
+time spent in other threads or in subprocesses started by a stage is not
+included.
+
+Author: Chris Laws
+'''
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import json
+import logging
+import sys
+import threading
+import time
+try:
+    import resource
+except ImportError:
+    # resource is only available on Unix platforms
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def max_rss():
+    '''
+    Return the peak resident set size of this process in bytes, or None if
+    it is not available on this platform.
+    '''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other platforms report kilobytes.
+    if sys.platform != 'darwin':
+        rss *= 1024
+    return rss
+
+
+class _Stage(object):
+    '''
+    Context manager that records the time spent in a profiler stage.
+    '''
+
+    __slots__ = ('profiler', 'name', 'wall', 'cpu')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._record(
+            self.name, time.time() - self.wall,
+            time.thread_time() - self.cpu)
+
+
+class _NullStage(object):
+    '''
+    Context manager used for stages when profiling is disabled.
+    '''
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+class Profiler(object):
+    '''
+    Collects wall time, CPU time and peak memory for named stages along with
+    named counters. Stages and counters may be recorded from several
+    threads at once, for example by server.py.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''
+        Discard all recorded stages and counters.
+        '''
+        with self._lock:
+            self.stages = collections.OrderedDict()
+            self.counters = collections.OrderedDict()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name):
+        '''
+        Return a context manager that records the time spent in a stage.
+        '''
+        if not self.enabled:
+            return _null_stage
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        '''
+        Add value to a named counter.
+        '''
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def _record(self, name, wall, cpu):
+        rss = max_rss()
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = collections.OrderedDict(
+                    [('calls', 0), ('wall', 0.0), ('cpu', 0.0)])
+                self.stages[name] = stage
+            stage['calls'] += 1
+            stage['wall'] += wall
+            stage['cpu'] += cpu
+            stage['max_rss'] = rss
+
+    def report(self):
+        '''
+        Return a dict describing the recorded stages and counters.
+        '''
+        return collections.OrderedDict([
+            ('stages', self.stages),
+            ('counters', self.counters),
+            ('max_rss', max_rss()),
+        ])
+
+    def to_json(self):
+        '''
+        Return the report as a JSON string.
+        '''
+        return json.dumps(self.report(), indent=2)
+
+    def summary(self):
+        '''
+        Return the report as a human readable table.
+        '''
+        o = []
+        o.append("{0:<16} {1:>7} {2:>10} {3:>10} {4:>12}".format(
+            "stage", "calls", "wall (s)", "cpu (s)", "max rss (MB)"))
+        for name, stage in self.stages.items():
+            rss = stage.get('max_rss')
+            o.append("{0:<16} {1:>7} {2:>10.3f} {3:>10.3f} {4:>12}".format(
+                name, stage['calls'], stage['wall'], stage['cpu'],
+                "-" if rss is None else "{0:.1f}".format(rss / 2 ** 20)))
+        if self.counters:
+            o.append("")
+            o.append("{0:<24} {1:>12}".format("counter", "value"))
+            for name, value in self.counters.items():
+                o.append("{0:<24} {1:>12}".format(name, value))
+        return "\n".join(o)
+
+
+profiler = Profiler()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+'''
+This script runs Gramps2Gource as a long running local HTTP server. The
+Gramps database is loaded once, along with its indexes, and kept in memory
+so that each request only pays for producing its log.
+
+Start a server on a TCP port:
+
+    $ python server.py --db=example.gramps --port=8080
+
+or on a Unix socket:
+
+    $ python server.py --db=example.gramps --unix-socket=/tmp/g2g.sock
+
+Then request logs, which are streamed back in the Gource custom log format:
+
+    $ curl "http://localhost:8080/pedigree?name=I0002" | gource --log-format custom -
+    $ curl "http://localhost:8080/descendants?name=I0000&generations=3"
+    $ curl "http://localhost:8080/timeline"
+    $ curl --unix-socket /tmp/g2g.sock "http://localhost/pedigree?name=I0002"
+
+Several names may be passed by repeating the name parameter. Pedigree
+requests also accept collapse, and pedigree and descendants requests
+accept paths, as described by gramps2gource.py.
+
+Requests are handled concurrently, each in its own thread, and share the
+loaded store without modifying it. Event dates are resolved and the event
+index is built before a store is served, and the date parser cache and
+the profiler that requests still share are guarded by locks. The database
+file is checked before each request and, when it has changed, reloaded.
+Requests in progress keep using the store they started with and later
+requests use the new store once it is completely loaded.
+
+Author: Chris Laws
+'''
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import logging
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import gramps
+import gramps2gource
+
+
+logger = logging.getLogger(__name__)
+
+
+# The projection loaded by the server. The timeline projection holds every
+# event type used by the pedigree, descendants and timeline modes.
+SERVER_PROJECTION = gramps2gource.PROJECTIONS['timeline']
+
+
+class StoreHolder(object):
+    '''
+    Holds the Gramps2Gource instance for a Gramps file, reloading it when
+    the file changes.
+
+    :param gramps_file: the Gramps .gramps file, SQLite database or family
+      tree directory to serve.
+
+    :param cache_dir: an optional snapshot cache directory, see
+      snapshot.SnapshotCache.
+
+    :param log_cache: an optional log_cache.LogCache that responses are
+      served from and added to.
+    '''
+
+    def __init__(self, gramps_file, cache_dir=None, log_cache=None):
+        # Changes to a Gramps family tree are made to its database file.
+        self.gramps_file = gramps.sqlite_database_file(gramps_file) or \
+            gramps_file
+        self.cache_dir = cache_dir
+        self.log_cache = log_cache
+        self._lock = threading.Lock()
+        self._key = None
+        self._g2g = None
+        self.reload()
+
+    def _file_key(self):
+        stat = os.stat(self.gramps_file)
+        return (stat.st_size, stat.st_mtime)
+
+    def reload(self):
+        '''
+        Load the Gramps file and, once it is completely loaded, replace the
+        instance being served.
+        '''
+        with self._lock:
+            # Take the key first so that a change made while loading is
+            # picked up by the next request.
+            key = self._file_key()
+            if key == self._key:
+                return
+            g2g = gramps2gource.Gramps2Gource(
+                self.gramps_file, cache_dir=self.cache_dir,
+                projection=SERVER_PROJECTION, log_cache=self.log_cache)
+
+            # Fill in the lazily computed parts of the store now so that
+            # requests only ever read it.
+            g2g.db.resolve_dates()
+            g2g.db.build_event_index()
+            g2g.db.build_columns()
+            for family in g2g.db.families.values():
+                family.events
+
+            self._g2g = g2g
+            self._key = key
+            logger.info("Serving {0}".format(self.gramps_file))
+
+    def current(self):
+        '''
+        Return the Gramps2Gource instance to handle a request with,
+        reloading the Gramps file first if it has changed. If another
+        request is already reloading it, the previous instance is returned.
+        '''
+        try:
+            changed = self._file_key() != self._key
+        except OSError as ex:
+            logger.warning(
+                "Can not check {0}, serving the loaded copy: {1}".format(
+                    self.gramps_file, ex))
+            changed = False
+
+        if changed and not self._lock.locked():
+            try:
+                self.reload()
+            except Exception:
+                logger.exception(
+                    "Problem reloading {0}, serving the previous "
+                    "copy".format(self.gramps_file))
+        return self._g2g
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    '''
+    Answers pedigree, descendants and timeline requests with a streamed
+    Gource custom log.
+    '''
+
+    # Close the connection once the log has been sent, which marks the end
+    # of a response streamed without a Content-Length.
+    protocol_version = 'HTTP/1.0'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        mode = url.path.strip('/')
+        params = parse_qs(url.query)
+
+        if mode not in gramps2gource.MODES:
+            self.send_error(
+                404, "Unknown mode, expected one of {0}".format(
+                    ", ".join(gramps2gource.MODES)))
+            return
+
+        g2g = self.server.holder.current()
+
+        names = params.get('name', [])
+        if mode != 'timeline':
+            if not names:
+                self.send_error(400, "No focus name(s) provided")
+                return
+            for name in names:
+                if not g2g.db.find_person(name):
+                    self.send_error(
+                        404, "No person found for {0}".format(name))
+                    return
+
+        try:
+            collapse = params.get(
+                'collapse', [gramps2gource.COLLAPSE_REFERENCE])[0]
+            if collapse not in gramps2gource.COLLAPSE_MODES:
+                raise ValueError("Invalid collapse mode {0}".format(collapse))
+            paths = params.get('paths', [gramps2gource.PATHS_HANDLES])[0]
+            if paths not in gramps2gource.PATH_MODES:
+                raise ValueError("Invalid path mode {0}".format(paths))
+            generations = params.get('generations', [None])[0]
+            if generations is not None:
+                generations = int(generations)
+        except ValueError as ex:
+            self.send_error(400, str(ex))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.end_headers()
+
+        fd = io.TextIOWrapper(self.wfile, encoding='utf-8')
+        try:
+            sort_buffer_size = self.server.sort_buffer_size
+            if mode == 'timeline':
+                g2g.timeline(fd, sort_buffer_size=sort_buffer_size)
+            elif mode == 'descendants':
+                g2g.descendants(names, fd, generations=generations,
+                                sort_buffer_size=sort_buffer_size,
+                                paths=paths)
+            else:
+                g2g.pedigree(names, fd, collapse=collapse,
+                             sort_buffer_size=sort_buffer_size, paths=paths)
+            fd.flush()
+        except (socket.error, IOError) as ex:
+            logger.info("Client went away: {0}".format(ex))
+        finally:
+            # leave the socket file for the server to close
+            try:
+                fd.detach()
+            except (socket.error, IOError):
+                pass
+
+    def address_string(self):
+        # Unix socket clients do not have an address.
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return self.server.server_address
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    '''
+    A threaded HTTP server holding a loaded Gramps database.
+
+    :param server_address: a (host, port) tuple, or the path of a Unix
+      socket.
+
+    :param holder: the StoreHolder to answer requests from.
+
+    :param sort_buffer_size: the maximum number of records held in memory
+      while sorting each response.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, server_address, holder,
+                 sort_buffer_size=gramps2gource.DEFAULT_SORT_BUFFER_SIZE):
+        self.holder = holder
+        self.sort_buffer_size = sort_buffer_size
+        if not isinstance(server_address, tuple):
+            self.address_family = socket.AF_UNIX
+        HTTPServer.__init__(self, server_address, RequestHandler)
+
+    def server_bind(self):
+        if self.address_family == socket.AF_UNIX:
+            if os.path.exists(self.server_address):
+                os.remove(self.server_address)
+            # HTTPServer.server_bind expects a host and port.
+            self.socket.bind(self.server_address)
+            self.server_address = self.socket.getsockname()
+            self.server_name = "localhost"
+            self.server_port = 0
+        else:
+            HTTPServer.server_bind(self)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        if self.address_family == socket.AF_UNIX:
+            try:
+                os.remove(self.server_address)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve Gource custom logs from Gramps data")
+    parser.add_argument("-d", "--db", dest="database", default=None,
+                        type=str,
+                        help="The gramps database file to serve")
+    parser.add_argument("--host", dest="host", default="127.0.0.1",
+                        type=str,
+                        help="The address to listen on")
+    parser.add_argument("-p", "--port", dest="port", default=8080, type=int,
+                        help="The port to listen on")
+    parser.add_argument("--unix-socket", dest="unix_socket", default=None,
+                        type=str,
+                        help="Listen on a Unix socket at this path instead "
+                        "of a TCP port")
+    parser.add_argument("--cache-dir", dest="cache_dir", default=None,
+                        type=str,
+                        help="A directory to keep a snapshot of the parsed "
+                        "gramps database in")
+    parser.add_argument("--log-cache", dest="log_cache", default=None,
+                        type=str,
+                        help="A directory to keep generated logs in, so "
+                        "repeated requests are copied from the cache")
+    parser.add_argument("--log-cache-size", dest="log_cache_size",
+                        default=512, type=int,
+                        help="The maximum size of the log cache in MB")
+    parser.add_argument("--sort-buffer", dest="sort_buffer_size",
+                        default=gramps2gource.DEFAULT_SORT_BUFFER_SIZE,
+                        type=int,
+                        help="The maximum number of records held in memory "
+                        "while sorting each response")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    if args.database is None:
+        print("Error: No gramps file provided")
+        parser.print_usage()
+        sys.exit(1)
+
+    log_cache = None
+    if args.log_cache:
+        from log_cache import LogCache
+        log_cache = LogCache(
+            args.log_cache, max_size=args.log_cache_size * 2 ** 20)
+
+    holder = StoreHolder(args.database, cache_dir=args.cache_dir,
+                         log_cache=log_cache)
+
+    if args.unix_socket:
+        address = args.unix_socket
+    else:
+        address = (args.host, args.port)
+
+    server = Server(address, holder, sort_buffer_size=args.sort_buffer_size)
+    logger.info("Listening on {0}".format(
+        args.unix_socket or "http://{0}:{1}/".format(args.host, args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    sys.exit(0)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+
+'''
+This module implements the outputs Gource custom logs are written to, and a
+reader for logs written by them.
+
+A sink formats records in batches and writes them to a buffered binary
+stream, which may compress them. The sink for an output is chosen by
+open_sink from a scheme prefixed to the output, or else from its
+extension:
+
+    pedigree.log                  - a plain text file
+    pedigree.log.gz               - a gzip compressed file
+    pedigree.log.zst              - a zstd compressed file, when the
+                                    zstandard module is installed
+    gzip:pedigree.log             - a gzip compressed file, whatever its
+                                    extension
+    file:///tmp/pedigree.log.gz   - a plain text file, whatever its
+                                    extension
+    unix:///tmp/gource.sock       - a Unix socket another process is
+                                    listening on
+    -                             - stdout
+
+Compressed logs are read back by read_records, which recognises them by
+their content rather than their name. This script streams a log, such as
+one kept by log_cache.py, to stdout or straight into Gource without
+decompressing it to disk first:
+
+    $ python sinks.py pedigree.log.zst | gource --log-format custom -
+    $ python sinks.py --exec-gource pedigree.log.gz
+
+Author: Chris Laws
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import gzip
+import io
+import itertools
+import logging
+import os
+import re
+import shutil
+import socket
+import stat
+import sys
+try:
+    import zstandard
+except ImportError:
+    # zstd compression is optional
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# The number of records formatted and written at a time.
+DEFAULT_BATCH_SIZE = 1000
+
+# The size of the buffer between a sink and its file or socket.
+DEFAULT_BUFFER_SIZE = 2 ** 20
+
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+# The magic numbers at the start of compressed logs.
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_RECORD_FORMAT = "%s|%s|%s|%s\n"
+
+# Matches an output given with a scheme, such as gzip:pedigree.log or
+# unix:///tmp/gource.sock.
+_SCHEME_RE = re.compile(r'^([a-z]+):(?://)?(.+)$')
+
+
+def format_records(records):
+    '''
+    Return the UTF-8 encoded lines of the Gource custom log format for a
+    list of (timestamp, name, event, path) tuples.
+    '''
+    # printf style formatting of whole tuples is about twice as fast as
+    # str.format here, which matters for logs of millions of records.
+    return "".join([_RECORD_FORMAT % record for record in records]).encode(
+        'utf-8')
+
+
+def batches(records, batch_size=DEFAULT_BATCH_SIZE):
+    '''
+    Generate lists of up to batch_size records.
+    '''
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class Sink(object):
+    '''
+    Writes Gource custom logs to a binary stream in batches of records.
+    Subclasses open the stream.
+
+    :param batch_size: the number of records formatted and written at a
+      time.
+    '''
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def open(self):
+        '''
+        Return a context manager providing the binary stream to write to.
+        '''
+        raise NotImplementedError
+
+    def write_records(self, records):
+        '''
+        Write records to the stream, followed by the empty line Gource
+        takes as the end of the log.
+        '''
+        with self.open() as fd:
+            for batch in batches(records, self.batch_size):
+                fd.write(format_records(batch))
+            fd.write(b"\n")
+
+    def write_log(self, log):
+        '''
+        Copy a log already in the Gource custom log format from an
+        uncompressed binary stream, see open_log.
+        '''
+        with self.open() as fd:
+            shutil.copyfileobj(log, fd, DEFAULT_BUFFER_SIZE)
+
+
+class FileSink(Sink):
+    '''
+    Writes logs to a plain text file.
+    '''
+
+    def __init__(self, path, **kwargs):
+        super(FileSink, self).__init__(**kwargs)
+        self.path = path
+
+    def open(self):
+        return io.open(self.path, 'wb', buffering=DEFAULT_BUFFER_SIZE)
+
+
+class GzipSink(FileSink):
+    '''
+    Writes logs to a gzip compressed file.
+
+    :param level: the compression level, from 1 (fastest) to 9 (smallest).
+    '''
+
+    def __init__(self, path, level=DEFAULT_GZIP_LEVEL, **kwargs):
+        super(GzipSink, self).__init__(path, **kwargs)
+        self.level = level
+
+    @contextlib.contextmanager
+    def open(self):
+        with super(GzipSink, self).open() as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb',
+                               compresslevel=self.level) as fd:
+                yield fd
+
+
+class ZstdSink(FileSink):
+    '''
+    Writes logs to a zstd compressed file. Needs the zstandard module.
+
+    :param level: the compression level, from 1 (fastest) to 22
+      (smallest).
+    '''
+
+    def __init__(self, path, level=DEFAULT_ZSTD_LEVEL, **kwargs):
+        if zstandard is None:
+            raise ValueError(
+                "Writing {0} needs the zstandard module, install it with "
+                "'pip install zstandard'".format(path))
+        super(ZstdSink, self).__init__(path, **kwargs)
+        self.level = level
+
+    @contextlib.contextmanager
+    def open(self):
+        with super(ZstdSink, self).open() as raw:
+            compressor = zstandard.ZstdCompressor(level=self.level)
+            with compressor.stream_writer(raw, closefd=False) as fd:
+                yield fd
+
+
+class StreamSink(Sink):
+    '''
+    Writes logs to a file object that is already open, such as stdout,
+    leaving it open. Text file objects are written through their binary
+    buffer when they have one.
+    '''
+
+    def __init__(self, fd, **kwargs):
+        super(StreamSink, self).__init__(**kwargs)
+        self.fd = fd
+
+    @contextlib.contextmanager
+    def open(self):
+        fd = self.fd
+        if isinstance(fd, io.TextIOBase):
+            # send anything already written as text first
+            fd.flush()
+            buffer = getattr(fd, 'buffer', None)
+            fd = buffer if buffer is not None else _TextWriter(fd)
+        yield fd
+        fd.flush()
+
+
+class _TextWriter(object):
+    '''
+    Writes UTF-8 encoded data to a text file object.
+    '''
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def write(self, data):
+        self.fd.write(data.decode('utf-8'))
+
+    def flush(self):
+        self.fd.flush()
+
+
+class UnixSocketSink(Sink):
+    '''
+    Writes logs to a Unix socket that another process is listening on.
+    The connection is closed once the log has been written.
+
+    The socket must already exist, so that a missing listener is reported
+    before the records are generated rather than once they are written.
+    '''
+
+    def __init__(self, path, **kwargs):
+        try:
+            is_socket = stat.S_ISSOCK(os.stat(path).st_mode)
+        except OSError as ex:
+            raise ValueError(
+                "Can not write to the Unix socket {0}: {1}".format(
+                    path, ex.strerror))
+        if not is_socket:
+            raise ValueError("{0} is not a Unix socket".format(path))
+        super(UnixSocketSink, self).__init__(**kwargs)
+        self.path = path
+
+    @contextlib.contextmanager
+    def open(self):
+        with contextlib.closing(
+                socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+            sock.connect(self.path)
+            with sock.makefile('wb', buffering=DEFAULT_BUFFER_SIZE) as fd:
+                yield fd
+
+
+# The sinks chosen by each output scheme, and by each file extension.
+SCHEMES = {
+    'file': FileSink,
+    'gzip': GzipSink,
+    'zstd': ZstdSink,
+    'unix': UnixSocketSink,
+}
+EXTENSIONS = {
+    '.gz': GzipSink,
+    '.zst': ZstdSink,
+}
+
+
+def split_output(output):
+    '''
+    Return the (scheme, path) of an output. The scheme is None when the
+    output does not start with one of SCHEMES.
+    '''
+    match = _SCHEME_RE.match(output)
+    if match and match.group(1) in SCHEMES:
+        return match.group(1), match.group(2)
+    return None, output
+
+
+def open_sink(output, **kwargs):
+    '''
+    Return the sink to write a log to an output.
+
+    :param output: '-' for stdout, an open file object, a path whose
+      extension may choose a compressed sink, see EXTENSIONS, or a path
+      prefixed with one of SCHEMES. Objects that already have a
+      write_records method, such as sinks or gource_pipe.GourcePipe, are
+      returned as they are.
+
+    Any other keyword arguments are passed to the sink.
+    '''
+    if hasattr(output, 'write_records'):
+        return output
+    if output == '-':
+        return StreamSink(sys.stdout, **kwargs)
+    if hasattr(output, 'write'):
+        return StreamSink(output, **kwargs)
+
+    scheme, path = split_output(output)
+    if scheme is not None:
+        return SCHEMES[scheme](path, **kwargs)
+    for extension, sink in EXTENSIONS.items():
+        if path.endswith(extension):
+            return sink(path, **kwargs)
+    return FileSink(path, **kwargs)
+
+
+def open_log(source):
+    '''
+    Open a log for reading, returning an uncompressed binary stream.
+    Compressed logs are recognised by their content.
+
+    :param source: the path of the log, or '-' to read stdin.
+    '''
+    if source == '-':
+        fd = io.BufferedReader(
+            _Unclosed(getattr(sys.stdin, 'buffer', sys.stdin)),
+            DEFAULT_BUFFER_SIZE)
+        magic = fd.peek(len(ZSTD_MAGIC))[:len(ZSTD_MAGIC)]
+    else:
+        path = split_output(source)[1]
+        with io.open(path, 'rb') as fd:
+            magic = fd.read(len(ZSTD_MAGIC))
+        fd = io.open(path, 'rb', buffering=DEFAULT_BUFFER_SIZE)
+
+    try:
+        if magic.startswith(GZIP_MAGIC):
+            return _GzipLog(fd)
+        if magic.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise ValueError(
+                    "Reading {0} needs the zstandard module, install it "
+                    "with 'pip install zstandard'".format(source))
+            return io.BufferedReader(
+                zstandard.ZstdDecompressor().stream_reader(fd, closefd=True),
+                DEFAULT_BUFFER_SIZE)
+    except BaseException:
+        fd.close()
+        raise
+    return fd
+
+
+class _GzipLog(gzip.GzipFile):
+    '''
+    Reads a gzip compressed stream, closing the stream when it is closed.
+    '''
+
+    def __init__(self, fd):
+        gzip.GzipFile.__init__(self, fileobj=fd, mode='rb')
+        self._fd = fd
+
+    def close(self):
+        try:
+            gzip.GzipFile.close(self)
+        finally:
+            self._fd.close()
+
+
+class _Unclosed(io.RawIOBase):
+    '''
+    Reads from a binary stream without closing it, for example so that
+    stdin is left open once a log has been read from it.
+    '''
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.fd.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_records(source):
+    '''
+    Generate the records of a log, compressed or not, in the order they
+    were written.
+
+    :param source: the path of the log, '-' to read stdin, or a binary
+      stream returned by open_log, which is left open.
+    '''
+    if hasattr(source, 'read'):
+        lines = io.TextIOWrapper(
+            io.BufferedReader(_Unclosed(source), DEFAULT_BUFFER_SIZE),
+            encoding='utf-8')
+    else:
+        lines = io.TextIOWrapper(open_log(source), encoding='utf-8')
+    with lines:
+        for line in lines:
+            line = line.rstrip('\n')
+            if line:
+                ts, name, event, path = line.split('|', 3)
+                yield (int(ts), name, event, path)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Stream a Gource custom log, compressed or not")
+    parser.add_argument("log", help="The log to read, or '-' to read stdin")
+    parser.add_argument("-o", "--output", dest="output", default="-",
+                        type=str,
+                        help="Where to write the log, see open_sink. "
+                        "Defaults to stdout")
+    parser.add_argument("--exec-gource", dest="exec_gource",
+                        action="store_true",
+                        help="Stream the log straight into gource, using "
+                        "gource.conf")
+    parser.add_argument("--gource", dest="gource", default="gource",
+                        type=str,
+                        help="The command used to run gource with "
+                        "--exec-gource")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    try:
+        if args.exec_gource:
+            import gource_pipe
+            sink = gource_pipe.GourcePipe(args.gource)
+            status = sink.write_records(read_records(args.log))
+            sys.exit(status)
+
+        with open_log(args.log) as log:
+            open_sink(args.output).write_log(log)
+    except (IOError, OSError, ValueError) as ex:
+        print("Error: {0}".format(ex), file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(0)
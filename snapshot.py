@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+'''
+This module implements an on-disk cache of parsed Gramps stores.
+
+Parsing a large Gramps export, or reading a Gramps SQLite database, takes
+far longer than loading the objects it describes, so a snapshot of the
+parsed store, with its indexes built and event dates already resolved, is
+saved the first time a file is used. Later runs against the same file load
+the snapshot instead.
+
+    from snapshot import SnapshotCache
+
+    cache = SnapshotCache('/var/cache/gramps2gource')
+    store = cache.load('example.gramps')
+
+A snapshot file holds a short header followed by the pickled store:
+
+    magic (4 bytes) | header length (4 bytes) | JSON header | pickle
+
+The header records the size, modification time and SHA-1 digest of the
+Gramps file the snapshot was made from, along with the date handlers the
+event dates were resolved with and the day they were resolved on. A
+snapshot is used when the size and modification time still match. When
+only the modification time has changed, for example because the file was
+exported again without changes, the file is hashed and the snapshot is
+used if the digest matches; only its header is then rewritten. Otherwise,
+when different date handlers are registered, or on a later day, as dates
+giving only a year are resolved against the current date (see
+gramps.resolution_date), the file is parsed again and the snapshot
+replaced.
+
+The header is read and checked on its own so that a stale snapshot is
+never unpickled. Snapshots are read through a memory map so the pickle is
+loaded straight from the page cache without first copying the file into
+memory, and the garbage collector is paused while the objects are created.
+
+Author: Chris Laws
+'''
+
+from __future__ import unicode_literals
+
+import contextlib
+import gc
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+
+import gramps
+from profiling import profiler
+
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_MAGIC = b'G2GS'
+
+# Increment when the layout of the snapshot or of the objects in the store
+# changes so that older snapshots are rebuilt.
+SNAPSHOT_VERSION = 4
+
+_prefix = struct.Struct('<4sI')
+
+
+@contextlib.contextmanager
+def gc_paused():
+    '''
+    Pause the cyclic garbage collector. Pickling or unpickling a store
+    creates or visits hundreds of thousands of objects, which otherwise
+    triggers many collections that find nothing to free.
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def file_digest(path, block_size=2 ** 20):
+    '''
+    Return the SHA-1 hex digest of a file's contents.
+    '''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fd:
+        while True:
+            block = fd.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SnapshotCache(object):
+    '''
+    A directory of parsed store snapshots, one per Gramps file and store
+    type.
+
+    :param cache_dir: the directory snapshots are kept in. It is created
+      if it does not exist.
+
+    :param store_class: the Store class the Gramps file is parsed into.
+    '''
+
+    def __init__(self, cache_dir, store_class=gramps.Store):
+        self.cache_dir = cache_dir
+        self.store_class = store_class
+
+    def path(self, gramps_file):
+        '''
+        Return the path of the snapshot for a Gramps file.
+        '''
+        key = "{0}:{1}".format(
+            os.path.abspath(gramps_file), self.store_class.__name__)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, "{0}.snapshot".format(name))
+
+    def load(self, gramps_file):
+        '''
+        Return the store for a Gramps file, loading it from its snapshot
+        when the snapshot is up to date and parsing the file, then saving a
+        new snapshot, when it is not.
+        '''
+        # A Gramps family tree directory is keyed on its database file.
+        gramps_file = gramps.sqlite_database_file(gramps_file) or gramps_file
+        snapshot_file = self.path(gramps_file)
+        stat = os.stat(gramps_file)
+        digest = None
+
+        header, offset = self._read_header(snapshot_file)
+        if header is not None and header['size'] == stat.st_size:
+            touched = header['mtime'] != stat.st_mtime
+            if touched:
+                # The file was touched, check whether its contents changed.
+                digest = file_digest(gramps_file)
+            if not touched or header['digest'] == digest:
+                store = self._read_store(snapshot_file, offset)
+                if store is not None:
+                    profiler.count('snapshot_hits')
+                    if touched:
+                        logger.info(
+                            "Loaded snapshot of {0}, contents "
+                            "unchanged".format(gramps_file))
+                        self._rewrite_header(
+                            snapshot_file, offset, self._header(stat, digest))
+                    else:
+                        logger.info(
+                            "Loaded snapshot of {0}".format(gramps_file))
+                    return store
+
+        profiler.count('snapshot_misses')
+        logger.info(
+            "No up to date snapshot of {0}, parsing it".format(gramps_file))
+        store = gramps.loader_for(gramps_file).parse(
+            gramps_file, store=self.store_class())
+        store.resolve_dates()
+        self.save(gramps_file, store, stat=stat, digest=digest)
+        return store
+
+    def save(self, gramps_file, store, stat=None, digest=None):
+        '''
+        Save a snapshot of a store parsed from a Gramps file. The snapshot
+        is written to a temporary file first and then renamed so that
+        readers never see a partially written snapshot.
+
+        :param stat: the result of os.stat on the Gramps file before it was
+          parsed. Pass it to avoid missing changes made while parsing.
+
+        :param digest: the SHA-1 digest of the Gramps file, if known.
+        '''
+        if stat is None:
+            stat = os.stat(gramps_file)
+        if digest is None:
+            digest = file_digest(gramps_file)
+
+        def write(f):
+            with gc_paused():
+                pickle.dump(store, f, pickle.HIGHEST_PROTOCOL)
+
+        with profiler.stage('snapshot_save'):
+            self._write(self.path(gramps_file), self._header(stat, digest),
+                        write)
+
+        logger.debug("Saved snapshot of %s", gramps_file)
+
+    def _header(self, stat, digest):
+        '''
+        Return the header describing a snapshot of a Gramps file.
+        '''
+        return {
+            'version': SNAPSHOT_VERSION,
+            'store': self.store_class.__name__,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'digest': digest,
+            'date_handlers': _date_handlers(),
+            'resolution_date': gramps.resolution_date(),
+        }
+
+    def _write(self, snapshot_file, header, write):
+        '''
+        Write a snapshot file holding a header followed by the data written
+        by write, which is called with the open file.
+        '''
+        header = json.dumps(header).encode('utf-8')
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        fd, tmp_file = tempfile.mkstemp(
+            dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_prefix.pack(SNAPSHOT_MAGIC, len(header)))
+                f.write(header)
+                write(f)
+            os.replace(tmp_file, snapshot_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    def _rewrite_header(self, snapshot_file, offset, header):
+        '''
+        Replace the header of a snapshot, copying the pickled store that
+        follows it as it is.
+
+        :param offset: the offset of the pickled store in the snapshot.
+        '''
+        def write(f):
+            with open(snapshot_file, 'rb') as old:
+                old.seek(offset)
+                shutil.copyfileobj(old, f, 2 ** 20)
+
+        try:
+            self._write(snapshot_file, header, write)
+        except (IOError, OSError) as ex:
+            # The snapshot is still usable, its digest is checked again.
+            logger.warning(
+                "Could not update snapshot {0}: {1}".format(
+                    snapshot_file, ex))
+
+    def _read_header(self, snapshot_file):
+        '''
+        Return the header of a snapshot and the offset of the pickled store
+        that follows it, or (None, None) if there is no snapshot or it was
+        made by a different version, for a different store class, with
+        different date handlers or on a different day.
+        '''
+        try:
+            with open(snapshot_file, 'rb') as fd:
+                magic, length = _prefix.unpack(fd.read(_prefix.size))
+                if magic != SNAPSHOT_MAGIC:
+                    raise ValueError("Not a snapshot file")
+                header = json.loads(fd.read(length).decode('utf-8'))
+        except (IOError, OSError):
+            return None, None
+        except (ValueError, struct.error) as ex:
+            logger.warning(
+                "Ignoring unreadable snapshot {0}: {1}".format(
+                    snapshot_file, ex))
+            return None, None
+
+        if (header.get('version') != SNAPSHOT_VERSION or
+                header.get('store') != self.store_class.__name__):
+            logger.info(
+                "Ignoring snapshot {0} made by a different version".format(
+                    snapshot_file))
+            return None, None
+        if header.get('date_handlers') != _date_handlers():
+            logger.info(
+                "Ignoring snapshot {0} made with different date "
+                "handlers".format(snapshot_file))
+            return None, None
+        if header.get('resolution_date') != gramps.resolution_date():
+            logger.info(
+                "Ignoring snapshot {0} made on a different day".format(
+                    snapshot_file))
+            return None, None
+        return header, _prefix.size + length
+
+    def _read_store(self, snapshot_file, offset):
+        '''
+        Return the store pickled in a snapshot, or None if it can not be
+        read.
+
+        :param offset: the offset of the pickled store, from _read_header.
+        '''
+        try:
+            fd = open(snapshot_file, 'rb')
+        except (IOError, OSError):
+            return None
+
+        with profiler.stage('snapshot_load'), fd:
+            try:
+                data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # an empty file can not be mapped
+                return None
+            try:
+                view = memoryview(data)
+                try:
+                    with gc_paused():
+                        return pickle.loads(view[offset:])
+                finally:
+                    view.release()
+            except Exception as ex:
+                logger.warning(
+                    "Ignoring unreadable snapshot {0}: {1}".format(
+                        snapshot_file, ex))
+                return None
+            finally:
+                data.close()
+
+
+def _date_handlers():
+    '''
+    Return the date handlers event dates are resolved with, as they appear
+    in a snapshot header.
+    '''
+    return [list(handler) for handler in gramps.date_processor.describe()]
@@ -0,0 +1,69 @@
+'''
+Shared fixtures for the Gramps2Gource tests.
+
+The modules under test live in the top level directory of the repository
+rather than in a package, so it is put on the path here.
+'''
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate_gramps  # noqa: E402
+
+
+EXAMPLE_GRAMPS = os.path.join(ROOT, 'example.gramps')
+
+
+def summarise_store(store):
+    '''
+    Return the values loaded into the persons, families, events and places
+    of a store as plain dicts of tuples keyed by handle, so that stores
+    loaded in different ways can be compared for equality.
+    '''
+    return {
+        'persons': dict(
+            (handle, (p.id, p.gender, tuple(p.firstnames), p.surname,
+                      p.prefix, tuple(p.event_handles), p.child_of_handle,
+                      tuple(p.parent_in_handles), tuple(p.notes)))
+            for handle, p in store.persons.items()),
+        'families': dict(
+            (handle, (f.id, f.father_handle, f.mother_handle,
+                      f.relationship, tuple(f.event_handles),
+                      tuple(f.children_handles),
+                      tuple(f.step_children_handles),
+                      tuple(f.source_handles)))
+            for handle, f in store.families.items()),
+        'events': dict(
+            (handle, (e.id, e.type, e.date, e.date_type, e.date_cformat,
+                      e.description, e.place_handle, tuple(e.note_handles),
+                      tuple(e.source_handles)))
+            for handle, e in store.events.items()),
+        'places': dict(
+            (handle, (p.id, p.title, p.lat, p.lon))
+            for handle, p in store.places.items()),
+    }
+
+
+@pytest.fixture
+def summarise():
+    return summarise_store
+
+
+@pytest.fixture
+def example_gramps():
+    return EXAMPLE_GRAMPS
+
+
+@pytest.fixture(scope='session')
+def generated_gramps(tmp_path_factory):
+    '''
+    A small synthetic database with pedigree collapse and every date form.
+    '''
+    path = str(tmp_path_factory.mktemp('generated') / 'generated.gramps')
+    generate_gramps.generate(path, persons=400, generations=6, seed=7)
+    return path
@@ -0,0 +1,111 @@
+'''
+Tests of the iterative ancestor walks and of how each collapse mode lists
+ancestors reached through more than one line.
+'''
+
+import pytest
+
+import benchmark
+import gramps
+import gramps2gource
+
+
+def build_line(generations):
+    '''
+    Return a Store holding a single line of descent, each person the only
+    child of their father, along with the youngest person.
+    '''
+    store = gramps.Store()
+    child = None
+    for generation in range(generations + 1):
+        person = gramps.Person(store)
+        person.handle = "_p{0}".format(generation)
+        person.firstnames = ("Person{0}".format(generation),)
+        store.persons[person.handle] = person
+        if child is not None:
+            family = gramps.Family(store)
+            family.handle = "_f{0}".format(generation)
+            family.father_handle = person.handle
+            family.children_handles = (child.handle,)
+            person.parent_in_handles = (family.handle,)
+            child.child_of_handle = family.handle
+            store.families[family.handle] = family
+        else:
+            youngest = person
+        child = person
+    return store, youngest
+
+
+@pytest.fixture(scope='module')
+def collapsed():
+    store, handle = benchmark.build_collapsed_store(generations=7, width=3)
+    return store, store.get_person(handle)
+
+
+def test_deep_lines_do_not_recurse():
+    store, youngest = build_line(5000)
+    assert len(youngest.ancestors()) == 5001
+
+    g2g = gramps2gource.Gramps2Gource(None, store=store)
+    ancestors = g2g.get_ancestors(youngest)
+    assert len(ancestors) == 5001
+    assert ancestors[-1][1].count('/') == 5001
+
+
+def test_collapse_first_lists_each_ancestor_once(collapsed):
+    store, focus = collapsed
+    g2g = gramps2gource.Gramps2Gource(None, store=store)
+    handles = [handle for handle, _ in g2g.get_ancestors(
+        focus, collapse=gramps2gource.COLLAPSE_FIRST)]
+    assert len(handles) == len(set(handles))
+    assert sorted(handles) == sorted(focus.ancestors())
+
+
+def test_collapse_all_lists_every_line(collapsed):
+    store, focus = collapsed
+    g2g = gramps2gource.Gramps2Gource(None, store=store)
+    ancestors = g2g.get_ancestors(focus, collapse=gramps2gource.COLLAPSE_ALL)
+    # every person has two parents up to the oldest generation
+    assert len(ancestors) == 2 ** 8 - 1
+    assert len(set(path for _, path in ancestors)) == len(ancestors)
+
+
+def test_collapse_reference_expands_each_ancestor_once(collapsed):
+    store, focus = collapsed
+    g2g = gramps2gource.Gramps2Gource(None, store=store)
+    ancestors = g2g.get_ancestors(
+        focus, collapse=gramps2gource.COLLAPSE_REFERENCE)
+    handles = set(handle for handle, _ in ancestors)
+    assert sorted(handles) == sorted(focus.ancestors())
+    assert len(handles) < len(ancestors)
+
+    # each ancestor's parents are listed under one of their paths only
+    with_parents = [handle for handle in handles
+                    if store.get_person(handle).child_of_handle]
+    assert len(ancestors) == 1 + 2 * len(with_parents)
+    parent_dirs = set(path.rsplit('/', 2)[0] for _, path in ancestors[1:])
+    for handle in with_parents:
+        dirs = [path.rsplit('/', 1)[0]
+                for ancestor, path in ancestors if ancestor == handle]
+        assert len([directory for directory in dirs
+                    if directory in parent_dirs]) == 1
+
+
+def test_loops_are_not_followed(caplog):
+    store, youngest = build_line(3)
+    # make the youngest person their own great grandfather
+    oldest = store.get_person('_p3')
+    family = gramps.Family(store)
+    family.handle = '_loop'
+    family.father_handle = youngest.handle
+    family.children_handles = (oldest.handle,)
+    oldest.child_of_handle = family.handle
+    store.families[family.handle] = family
+
+    assert sorted(youngest.ancestors()) == ['_p0', '_p1', '_p2', '_p3']
+    g2g = gramps2gource.Gramps2Gource(None, store=store)
+    for collapse in gramps2gource.COLLAPSE_MODES:
+        handles = [handle for handle, _ in g2g.get_ancestors(
+            youngest, collapse=collapse)]
+        assert set(handles) == set(['_p0', '_p1', '_p2', '_p3'])
+    assert "Loop detected" in caplog.text
@@ -0,0 +1,238 @@
+'''
+Tests that the canonical date fast path gives the same results as parsing
+with dateutil.
+'''
+
+import calendar
+import datetime
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import gramps
+
+
+def parse_both(datestring):
+    '''
+    Return what DateParser returns for a date string with and without the
+    fast path, or the type of the exception it raises.
+    '''
+    results = []
+    for fast_path in (True, False):
+        date_parser = gramps.DateParser(cache_size=0, fast_path=fast_path)
+        try:
+            results.append(date_parser.parse(datestring))
+        except (ValueError, OverflowError) as ex:
+            results.append(type(ex))
+    return results
+
+
+@pytest.mark.parametrize('datestring, expected', [
+    ('1955-06-04', datetime.datetime(1955, 6, 4)),
+    ('1800-12-31', datetime.datetime(1800, 12, 31)),
+    ('2020-02-29', datetime.datetime(2020, 2, 29)),
+    ('0999-01-01', datetime.datetime(999, 1, 1)),
+    ('1955-06', datetime.datetime(1955, 6, 1)),
+    ('1700-01', datetime.datetime(1700, 1, 1)),
+])
+def test_canonical_dates(datestring, expected):
+    assert gramps.canonical_date_parser(datestring) == expected
+    assert gramps.default_date_parser(datestring) == expected
+
+
+@pytest.mark.parametrize('datestring', ['1955', '1600', '0999', '2024'])
+def test_year_only_dates_match_dateutil(datestring):
+    fast = gramps.canonical_date_parser(datestring)
+    assert fast is not None
+    assert fast.year == int(datestring)
+    assert fast == gramps.default_date_parser(datestring)
+
+
+@pytest.mark.parametrize('datestring', [
+    # not in a canonical form
+    '1955-6-4', '1955/06/04', '19550604', '1955-06-04 ', 'abt 1955',
+    '4 June 1955',
+    # canonical in form but not valid dates
+    '1955-02-30', '1900-02-29', '1955-13', '1955-00', '1955-06-00', '0000',
+    # malformed
+    '', '????-05-01', '1955-??-04', '12345', '1955-06-04-01',
+    # years dateutil reads as a day or a two digit year
+    '0001', '0031', '0099',
+])
+def test_other_dates_are_left_to_dateutil(datestring):
+    assert gramps.canonical_date_parser(datestring) is None
+    fast, slow = parse_both(datestring)
+    assert fast == slow
+
+
+def test_fast_path_matches_dateutil_for_generated_dates():
+    dates = []
+    for year in (1, 50, 99, 100, 999, 1582, 1752, 1900, 2000, 2100, 9999):
+        dates.append("{0:04d}".format(year))
+        for month in (1, 2, 12):
+            dates.append("{0:04d}-{1:02d}".format(year, month))
+            for day in (1, 28, 29, 31):
+                dates.append("{0:04d}-{1:02d}-{2:02d}".format(
+                    year, month, day))
+    for datestring in dates:
+        fast, slow = parse_both(datestring)
+        assert fast == slow, datestring
+
+
+def test_fast_path_not_used_for_other_calendars():
+    calls = []
+
+    def handler(datestring):
+        calls.append(datestring)
+        return datetime.datetime(1800, 1, 1)
+
+    date_parser = gramps.DateParser()
+    date_parser.register('Julian', handler)
+    assert date_parser.parse('1955-06-04', 'Julian') == \
+        datetime.datetime(1800, 1, 1)
+    assert calls == ['1955-06-04']
+
+
+def test_cache_shared_between_threads():
+    date_parser = gramps.DateParser(cache_size=16)
+    dates = ["{0:04d}-01-01".format(year) for year in range(1800, 1900)]
+    errors = []
+
+    def parse_all():
+        try:
+            for _ in range(20):
+                for datestring in dates:
+                    assert date_parser.parse(datestring).year == \
+                        int(datestring[:4])
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=parse_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(date_parser._cache) <= 16
+    assert date_parser.hits + date_parser.misses == 4 * 20 * len(dates)
+
+
+def counting_parser(cache_size):
+    '''
+    Return a DateParser with a Julian handler that records each date it is
+    asked to parse, along with the list of those dates.
+    '''
+    calls = []
+
+    def handler(datestring):
+        calls.append(datestring)
+        return datetime.datetime(int(datestring[:4]), 1, 1)
+
+    date_parser = gramps.DateParser(cache_size=cache_size)
+    date_parser.register('Julian', handler)
+    return date_parser, calls
+
+
+def test_cache_evicts_the_least_recently_used_date():
+    date_parser, calls = counting_parser(2)
+    for datestring in ('1800', '1801', '1800', '1802'):
+        date_parser.parse(datestring, 'Julian')
+    # 1800 was used again after 1801 was parsed, so 1801 went first
+    assert list(date_parser._cache) == [('1800', 'Julian'),
+                                        ('1802', 'Julian')]
+    assert calls == ['1800', '1801', '1802']
+
+    date_parser.parse('1800', 'Julian')
+    date_parser.parse('1801', 'Julian')
+    assert calls == ['1800', '1801', '1802', '1801']
+    assert list(date_parser._cache) == [('1800', 'Julian'),
+                                        ('1801', 'Julian')]
+    assert (date_parser.hits, date_parser.misses) == (2, 4)
+
+
+def test_cache_size_zero_disables_the_cache():
+    date_parser, calls = counting_parser(0)
+    for _ in range(3):
+        assert date_parser.parse('1800', 'Julian') == \
+            datetime.datetime(1800, 1, 1)
+    assert calls == ['1800'] * 3
+    assert not date_parser._cache
+    assert (date_parser.hits, date_parser.misses) == (0, 0)
+
+
+def test_event_datetime_is_parsed_once(monkeypatch):
+    calls = []
+    parse = gramps.date_processor.parse
+
+    def counting_parse(*args, **kwargs):
+        calls.append(args)
+        return parse(*args, **kwargs)
+
+    monkeypatch.setattr(gramps.date_processor, 'parse', counting_parse)
+    event = gramps.Event(None)
+    event.date = '1955-06-04'
+    for _ in range(3):
+        assert event.datetime == datetime.datetime(1955, 6, 4)
+    assert event.timestamp == calendar.timegm((1955, 6, 4, 0, 0, 0))
+    assert calls == [('1955-06-04',)]
+
+
+TIMESTAMP_DATES = [
+    (datetime.datetime(1970, 1, 1), 0),
+    (datetime.datetime(1998, 4, 12), 892339200),
+    (datetime.datetime(1969, 12, 31, 23, 59, 59), -1),
+    (datetime.datetime(1900, 3, 1), -2203891200),
+    (datetime.datetime(1582, 10, 15), -12219292800),
+    (datetime.datetime(999, 1, 1), -30641760000),
+    (datetime.datetime(1, 1, 1), -62135596800),
+]
+
+
+@pytest.mark.parametrize('dt, expected', TIMESTAMP_DATES)
+def test_to_timestamp(dt, expected):
+    assert gramps.to_timestamp(dt) == expected
+    assert gramps.to_timestamp(dt) == calendar.timegm(dt.timetuple())
+
+
+def test_to_timestamp_of_aware_datetimes():
+    dt = datetime.datetime(1998, 4, 12, 9, 30)
+    utc = gramps.to_timestamp(dt)
+    for hours in (-11, -5, 0, 5.5, 10):
+        offset = datetime.timedelta(hours=hours)
+        aware = (dt + offset).replace(tzinfo=datetime.timezone(offset))
+        assert gramps.to_timestamp(aware) == utc
+    assert gramps.to_timestamp(
+        datetime.datetime(1000, 1, 1, 10, tzinfo=datetime.timezone(
+            datetime.timedelta(hours=10)))) == \
+        gramps.to_timestamp(datetime.datetime(1000, 1, 1))
+
+
+# Prints the timestamps of TIMESTAMP_DATES and of the events in an export.
+# Year only dates are left out, they take their month and day from the
+# local date today, as dateutil does, which differs between timezones.
+TIMESTAMP_SCRIPT = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import gramps
+import test_dates
+print([gramps.to_timestamp(dt) for dt, _ in test_dates.TIMESTAMP_DATES])
+store = gramps.parser.parse(sys.argv[2])
+print(sorted((event.handle, event.timestamp)
+             for event in store.events.values()
+             if event.date and len(event.date) > 4))
+'''
+
+
+def test_timestamps_do_not_depend_on_the_host_timezone(example_gramps):
+    outputs = []
+    for timezone in ('UTC', 'Australia/Adelaide', 'America/New_York'):
+        env = dict(os.environ, TZ=timezone)
+        outputs.append(subprocess.check_output(
+            [sys.executable, '-c', TIMESTAMP_SCRIPT,
+             os.path.dirname(os.path.abspath(__file__)), example_gramps],
+            env=env, universal_newlines=True))
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert str([expected for _, expected in TIMESTAMP_DATES]) in outputs[0]
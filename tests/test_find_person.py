@@ -0,0 +1,63 @@
+'''
+Tests of looking up persons in a Store by handle, Gramps ID and name.
+'''
+
+import pytest
+
+import gramps
+
+
+@pytest.fixture
+def store(example_gramps):
+    return gramps.parser.parse(example_gramps)
+
+
+def test_find_person_by_handle_id_and_name(store):
+    person = store.get_person_by_id('I0002')
+    assert person.name == "Amber Marie Smith"
+    assert store.find_person(person.handle) == person.handle
+    assert store.find_person('I0002') == person.handle
+    assert store.find_person("Amber Marie Smith") == person.handle
+
+
+@pytest.mark.parametrize('name', [
+    "amber marie smith", "AMBER MARIE SMITH", "  Amber   Marie\tSmith ",
+])
+def test_names_ignore_case_and_whitespace(store, name):
+    assert store.find_person(name) == store.get_person_by_id('I0002').handle
+
+
+def test_unknown_persons_are_not_found(store):
+    assert store.find_person("Nobody Smith") is None
+    assert store.find_person('I9999') is None
+    assert store.find_persons("Nobody Smith") == []
+    assert store.get_person_by_id('I9999') is None
+
+
+def test_shared_names_find_every_person(store, caplog):
+    # Martin Smith (I0022 and I0039) appears twice in example.gramps
+    handles = store.find_persons("Martin Smith")
+    assert sorted(store.get_person(handle).id for handle in handles) == \
+        ['I0022', 'I0039']
+    assert store.find_person("Martin Smith") == handles[0]
+    assert "Found 2 persons named Martin Smith" in caplog.text
+
+
+def test_indexes_match_a_scan(store):
+    for person in store.persons.values():
+        assert person.handle in store.find_persons(person.name)
+        assert store.get_person_by_id(person.id) is person
+
+
+def test_build_indexes_picks_up_added_persons(store):
+    assert store.find_person("Added Person") is None
+    person = gramps.Person(store)
+    person.handle = '_added'
+    person.id = 'I9000'
+    person.firstnames = ("Added",)
+    person.surname = "Person"
+    store.persons[person.handle] = person
+
+    store.build_indexes()
+    assert store.find_person("Added Person") == '_added'
+    assert store.find_person('I9000') == '_added'
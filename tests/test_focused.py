@@ -0,0 +1,100 @@
+'''
+Tests that a focused load, which only loads the relatives of the focus
+persons, gives the same logs as loading the whole database.
+'''
+
+import io
+
+import pytest
+
+import generate_gramps
+import gramps
+import gramps2gource
+
+
+@pytest.fixture(scope='module')
+def store(generated_gramps):
+    return gramps.parser.parse(generated_gramps)
+
+
+@pytest.fixture(scope='module')
+def links(generated_gramps):
+    return gramps.parser.parse_links(generated_gramps)
+
+
+def test_ancestor_closure_matches_store(store, links):
+    for person in store.persons.values():
+        assert links.closure([person.handle]) == set(person.ancestors())
+
+
+@pytest.mark.parametrize('generations', [None, 0, 2])
+def test_descendant_closure_matches_store(store, links, generations):
+    for person in store.persons.values():
+        assert links.closure(
+            [person.handle], gramps.DESCENDANTS, generations) == \
+            set(person.descendents(generations=generations))
+
+
+@pytest.fixture(params=['xml', 'sqlite'])
+def database(request, generated_gramps, store, tmp_path):
+    if request.param == 'xml':
+        return generated_gramps
+    path = str(tmp_path / 'generated.db')
+    generate_gramps.write_sqlite(store, path)
+    return path
+
+
+@pytest.mark.parametrize('mode, relatives', [
+    ('pedigree', gramps.ANCESTORS),
+    ('descendants', gramps.DESCENDANTS),
+])
+def test_focused_load_matches_full_load(database, store, mode, relatives):
+    # focus persons given by handle and by Gramps ID
+    handles = sorted(store.persons)
+    names = [handles[0], store.persons[handles[len(handles) // 2]].id,
+             handles[-1]]
+
+    logs = []
+    for focus in (None, names):
+        g2g = gramps2gource.Gramps2Gource(
+            database, focus=focus, relatives=relatives,
+            projection=gramps2gource.PROJECTIONS[mode])
+        fd = io.StringIO()
+        getattr(g2g, mode)(names, fd)
+        logs.append((fd.getvalue(), len(g2g.db.persons)))
+
+    (full, full_persons), (focused, focused_persons) = logs
+    assert full
+    assert focused == full
+    assert focused_persons < full_persons
+
+
+def test_sqlite_child_of_follows_the_parent_family_list(generated_gramps,
+                                                        tmp_path):
+    # list a child in an earlier family as well as their own, so the order
+    # of the family table differs from the person's parent family list
+    store = gramps.parser.parse(generated_gramps)
+    families = list(store.families.values())
+    child, other = next(
+        (handle, earlier)
+        for index, family in enumerate(families)
+        for handle in family.children_handles
+        for earlier in families[:index])
+    other.children_handles = list(other.children_handles) + [child]
+    path = str(tmp_path / 'generated.db')
+    generate_gramps.write_sqlite(store, path)
+
+    links = gramps.sqlite_loader.parse_links(path)
+    assert links.child_of[child] == store.persons[child].child_of_handle
+    assert links.child_of[child] != other.handle
+    for handle, person in store.persons.items():
+        assert links.parent_in[handle] == tuple(person.parent_in_handles)
+
+    logs = []
+    for focus in (None, [child]):
+        g2g = gramps2gource.Gramps2Gource(path, focus=focus)
+        fd = io.StringIO()
+        g2g.pedigree([child], fd)
+        logs.append(fd.getvalue())
+    assert logs[0]
+    assert logs[1] == logs[0]
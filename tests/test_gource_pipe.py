@@ -0,0 +1,85 @@
+'''
+Tests of streaming logs into a gource subprocess, using a stub script in
+place of gource.
+'''
+
+import subprocess
+import sys
+
+import pytest
+
+import gource_pipe
+import gramps2gource
+import sinks
+
+
+# Saves what it reads from stdin to the file named by its first argument
+# and exits with the status given by its second. Any other arguments, such
+# as the configuration gource would be given, are ignored.
+STUB_GOURCE = '''
+import sys
+with open(sys.argv[1], 'wb') as fd:
+    fd.write(sys.stdin.buffer.read())
+sys.exit(int(sys.argv[2]))
+'''
+
+
+@pytest.fixture
+def stub_gource(tmp_path):
+    script = tmp_path / 'gource.py'
+    script.write_text(STUB_GOURCE)
+    received = tmp_path / 'received.log'
+
+    def command(status):
+        return [sys.executable, str(script), str(received), str(status)]
+    command.received = received
+    return command
+
+
+RECORDS = [
+    (-892339200, 'smith', 'A', '_SKNT6D7FA4WHUUE7Z6/Amber Marie Smith'),
+    (-129600000, 'smith', 'A', '_SKNT6D7FA4WHUUE7Z6/0/Edwin Michael Smith'),
+]
+
+
+@pytest.mark.parametrize('status', [0, 3])
+def test_records_are_streamed_to_gource(stub_gource, status):
+    pipe = gource_pipe.GourcePipe(stub_gource(status), conf=None,
+                                  batch_size=1)
+    assert pipe.write_records(iter(RECORDS)) == status
+    assert pipe.status == status
+    assert stub_gource.received.read_bytes() == \
+        sinks.format_records(RECORDS) + b"\n"
+
+
+def test_gource_status_is_the_exit_status(stub_gource, example_gramps):
+    command = subprocess.list2cmdline(stub_gource(3))
+    result = subprocess.run(
+        [sys.executable, gramps2gource.__file__, '--db', example_gramps,
+         '--names', 'I0002', '--exec-gource', '--gource', command],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    assert result.returncode == 3
+    assert 'GourcePipe object' not in result.stderr
+    assert "Custom gource log file: {0}".format(command) in result.stderr
+    assert list(sinks.read_records(str(stub_gource.received)))
+
+
+@pytest.mark.parametrize('gource, encoder', [
+    ('no-such-gource', None),
+    (sys.executable, 'no-such-encoder -i -'),
+])
+def test_missing_executables_are_reported_up_front(gource, encoder):
+    with pytest.raises(ValueError, match='no-such-'):
+        gource_pipe.GourcePipe(gource, encoder=encoder)
+
+
+def test_missing_gource_fails_before_generating(example_gramps):
+    result = subprocess.run(
+        [sys.executable, gramps2gource.__file__, '--db', example_gramps,
+         '--names', 'I0002', '--exec-gource', '--gource', 'no-such-gource'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    assert result.returncode == 1
+    assert "Command not found: no-such-gource" in result.stdout
+    assert "Writing custom gource log" not in result.stderr
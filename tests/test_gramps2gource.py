@@ -0,0 +1,134 @@
+'''
+Tests of the custom Gource log records Gramps2Gource produces.
+'''
+
+import io
+import os
+
+import pytest
+
+import gramps
+import gramps2gource
+
+
+def test_log_records_for_person_without_surname(example_gramps):
+    g2g = gramps2gource.Gramps2Gource(example_gramps)
+    person = g2g.db.get_person(g2g.db.find_person("Amber Marie Smith"))
+    person.surname = None
+    person_events = [(person, 'Smith/Amber', person.associated_events())]
+
+    records = g2g._pedigree_gource_log_records(person_events)
+    assert [record[1:] for record in records] == \
+        [('', gramps2gource.GOURCE_ADDED, 'Smith/Amber')]
+    for record in g2g._gource_log_records(person_events):
+        assert record[1] == ''
+
+
+def test_parallel_pedigree_loads_the_store_once(example_gramps, tmp_path,
+                                                monkeypatch):
+    names = ["Amber Marie Smith", "Keith Lloyd Smith", "Lars Peter Smith"]
+    expected = tmp_path / 'expected.log'
+    gramps2gource.Gramps2Gource(example_gramps).pedigree(
+        names, str(expected))
+
+    # Record each parse in a file, the workers are separate processes.
+    parses = tmp_path / 'parses'
+    parse = gramps.Parser.parse
+
+    def counting_parse(*args, **kwargs):
+        with open(str(parses), 'a') as fd:
+            fd.write("{0}\n".format(os.getpid()))
+        return parse(*args, **kwargs)
+
+    monkeypatch.setattr(gramps.Parser, 'parse', counting_parse)
+    output = tmp_path / 'parallel.log'
+    gramps2gource.Gramps2Gource(example_gramps).pedigree(
+        names, str(output), jobs=3)
+
+    assert parses.read_text().split() == [str(os.getpid())]
+    assert output.read_text() == expected.read_text()
+
+
+def test_timeline_treats_unparseable_dates_as_undated(example_gramps):
+    store = gramps.parser.parse(example_gramps)
+    person = store.get_person(store.find_person("Amber Marie Smith"))
+    event = [event for event in person.events if event.type == 'Birth'][0]
+    event.date = '????-05-12'
+
+    fd = io.StringIO()
+    gramps2gource.Gramps2Gource(None, store=store).timeline(fd)
+    lines = fd.getvalue().splitlines()
+    assert lines
+    assert not [line for line in lines
+                if line.endswith('|A|{0}/{1}'.format(
+                    person.handle, person.name_with_dates))]
+    assert event not in [event for _, event, _ in person.associated_events()]
+
+
+def test_descendants_treat_unparseable_dates_as_undated(example_gramps):
+    store = gramps.parser.parse(example_gramps)
+    person = store.get_person(store.find_person("Amber Marie Smith"))
+    event = [event for event in person.events if event.type == 'Birth'][0]
+    event.date = '????-05-12'
+
+    fd = io.StringIO()
+    gramps2gource.Gramps2Gource(None, store=store).descendants(
+        ["Edwin Michael Smith"], fd)
+    lines = fd.getvalue().splitlines()
+    assert lines
+    assert [line for line in lines
+            if line.endswith(person.name_with_dates)]
+    assert not [line for line in lines
+                if '|A|' in line and line.endswith(person.name_with_dates)]
+
+
+def test_compact_pedigree_paths_resolve_collapsed_ancestors(
+        generated_gramps):
+    g2g = gramps2gource.Gramps2Gource(generated_gramps)
+
+    def walk(person, steps):
+        # follow the father and mother directories of a compact path
+        for step in steps:
+            family = g2g.db.get_family(person.child_of_handle)
+            if step == gramps2gource.FATHER_STEP:
+                person = family.father
+            else:
+                assert step == gramps2gource.MOTHER_STEP
+                person = family.mother
+        return person.handle
+
+    collapsed = 0
+    for focus in g2g.db.persons.values():
+        compact = g2g.get_ancestors(focus, paths=gramps2gource.PATHS_COMPACT)
+        handles = g2g.get_ancestors(focus)
+        assert [handle for handle, _ in compact] == \
+            [handle for handle, _ in handles]
+        collapsed += len(compact) - len(set(
+            handle for handle, _ in compact))
+        for (handle, path), (_, handle_path) in zip(compact, handles):
+            directories = path.split('/')[:-1]
+            assert directories[0] == focus.handle
+            assert walk(focus, directories[1:]) == handle
+            assert handle_path.split('/')[-2] == handle
+            assert len(handle_path.split('/')) == len(path.split('/'))
+    assert collapsed
+
+
+@pytest.mark.parametrize('mode', gramps2gource.MODES)
+def test_projected_load_gives_the_full_log(generated_gramps, mode):
+    store = gramps.parser.parse(generated_gramps)
+    handles = sorted(store.persons)
+    names = [handles[0], handles[len(handles) // 2], handles[-1]]
+
+    logs = []
+    for projection in (None, gramps2gource.PROJECTIONS[mode]):
+        g2g = gramps2gource.Gramps2Gource(
+            generated_gramps, projection=projection)
+        fd = io.BytesIO()
+        if mode == 'timeline':
+            g2g.timeline(fd)
+        else:
+            getattr(g2g, mode)(names, fd)
+        logs.append(fd.getvalue())
+    assert logs[0]
+    assert logs[1] == logs[0]
@@ -0,0 +1,86 @@
+'''
+Tests that patching a log incrementally after a change to the Gramps
+database gives the same log as regenerating it in full.
+'''
+
+import gzip
+
+import pytest
+
+import gramps2gource
+import incremental
+
+
+# The birth of Edwin Michael Smith, an ancestor of I0002 and I0005 and a
+# descendant of I0018.
+BIRTH = ('<event handle="_a701e8fe703747db89d" change="1198197326" '
+         'id="E0055">\n      <type>Birth</type>\n      '
+         '<dateval val="1961-05-24"/>')
+EDITED_BIRTH = ('<event handle="_a701e8fe703747db89d" change="1400000000" '
+                'id="E0055">\n      <type>Birth</type>\n      '
+                '<dateval val="1961-07-02"/>')
+
+FOCUS = {
+    'pedigree': ['I0002', 'I0005', 'I0030'],
+    'descendants': ['I0018', 'I0033', 'I0041'],
+    'timeline': None,
+}
+
+
+@pytest.fixture
+def edited_gramps(example_gramps, tmp_path):
+    with gzip.open(example_gramps, 'rb') as fd:
+        data = fd.read().decode('utf-8')
+    assert data.count(BIRTH) == 1
+    path = str(tmp_path / 'edited.gramps')
+    with gzip.open(path, 'wb') as fd:
+        fd.write(data.replace(BIRTH, EDITED_BIRTH).encode('utf-8'))
+    return path
+
+
+def g2g(gramps_file, mode):
+    return gramps2gource.Gramps2Gource(
+        gramps_file, projection=gramps2gource.PROJECTIONS[mode])
+
+
+def update(gramps_file, mode, output_file):
+    '''
+    Bring a log up to date incrementally, returning the number of segments
+    regenerated.
+    '''
+    log = incremental.IncrementalLog(g2g(gramps_file, mode), output_file)
+    if mode == 'timeline':
+        return log.timeline()
+    return getattr(log, mode)(FOCUS[mode])
+
+
+def generate(gramps_file, mode, output_file):
+    '''
+    Generate a log in full.
+    '''
+    if mode == 'timeline':
+        g2g(gramps_file, mode).timeline(output_file)
+    else:
+        getattr(g2g(gramps_file, mode), mode)(FOCUS[mode], output_file)
+
+
+@pytest.mark.parametrize('mode', gramps2gource.MODES)
+def test_incremental_update_matches_full_regeneration(
+        example_gramps, edited_gramps, tmp_path, mode):
+    output = str(tmp_path / 'incremental.log')
+    expected = str(tmp_path / 'expected.log')
+    generate(edited_gramps, mode, expected)
+
+    segments = len(FOCUS[mode] or g2g(example_gramps, mode).db.persons)
+    assert update(example_gramps, mode, output) == segments
+    with open(output) as fd:
+        unchanged = fd.read()
+    assert update(example_gramps, mode, output) == 0
+
+    regenerated = update(edited_gramps, mode, output)
+    assert 0 < regenerated < segments
+    with open(output) as fd, open(expected) as expected_fd:
+        patched = fd.read()
+        assert patched == expected_fd.read()
+    assert patched != unchanged
+    assert update(edited_gramps, mode, output) == 0
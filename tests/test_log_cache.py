@@ -0,0 +1,125 @@
+'''
+Tests of the content addressed cache of generated Gource logs.
+'''
+
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import gramps
+import gramps2gource
+import log_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return log_cache.LogCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def export(example_gramps, tmp_path):
+    path = str(tmp_path / 'example.gramps')
+    shutil.copy(example_gramps, path)
+    return path
+
+
+def test_key_depends_on_everything_the_log_does(cache, export, tmp_path,
+                                                monkeypatch):
+    key = cache.key(export, 'pedigree', {'names': ['I0002']})
+    assert cache.key(export, 'pedigree', {'names': ['I0002']}) == key
+
+    assert cache.key(export, 'descendants', {'names': ['I0002']}) != key
+    assert cache.key(export, 'pedigree', {'names': ['I0005']}) != key
+    assert cache.key(export, 'pedigree',
+                     {'names': ['I0002'], 'paths': 'compact'}) != key
+
+    # the same content under another name has the same key
+    renamed = str(tmp_path / 'renamed.gramps')
+    shutil.copy(export, renamed)
+    assert cache.key(renamed, 'pedigree', {'names': ['I0002']}) == key
+
+    with gzip.open(export, 'rb') as fd:
+        data = fd.read()
+    edited = str(tmp_path / 'edited.gramps')
+    with gzip.open(edited, 'wb') as fd:
+        fd.write(data.replace(b'1961-05-24', b'1961-07-02'))
+    assert cache.key(edited, 'pedigree', {'names': ['I0002']}) != key
+
+    monkeypatch.setitem(gramps.date_processor.handlers, 'Julian',
+                        gramps.default_date_parser)
+    assert cache.key(export, 'pedigree', {'names': ['I0002']}) != key
+    monkeypatch.undo()
+
+    # dates giving only a year are resolved against the current day
+    monkeypatch.setattr(gramps, 'resolution_date', lambda: '2000-01-02')
+    assert cache.key(export, 'pedigree', {'names': ['I0002']}) != key
+
+
+def test_tee_then_serve_gives_the_uncached_log(cache, export):
+    uncached = io.StringIO()
+    gramps2gource.Gramps2Gource(export).timeline(uncached)
+
+    records = sorted(
+        gramps2gource.Gramps2Gource(export)._timeline_records())
+    key = cache.key(export, 'timeline', {})
+    assert not cache.serve(key, io.StringIO())
+    assert list(cache.tee(key, iter(records))) == records
+
+    served = io.BytesIO()
+    assert cache.serve(key, served)
+    assert served.getvalue() == uncached.getvalue().encode('utf-8')
+
+
+def test_evict_removes_the_least_recently_served_first(cache):
+    os.makedirs(cache.cache_dir)
+    for age, key in enumerate(['newest', 'middle', 'oldest', 'served']):
+        records = [(age, 'smith', 'A', '_p/Person {0}'.format(key))] * 50
+        list(cache.tee(key, iter(records)))
+        mtime = 1000000000 - age * 1000
+        os.utime(cache.path(key), (mtime, mtime))
+    # serving the oldest entry marks it as the most recently used
+    assert cache.serve('served', io.BytesIO())
+
+    sizes = dict((key, os.path.getsize(cache.path(key)))
+                 for key in ['newest', 'middle', 'oldest', 'served'])
+    cache.max_size = sizes['newest'] + sizes['served'] + sizes['middle'] - 1
+    cache.evict()
+    assert not os.path.exists(cache.path('oldest'))
+    assert not os.path.exists(cache.path('middle'))
+    assert os.path.exists(cache.path('newest'))
+    assert os.path.exists(cache.path('served'))
+
+    cache.max_size = 0
+    cache.evict()
+    assert not [name for name in os.listdir(cache.cache_dir)
+                if name.endswith(log_cache.LOG_SUFFIX)]
+
+
+@pytest.mark.parametrize('mode, names', [
+    ('pedigree', ['I0002', 'I0005']),
+    ('descendants', ['I0018']),
+    ('timeline', []),
+])
+def test_cache_hit_matches_miss(export, tmp_path, mode, names):
+    cache_dir = str(tmp_path / 'cache')
+    outputs = []
+    for run in ('miss', 'hit'):
+        output = str(tmp_path / '{0}.log'.format(run))
+        command = [sys.executable, gramps2gource.__file__, '--db', export,
+                   '--mode', mode, '--output', output,
+                   '--log-cache', cache_dir]
+        for name in names:
+            command.extend(['--names', name])
+        result = subprocess.run(command, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        assert result.returncode == 0, result.stderr
+        assert ('Serving cached log' in result.stderr) == (run == 'hit')
+        with open(output, 'rb') as fd:
+            outputs.append(fd.read())
+    assert outputs[0]
+    assert outputs[1] == outputs[0]
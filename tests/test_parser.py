@@ -0,0 +1,151 @@
+'''
+Tests that the streaming Parser loads the same model as the original
+parser, which read the whole XML tree into memory and searched it.
+'''
+
+import gzip
+
+import pytest
+
+import gramps
+
+
+def tree_parse(gramps_file):
+    '''
+    Load a Gramps XML file the way Parser.parse did before it streamed the
+    file through iterparse, returning the same summary as summarise_store.
+    '''
+    with gzip.open(gramps_file, 'rb') as fd:
+        root = gramps.etree.fromstring(fd.read())
+
+    detected_namespace = ""
+    items = root.tag.split("}")
+    if len(items) == 2 and "{" in items[0]:
+        detected_namespace = '{%s}' % items[0][1:]
+    GrampsNS = gramps.NS(detected_namespace)
+
+    def hlinks(node, path):
+        return tuple(child.attrib.get('hlink')
+                     for child in node.findall(GrampsNS(path)))
+
+    def attrib(node, path, name):
+        child = node.find(GrampsNS(path))
+        return None if child is None else child.attrib.get(name)
+
+    persons = {}
+    for node in root.findall(GrampsNS('.//people/person')):
+        firstnames = ()
+        surname = prefix = None
+        nameNode = node.find(GrampsNS('name'))
+        if nameNode is not None:
+            firstNode = nameNode.find(GrampsNS('first'))
+            if firstNode is not None:
+                firstnames = tuple(firstNode.text.split(" "))
+            surnameNode = nameNode.find(GrampsNS('surname'))
+            if surnameNode is not None:
+                surname = surnameNode.text
+                prefix = surnameNode.attrib.get('prefix')
+        persons[node.attrib.get('handle')] = (
+            node.attrib.get('id'), node.find(GrampsNS('gender')).text,
+            firstnames, surname, prefix, hlinks(node, 'eventref'),
+            attrib(node, 'childof', 'hlink'), hlinks(node, 'parentin'),
+            hlinks(node, 'noteref'))
+
+    families = {}
+    for node in root.findall(GrampsNS('.//families/family')):
+        children = []
+        step_children = []
+        for childNode in node.findall(GrampsNS('childref')):
+            if childNode.attrib.get('frel') == 'Stepchild':
+                step_children.append(childNode.attrib.get('hlink'))
+            else:
+                children.append(childNode.attrib.get('hlink'))
+        families[node.attrib.get('handle')] = (
+            node.attrib.get('id'), attrib(node, 'father', 'hlink'),
+            attrib(node, 'mother', 'hlink'), attrib(node, 'rel', 'type'),
+            hlinks(node, 'eventref'), tuple(children), tuple(step_children),
+            hlinks(node, 'sourceref'))
+
+    events = {}
+    for node in root.findall(GrampsNS('.//events/event')):
+        typeNode = node.find(GrampsNS('type'))
+        descriptionNode = node.find(GrampsNS('description'))
+        events[node.attrib.get('handle')] = (
+            node.attrib.get('id'),
+            None if typeNode is None else typeNode.text,
+            attrib(node, 'dateval', 'val'), attrib(node, 'dateval', 'type'),
+            attrib(node, 'dateval', 'cformat'),
+            None if descriptionNode is None else descriptionNode.text,
+            attrib(node, 'place', 'hlink'), hlinks(node, 'noteref'),
+            hlinks(node, 'sourceref'))
+
+    places = {}
+    for node in root.findall(GrampsNS('.//places/placeobj')):
+        titleNode = node.find(GrampsNS('ptitle'))
+        places[node.attrib.get('handle')] = (
+            node.attrib.get('id'),
+            None if titleNode is None else titleNode.text,
+            attrib(node, 'coord', 'lat'), attrib(node, 'coord', 'long'))
+
+    return {'persons': persons, 'families': families, 'events': events,
+            'places': places}
+
+
+@pytest.fixture(params=['example', 'generated'])
+def gramps_file(request, example_gramps, generated_gramps):
+    return {'example': example_gramps,
+            'generated': generated_gramps}[request.param]
+
+
+@pytest.mark.parametrize('section',
+                         ['persons', 'families', 'events', 'places'])
+def test_streaming_parse_matches_tree_parse(gramps_file, section, summarise):
+    expected = tree_parse(gramps_file)[section]
+    loaded = summarise(gramps.Parser().parse(gramps_file))[section]
+    assert expected
+    assert loaded == expected
+
+
+def test_parser_keeps_no_state(example_gramps):
+    parser = gramps.Parser()
+    state = dict(vars(parser))
+    parser.parse(example_gramps,
+                 projection=gramps.Projection(fields=('gender',)))
+    assert vars(parser) == state
+    parser.parse_links(example_gramps)
+    assert vars(parser) == state
+
+
+def test_handles_are_interned(example_gramps):
+    store = gramps.Parser().parse(example_gramps)
+    events = dict((handle, handle) for handle in store.events)
+    for person in store.persons.values():
+        for handle in person.event_handles:
+            assert handle is events[handle]
+
+
+def test_projection_leaves_out_skipped_parts(gramps_file, summarise):
+    full = summarise(gramps.Parser().parse(gramps_file))
+    projection = gramps.Projection(
+        sections=('people', 'families', 'events'), event_types=('Birth',),
+        fields=())
+    loaded = summarise(gramps.Parser().parse(
+        gramps_file, projection=projection))
+
+    # the skipped fields keep the defaults of the model objects
+    expected = {
+        'persons': dict(
+            (handle, person[:1] + (None,) + person[2:-1] + ((),))
+            for handle, person in full['persons'].items()),
+        'families': dict(
+            (handle, family[:3] + (None,) + family[4:6] + ((), ()))
+            for handle, family in full['families'].items()),
+        'events': dict(
+            (handle, event[:5] + (None, None, (), ()))
+            for handle, event in full['events'].items()
+            if event[1] == 'Birth'),
+        'places': {},
+    }
+    assert full['places']
+    assert len(expected['events']) < len(full['events'])
+    assert loaded == expected
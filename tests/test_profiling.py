@@ -0,0 +1,111 @@
+'''
+Tests of the per-stage profiler and of the counters the output modes
+report.
+'''
+
+import threading
+import time
+
+import pytest
+
+import gramps
+import gramps2gource
+import profiling
+from profiling import profiler
+
+
+@pytest.fixture
+def enabled():
+    profiler.reset()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.reset()
+
+
+def test_stages_accumulate():
+    p = profiling.Profiler()
+    p.enable()
+    for _ in range(3):
+        with p.stage('outer'):
+            with p.stage('inner'):
+                time.sleep(0.01)
+    assert list(p.stages) == ['inner', 'outer']
+    assert p.stages['outer']['calls'] == 3
+    assert p.stages['inner']['calls'] == 3
+    assert p.stages['outer']['wall'] >= p.stages['inner']['wall'] >= 0.03
+    assert p.stages['outer']['cpu'] < p.stages['outer']['wall']
+    assert 'outer' in p.summary()
+    assert '"inner"' in p.to_json()
+
+
+def test_stage_records_the_cpu_time_of_its_own_thread():
+    p = profiling.Profiler()
+    p.enable()
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            pass
+
+    thread = threading.Thread(target=spin)
+    thread.start()
+    try:
+        with p.stage('waiting'):
+            time.sleep(0.2)
+    finally:
+        stop.set()
+        thread.join()
+    assert p.stages['waiting']['wall'] >= 0.2
+    assert p.stages['waiting']['cpu'] < 0.1
+
+
+def test_counters_add_up():
+    p = profiling.Profiler()
+    p.enable()
+    p.count('persons')
+    p.count('persons', 4)
+    p.count('events', 2)
+    assert p.counters == {'persons': 5, 'events': 2}
+    p.reset()
+    assert not p.counters and not p.stages
+
+
+def test_disabled_profiler_records_nothing():
+    p = profiling.Profiler()
+    assert p.stage('parse') is profiling._null_stage
+    with p.stage('parse'):
+        p.count('persons', 3)
+    assert not p.stages
+    assert not p.counters
+
+
+@pytest.mark.parametrize('mode', gramps2gource.MODES)
+def test_every_mode_counts_persons_and_dates(example_gramps, enabled, mode):
+    g2g = gramps2gource.Gramps2Gource(
+        None, store=gramps.parser.parse(example_gramps))
+    output = []
+    if mode == 'timeline':
+        g2g.timeline(output_file=_ListSink(output))
+    else:
+        getattr(g2g, mode)(['I0002', 'I0018'], _ListSink(output))
+    assert output
+    counters = enabled.counters
+    assert counters['persons_visited'] > 0
+    assert counters['dates_parsed'] > 0
+    assert counters['dates_resolved'] > 0
+    assert counters['records_written'] == len(output)
+
+
+class _ListSink(object):
+    '''
+    Collects the records written to it.
+    '''
+
+    def __init__(self, records):
+        self.records = records
+
+    def write_records(self, records):
+        self.records.extend(records)
@@ -0,0 +1,57 @@
+'''
+Tests of sorting log records in a bounded amount of memory.
+'''
+
+import io
+import random
+
+import pytest
+
+import gramps2gource
+
+
+def make_records(count, seed=0):
+    rng = random.Random(seed)
+    return [(rng.randint(-10 ** 9, 10 ** 9), 'smith',
+             rng.choice('AMD'), '_p{0}/Person {0}'.format(i))
+            for i in range(count)]
+
+
+@pytest.mark.parametrize('buffer_size', [1, 7, 100, 1000])
+def test_sorted_records_match_sorted(buffer_size):
+    records = make_records(500)
+    with gramps2gource.RecordSorter(buffer_size, batch_size=3) as sorter:
+        sorter.extend(iter(records))
+        assert len(sorter) == len(records)
+        assert len(sorter._buffer) < buffer_size
+        assert len(sorter._runs) == len(records) // buffer_size
+        assert list(sorter) == sorted(records)
+
+
+def test_close_discards_records():
+    sorter = gramps2gource.RecordSorter(10)
+    sorter.extend(make_records(25))
+    runs = list(sorter._runs)
+    sorter.close()
+    assert len(sorter) == 0
+    assert list(sorter) == []
+    assert all(fd.closed for fd in runs)
+
+
+def test_reverse_time_reverses_the_sort_order():
+    records = make_records(50)
+    reversed_records = sorted(gramps2gource.reverse_time(records))
+    assert [-record[0] for record in reversed_records] == \
+        sorted((record[0] for record in records), reverse=True)
+
+
+def test_pedigree_is_the_same_when_sorted_on_disk(example_gramps):
+    g2g = gramps2gource.Gramps2Gource(example_gramps)
+    names = ["Amber Marie Smith", "Lars Peter Smith"]
+    logs = []
+    for sort_buffer_size in (gramps2gource.DEFAULT_SORT_BUFFER_SIZE, 4):
+        fd = io.StringIO()
+        g2g.pedigree(names, fd, sort_buffer_size=sort_buffer_size)
+        logs.append(fd.getvalue())
+    assert logs[0]
+    assert logs[1] == logs[0]
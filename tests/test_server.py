@@ -0,0 +1,77 @@
+'''
+Tests of the server answering concurrent requests from one loaded store.
+'''
+
+import io
+import threading
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    # python2
+    from urllib2 import urlopen
+
+import pytest
+
+import gramps2gource
+import server
+
+
+@pytest.fixture
+def holder(example_gramps):
+    return server.StoreHolder(example_gramps)
+
+
+def test_reload_fills_the_store(holder):
+    store = holder.current().db
+    assert store.families
+    for family in store.families.values():
+        assert family._events is not None
+        assert family._children is not None
+    for person in store.persons.values():
+        assert person._events is not None
+
+
+def test_concurrent_requests_match_a_single_run(example_gramps, holder):
+    paths = [
+        '/timeline',
+        '/pedigree?name=I0002',
+        '/descendants?name=I0027',
+    ]
+    expected = {}
+    for path in paths:
+        g2g = gramps2gource.Gramps2Gource(example_gramps)
+        fd = io.StringIO()
+        if path == '/timeline':
+            g2g.timeline(fd)
+        elif path.startswith('/pedigree'):
+            g2g.pedigree(['I0002'], fd)
+        else:
+            g2g.descendants(['I0027'], fd)
+        expected[path] = fd.getvalue()
+        assert expected[path]
+
+    httpd = server.Server(('127.0.0.1', 0), holder)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    url = "http://127.0.0.1:{0}".format(httpd.server_port)
+    results = []
+
+    def request(path):
+        results.append((path, urlopen(url + path).read().decode('utf-8')))
+
+    try:
+        threads = [threading.Thread(target=request, args=(path,))
+                   for path in paths * 8]
+        for request_thread in threads:
+            request_thread.start()
+        for request_thread in threads:
+            request_thread.join()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+    assert len(results) == len(paths) * 8
+    for path, body in results:
+        assert body == expected[path]
@@ -0,0 +1,115 @@
+'''
+Tests of writing logs through the sinks chosen by open_sink and reading
+them back with read_records.
+'''
+
+import gzip
+import io
+import os
+import socket
+import threading
+
+import pytest
+
+import sinks
+
+
+RECORDS = [
+    (-892339200, 'smith', 'A', '_SKNT6D7FA4WHUUE7Z6/Amber Marie Smith'),
+    (-129600000, 'smith', 'A', '_SKNT6D7FA4WHUUE7Z6/0/Edwin Michael Smith'),
+    (-3600, 'perkins', 'M', '_SKNT6D7FA4WHUUE7Z6/0/1/Alice Paula Perkins'),
+]
+
+
+@pytest.mark.parametrize('output, sink_class, compressed', [
+    ('pedigree.log', sinks.FileSink, False),
+    ('pedigree.log.gz', sinks.GzipSink, True),
+    ('gzip:pedigree.log', sinks.GzipSink, True),
+    ('file:pedigree.log.gz', sinks.FileSink, False),
+])
+def test_file_outputs_round_trip(tmp_path, output, sink_class, compressed):
+    scheme, name = sinks.split_output(output)
+    path = str(tmp_path / name)
+    if scheme:
+        output = "{0}://{1}".format(scheme, path)
+    else:
+        output = path
+
+    sink = sinks.open_sink(output, batch_size=2)
+    assert type(sink) is sink_class
+    sink.write_records(iter(RECORDS))
+
+    with open(path, 'rb') as fd:
+        data = fd.read()
+    assert data.startswith(sinks.GZIP_MAGIC) == compressed
+    if compressed:
+        data = gzip.decompress(data)
+    assert data == sinks.format_records(RECORDS) + b"\n"
+    assert list(sinks.read_records(path)) == RECORDS
+    assert list(sinks.read_records(output)) == RECORDS
+
+
+@pytest.mark.skipif(sinks.zstandard is None,
+                    reason="zstandard is not installed")
+def test_zstd_output_round_trips(tmp_path):
+    path = str(tmp_path / 'pedigree.log.zst')
+    sink = sinks.open_sink(path)
+    assert isinstance(sink, sinks.ZstdSink)
+    sink.write_records(RECORDS)
+    with open(path, 'rb') as fd:
+        assert fd.read(4) == sinks.ZSTD_MAGIC
+    assert list(sinks.read_records(path)) == RECORDS
+
+
+def test_stdout_output(capsys):
+    sink = sinks.open_sink('-')
+    assert isinstance(sink, sinks.StreamSink)
+    sink.write_records(RECORDS)
+    out = capsys.readouterr().out
+    assert out == sinks.format_records(RECORDS).decode('utf-8') + "\n"
+
+
+@pytest.mark.parametrize('fd', [io.StringIO(), io.BytesIO()],
+                         ids=['text', 'binary'])
+def test_open_file_object_output(fd):
+    sinks.open_sink(fd).write_records(RECORDS)
+    data = fd.getvalue()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    assert not fd.closed
+    assert list(sinks.read_records(io.BytesIO(data.encode('utf-8')))) == \
+        RECORDS
+
+
+def test_unix_socket_output(tmp_path):
+    path = str(tmp_path / 'gource.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    received = []
+
+    def accept():
+        connection, _ = listener.accept()
+        with connection, connection.makefile('rb') as fd:
+            received.append(fd.read())
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    try:
+        sinks.open_sink('unix://' + path).write_records(RECORDS)
+        thread.join()
+    finally:
+        listener.close()
+    assert received == [sinks.format_records(RECORDS) + b"\n"]
+
+
+def test_missing_unix_socket_is_reported_by_open_sink(tmp_path):
+    path = str(tmp_path / 'missing.sock')
+    with pytest.raises(ValueError):
+        sinks.open_sink('unix://' + path)
+
+    not_a_socket = str(tmp_path / 'file')
+    open(not_a_socket, 'w').close()
+    with pytest.raises(ValueError):
+        sinks.open_sink('unix:' + not_a_socket)
+    assert os.path.exists(not_a_socket)
@@ -0,0 +1,132 @@
+'''
+Tests of when SnapshotCache reuses, refreshes and replaces snapshots.
+'''
+
+import os
+import shutil
+
+import pytest
+
+import gramps
+import snapshot
+
+
+@pytest.fixture
+def gramps_file(tmp_path, example_gramps):
+    path = str(tmp_path / 'example.gramps')
+    shutil.copy(example_gramps, path)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return snapshot.SnapshotCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    '''
+    A list that records each Gramps file SnapshotCache has to parse.
+    '''
+    calls = []
+    parse = gramps.Parser.parse
+
+    def counting_parse(self, gramps_file, *args, **kwargs):
+        calls.append(gramps_file)
+        return parse(self, gramps_file, *args, **kwargs)
+
+    monkeypatch.setattr(gramps.Parser, 'parse', counting_parse)
+    return calls
+
+
+@pytest.fixture
+def unpickles(monkeypatch):
+    '''
+    A list that records each snapshot SnapshotCache unpickles.
+    '''
+    calls = []
+    read_store = snapshot.SnapshotCache._read_store
+
+    def counting_read_store(self, snapshot_file, offset):
+        calls.append(snapshot_file)
+        return read_store(self, snapshot_file, offset)
+
+    monkeypatch.setattr(
+        snapshot.SnapshotCache, '_read_store', counting_read_store)
+    return calls
+
+
+def test_snapshot_is_reused(cache, gramps_file, parses, summarise):
+    parsed = cache.load(gramps_file)
+    loaded = cache.load(gramps_file)
+    assert len(parses) == 1
+    assert summarise(loaded) == summarise(parsed)
+
+
+def test_touched_file_only_rewrites_header(cache, gramps_file, parses,
+                                           summarise):
+    parsed = cache.load(gramps_file)
+    snapshot_file = cache.path(gramps_file)
+    _, offset = cache._read_header(snapshot_file)
+    with open(snapshot_file, 'rb') as fd:
+        pickled = fd.read()[offset:]
+
+    stat = os.stat(gramps_file)
+    os.utime(gramps_file, (stat.st_atime, stat.st_mtime + 10))
+    loaded = cache.load(gramps_file)
+    assert len(parses) == 1
+    assert summarise(loaded) == summarise(parsed)
+
+    header, offset = cache._read_header(snapshot_file)
+    assert header['mtime'] == os.stat(gramps_file).st_mtime
+    with open(snapshot_file, 'rb') as fd:
+        assert fd.read()[offset:] == pickled
+
+    cache.load(gramps_file)
+    assert len(parses) == 1
+
+
+def test_changed_file_is_parsed_again(cache, gramps_file, parses):
+    cache.load(gramps_file)
+    with open(gramps_file, 'ab') as fd:
+        # gzip ignores trailing zeros after the last member
+        fd.write(b'\0' * 8)
+    cache.load(gramps_file)
+    assert len(parses) == 2
+
+
+def test_different_date_handlers_are_stale(cache, gramps_file, parses,
+                                           unpickles, monkeypatch):
+    cache.load(gramps_file)
+    monkeypatch.setattr(gramps.date_processor, 'describe',
+                        lambda: [('Julian', 'julian_date')])
+    cache.load(gramps_file)
+    assert len(parses) == 2
+    assert not unpickles
+
+    cache.load(gramps_file)
+    assert len(parses) == 2
+    assert len(unpickles) == 1
+
+
+def test_snapshot_from_another_day_is_stale(cache, gramps_file, parses,
+                                            unpickles, monkeypatch):
+    cache.load(gramps_file)
+    monkeypatch.setattr(gramps, 'resolution_date', lambda: '2000-01-02')
+    cache.load(gramps_file)
+    assert len(parses) == 2
+    assert not unpickles
+
+    cache.load(gramps_file)
+    assert len(parses) == 2
+    assert len(unpickles) == 1
+
+
+def test_different_store_class_is_not_unpickled(cache, gramps_file, parses,
+                                                unpickles):
+    cache.load(gramps_file)
+    indexed = snapshot.SnapshotCache(
+        cache.cache_dir, store_class=gramps.IndexedStore)
+    assert isinstance(indexed.load(gramps_file), gramps.IndexedStore)
+    assert len(parses) == 2
+    assert not unpickles
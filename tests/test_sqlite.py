@@ -0,0 +1,37 @@
+'''
+Tests that the SQLite loader loads the same model from a Gramps SQLite
+database as the XML parser does from an export of it.
+'''
+
+import pytest
+
+import generate_gramps
+import gramps
+
+
+@pytest.fixture
+def example_sqlite(example_gramps, tmp_path):
+    path = str(tmp_path / 'sqlite.db')
+    generate_gramps.write_sqlite(gramps.parser.parse(example_gramps), path)
+    return path
+
+
+@pytest.mark.parametrize('section',
+                         ['persons', 'families', 'events', 'places'])
+def test_sqlite_load_matches_xml_parse(example_gramps, example_sqlite,
+                                       section, summarise):
+    expected = summarise(gramps.parser.parse(example_gramps))[section]
+    loader = gramps.loader_for(example_sqlite)
+    assert loader is gramps.sqlite_loader
+    loaded = summarise(loader.parse(example_sqlite))[section]
+    assert expected
+    assert loaded == expected
+
+
+def test_sqlite_loader_keeps_no_state(example_sqlite):
+    loader = gramps.SQLiteLoader()
+    state = dict(vars(loader))
+    loader.parse(example_sqlite)
+    assert vars(loader) == state
+    loader.parse_links(example_sqlite)
+    assert vars(loader) == state
@@ -0,0 +1,130 @@
+'''
+Tests of the integer indexed walks of an IndexedStore against the walks
+over the object model, and of the lazily built EventIndex.
+'''
+
+import datetime
+
+import pytest
+
+import gramps
+import gramps2gource
+
+
+@pytest.fixture(scope='module')
+def indexed_store(generated_gramps):
+    return gramps.parser.parse(generated_gramps, store=gramps.IndexedStore())
+
+
+def test_columns_are_built_when_first_walked(indexed_store):
+    indexed_store.build_indexes()
+    assert not indexed_store.columns_built
+    handle = next(iter(indexed_store.persons))
+    assert indexed_store.ancestor_handles(handle)[0] == handle
+    assert indexed_store.columns_built
+
+
+def test_ancestor_handles_match_object_walk(indexed_store):
+    for person in indexed_store.persons.values():
+        assert sorted(indexed_store.ancestor_handles(person.handle)) == \
+            sorted(person.ancestors())
+
+
+@pytest.mark.parametrize('generations', [None, 0, 1, 3])
+def test_descendant_handles_match_object_walk(indexed_store, generations):
+    for person in indexed_store.persons.values():
+        assert indexed_store.descendant_handles(
+            person.handle, generations=generations) == \
+            person.descendents(generations=generations)
+
+
+def test_gramps2gource_walks_indexed_store(example_gramps):
+    g2g = gramps2gource.Gramps2Gource(example_gramps)
+    assert isinstance(g2g.db, gramps.IndexedStore)
+    person = g2g.db.get_person(g2g.db.find_person("Amber Marie Smith"))
+    ancestors = g2g.get_ancestors(person)
+    assert sorted(g2g.ancestor_handles(person)) == \
+        sorted(set(handle for handle, _ in ancestors))
+    assert g2g.descendant_handles(person) == \
+        [handle for handle, _ in g2g.get_descendants(person)]
+
+
+def test_event_index_is_built_for_the_persons_walked(example_gramps):
+    store = gramps.parser.parse(example_gramps)
+    person = store.get_person(store.find_person("Amber Marie Smith"))
+    person.associated_events()
+    walked = set(store.event_index._persons)
+    assert person.handle in walked
+    assert len(walked) < len(store.persons)
+
+
+def test_lazy_event_index_matches_filled_index(generated_gramps):
+    store = gramps.parser.parse(generated_gramps)
+    lazy = gramps.EventIndex(store)
+    store.build_event_index()
+    filled = store.event_index
+    for handle in store.persons:
+        assert lazy.birth_datetime(handle) == filled.birth_datetime(handle)
+        assert lazy.cutoff_datetime(handle) == filled.cutoff_datetime(handle)
+    for handle in store.families:
+        assert lazy.child_births(handle) == filled.child_births(handle)
+        assert lazy.undated_child_births(handle) == \
+            filled.undated_child_births(handle)
+
+
+@pytest.mark.parametrize('event_type', ['Emigration', 'Emmigration'])
+def test_siblings_born_after_emigration_are_left_out(generated_gramps,
+                                                     event_type):
+    store = gramps.parser.parse(generated_gramps)
+
+    def birth(person):
+        return store.event_index.birth_datetime(person.handle)
+
+    person, sibling = next(
+        (person, sibling)
+        for person in store.persons.values()
+        if person.child_of_handle and birth(person)
+        for sibling in store.get_family(person.child_of_handle).children
+        if birth(sibling) and
+        birth(sibling) - birth(person) > datetime.timedelta(days=2))
+    sibling_birth = [event for event in sibling.events
+                     if event.type == 'Birth'][0]
+    assert sibling_birth in [
+        event for _, event, _ in person.associated_events()]
+    emigrated = birth(person) + datetime.timedelta(days=1)
+
+    # add the emigration before the event index of the new store is built
+    store = gramps.parser.parse(generated_gramps)
+    person = store.get_person(person.handle)
+    emigration = gramps.Event(store)
+    emigration.handle = '_emigration'
+    emigration.type = event_type
+    emigration.date = emigrated.strftime('%Y-%m-%d')
+    store.events[emigration.handle] = emigration
+    person.event_handles = tuple(person.event_handles) + (emigration.handle,)
+
+    assert store.event_index.cutoff_datetime(person.handle) == \
+        emigration.datetime
+    assert sibling_birth.handle not in [
+        event.handle for _, event, _ in person.associated_events()]
+
+
+@pytest.mark.parametrize('paths', gramps2gource.PATH_MODES)
+def test_indexed_walks_match_object_walks(generated_gramps, indexed_store,
+                                          paths):
+    indexed = gramps2gource.Gramps2Gource(None, store=indexed_store)
+    objects = gramps2gource.Gramps2Gource(
+        None, store=gramps.parser.parse(generated_gramps))
+    assert not isinstance(objects.db, gramps.IndexedStore)
+    for handle in indexed_store.persons:
+        person = indexed_store.get_person(handle)
+        other = objects.db.get_person(handle)
+        for collapse in gramps2gource.COLLAPSE_MODES:
+            assert indexed.get_ancestors(
+                person, collapse=collapse, paths=paths) == \
+                objects.get_ancestors(other, collapse=collapse, paths=paths)
+        for generations in (None, 2):
+            assert indexed.get_descendants(
+                person, generations=generations, paths=paths) == \
+                objects.get_descendants(
+                    other, generations=generations, paths=paths)